@@ -0,0 +1,165 @@
+import threading
+from datetime import date, timedelta
+from flask import current_app, render_template, request
+from sqlalchemy import func
+from database import db, upsert
+from models import PageView
+from lookups import venue_names, artist_names
+from trending import trending
+from jobs import PeriodicTask
+from logs import get_logger
+
+#----------------------------------------------------------------------------#
+# Page-view analytics.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# Successful GETs of the venue and artist pages are counted by an
+# 'after_request' hook into per-process counters, keyed by
+# (kind, id, day), instead of an INSERT per hit. The counters are
+# added to the 'PageView' daily rollup table in one batched upsert
+# every ANALYTICS_FLUSH_INTERVAL seconds, as soon as
+# ANALYTICS_FLUSH_EVENTS hits are buffered, and on shutdown (see
+# 'jobs.PeriodicTask'). Each hit also counts as a 'view' for the
+# trending scores.
+#
+# '/analytics' shows the daily totals and most viewed pages of the
+# last ANALYTICS_DAYS days, or the daily counts of one page with
+# '?venue_id=' / '?artist_id='.
+####################################################################
+
+logger = get_logger(__name__)
+
+TRACKED_ENDPOINTS = {
+    'venues.show_venue': ('venue', 'venue_id'),
+    'artists.show_artist': ('artist', 'artist_id'),
+}
+ANALYTICS_TOP_LIMIT = 10
+
+
+class ViewCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}   # (kind, id, day) -> hits since the last flush
+        self.pending = 0    # hits since the last flush
+
+    def record(self, kind, entity_id, day=None):
+        # Returns the number of buffered hits
+        key = (kind, entity_id, day or date.today())
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self.pending += 1
+            return self.pending
+
+    def flush(self):
+        # Adds the buffered counts to 'PageView'; on failure they are
+        # put back for the next flush. Returns the number of rows written
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            self.pending = 0
+        if not counts:
+            return 0
+
+        error = False
+        try:
+            stmt = upsert(PageView)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['kind', 'entity_id', 'day'],
+                set_={"views": PageView.views + stmt.excluded.views})
+            db.session.execute(stmt, [
+                {"kind": kind, "entity_id": entity_id, "day": day, "views": views}
+                for (kind, entity_id, day), views in counts.items()])
+            db.session.commit()
+        except Exception:
+            error = True
+            db.session.rollback()
+            logger.exception('Writing %s page view counts failed', len(counts))
+        finally:
+            db.session.close()
+
+        if error:
+            with self._lock:
+                for key, views in counts.items():
+                    self._counts[key] = self._counts.get(key, 0) + views
+                    self.pending += views
+            return 0
+        return len(counts)
+
+
+page_views = ViewCounter()
+
+
+def track_view(response):
+    tracked = TRACKED_ENDPOINTS.get(request.endpoint)
+    if tracked is None or request.method != 'GET' or response.status_code != 200:
+        return response
+
+    kind, id_arg = tracked
+    entity_id = request.view_args[id_arg]
+    trending.record(kind, entity_id, 'view')
+    if page_views.record(kind, entity_id) >= current_app.config['ANALYTICS_FLUSH_EVENTS']:
+        current_app.extensions['analytics'].wake()
+    return response
+
+
+#  Rollups page
+#  ----------------------------------------------------------------
+
+def get_daily_totals(since):
+    # {day: {"venue": views, "artist": views}}, newest day first
+    days = {}
+    for day, kind, views in db.session.query(
+            PageView.day, PageView.kind, func.sum(PageView.views)).filter(
+            PageView.day >= since).group_by(PageView.day, PageView.kind):
+        days.setdefault(day, {"venue": 0, "artist": 0})[kind] = views
+    return dict(sorted(days.items(), reverse=True))
+
+
+def get_most_viewed(kind, since, limit=ANALYTICS_TOP_LIMIT):
+    names = {'venue': venue_names, 'artist': artist_names}[kind]
+    total = func.sum(PageView.views).label('total')
+    rows = db.session.query(PageView.entity_id, total).filter(
+        PageView.kind == kind, PageView.day >= since).group_by(
+        PageView.entity_id).order_by(total.desc()).limit(limit)
+    return [{
+        "id": entity_id,
+        "name": names.get(entity_id) or f'#{entity_id}',
+        "views": views
+    } for entity_id, views in rows]
+
+
+def get_page_days(kind, entity_id, since):
+    return db.session.query(PageView.day, PageView.views).filter(
+        PageView.kind == kind, PageView.entity_id == entity_id,
+        PageView.day >= since).order_by(PageView.day.desc()).all()
+
+
+def analytics():
+    days = current_app.config['ANALYTICS_DAYS']
+    since = date.today() - timedelta(days=days - 1)
+
+    for kind, names in (('venue', venue_names), ('artist', artist_names)):
+        entity_id = request.args.get(f'{kind}_id', type=int)
+        if entity_id is not None:
+            page = {
+                "kind": kind,
+                "id": entity_id,
+                "name": names.get(entity_id) or f'#{entity_id}',
+                "days": get_page_days(kind, entity_id, since)
+            }
+            return render_template('pages/analytics.html', days=days, page=page)
+
+    return render_template(
+        'pages/analytics.html', days=days, page=None,
+        totals=get_daily_totals(since),
+        venues=get_most_viewed('venue', since),
+        artists=get_most_viewed('artist', since),
+        pending=page_views.pending)
+
+
+def init_analytics(app):
+    flusher = PeriodicTask(app, page_views.flush, app.config['ANALYTICS_FLUSH_INTERVAL'])
+    app.extensions['analytics'] = flusher
+    app.before_request(flusher.start)
+    app.after_request(track_view)
+    app.add_url_rule('/analytics', 'analytics', analytics)
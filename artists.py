@@ -0,0 +1,385 @@
+from datetime import datetime
+from flask import Blueprint, render_template, request
+from flask import flash, redirect, url_for, jsonify, abort
+from sqlalchemy import exc
+from database import db
+from models import Venue, Artist, Show
+from lookups import artist_names
+from matchmaking import matches
+from graph import co_performances
+from utils import get_calendar_data, get_related_panel, enqueue_follow_ups
+from utils import get_search_response
+from utils import MATCHES_DEFAULT_LIMIT, MATCHES_MAX_LIMIT
+from utils import PAST_SHOWS_LIMIT, count_past_shows
+import services
+from search import search
+from ratelimit import rate_limited
+from logs import get_logger
+
+#----------------------------------------------------------------------------#
+# Artist pages.
+#----------------------------------------------------------------------------#
+
+bp = Blueprint('artists', __name__)
+logger = get_logger(__name__)
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@bp.route('/artists')
+def artists():
+    # TODO: replace with real data returned from querying the database
+
+    artists = db.session.query(Artist.id, Artist.name).all()
+    data = [{"id": artist.id, "name": artist.name} for artist in artists]
+
+    # data = [{
+    #     "id": 4,
+    #     "name": "Guns N Petals",
+    # }, {
+    #     "id": 5,
+    #     "name": "Matt Quevedo",
+    # }, {
+    #     "id": 6,
+    #     "name": "The Wild Sax Band",
+    # }]
+    return render_template('pages/artists.html', artists=data)
+
+
+@bp.route('/artists/search', methods=['GET', 'POST'])
+@rate_limited('search')
+def search_artists():
+    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+    # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+    # search for "band" should return "The Wild Sax Band".
+
+    # GET (cacheable, see 'get_search_response') or the older POST form
+    search_term = request.values.get('search_term', '')
+    response = search('artist', search_term)
+
+    # mock data Provided by default
+    # response = {
+    #     "count": 1,
+    #     "data": [{
+    #         "id": 4,
+    #         "name": "Guns N Petals",
+    #         "num_upcoming_shows": 0,
+    #     }]
+    # }
+    # return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+    return get_search_response('pages/search_artists.html', response, search_term)
+
+
+@bp.route('/artists/lookup')
+def lookup_artists():
+    # Typeahead source for the show forms' artist picker
+    return jsonify(artist_names.search(request.args.get('q', '')))
+
+
+@bp.route('/artists/<int:artist_id>')
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    # TODO: replace with real artist data from the artist table, using artist_id
+
+    curr_artist = Artist.query.get_or_404(artist_id)
+    curr_artist = curr_artist.to_dico()
+
+    # Moderating artist's genres for display purpose
+    curr_artist['genres'] = [genre.name for genre in curr_artist['genres']]
+
+    # # ################################################################
+    # # COMMENTED for ReImplementation to Satisfy Review Requirements
+    # # ################################################################
+
+    # q_upcoming_shows = Show.query.filter(
+    #     Show.artist_id == artist_id, Show.start_time >= datetime.now())
+
+    # q_past_shows = Show.query.filter(
+    #     Show.artist_id == artist_id, Show.start_time < datetime.now())
+
+    # past_shows = get_formatted_shows(q_past_shows.all(), shows_for='artist')
+    # upcoming_shows = get_formatted_shows(
+    #     q_upcoming_shows.all(), shows_for='artist')
+    # # ################################################################
+
+    # bounded like the venue page's lists, for partition pruning
+    now = datetime.now()
+    q_upcoming_shows = db.session.query(Show).join(Venue).filter(
+        Show.artist_id == artist_id).filter(Show.start_time >= now).order_by(
+        Show.start_time).all()
+
+    q_past_shows = db.session.query(Show).join(Venue).filter(
+        Show.artist_id == artist_id).filter(Show.start_time < now).order_by(
+        Show.start_time.desc()).limit(PAST_SHOWS_LIMIT).all()
+
+    past_shows = []
+    for show in q_past_shows:
+        past_shows.append({
+            "venue_id": show.show_venue.id,
+            "venue_name": show.show_venue.name,
+            "venue_image_link": show.show_venue.image_link,
+            "start_time": show.start_time
+        })
+
+    upcoming_shows = []
+    for show in q_upcoming_shows:
+        upcoming_shows.append({
+            "venue_id": show.show_venue.id,
+            "venue_name": show.show_venue.name,
+            "venue_image_link": show.show_venue.image_link,
+            "start_time": show.start_time
+        })
+
+    curr_artist["past_shows"] = past_shows
+    curr_artist["upcoming_shows"] = upcoming_shows
+    curr_artist["past_shows_count"] = count_past_shows(
+        Show.artist_id, artist_id, now, len(past_shows))
+    curr_artist["upcoming_shows_count"] = len(upcoming_shows)
+
+    # two-hop panel, answered from the in-memory graph (see 'graph.py')
+    curr_artist["co_performers"] = get_related_panel(
+        co_performances.co_performers(artist_id), artist_names)
+
+    # # Testing
+    # print('*' * 10, f'Artist <{artist_id}> --- ', '*' * 10)
+    # for key in curr_artist.keys():
+    #     if key == 'past_shows':
+    #         print(f'{key}:')
+    #         for p_show in curr_artist[key]:
+    #             print('\t', p_show)
+
+    #     elif key == 'upcoming_shows':
+    #         print(f'{key}:')
+    #         for u_show in curr_artist[key]:
+    #             print('\t', u_show)
+
+    #     elif key == 'genres':
+    #         print(f'{key}:')
+    #         for genre in curr_artist[key]:
+    #             print('\t', genre)
+    #     else:
+    #         print(f'{key}: {curr_artist[key]}')
+
+    # print('*' * 32)
+
+    # # data1 = {
+    # #     "id": 4,
+    # #     "name": "Guns N Petals",
+    # #     "genres": ["Rock n Roll"],
+    # #     "city": "San Francisco",
+    # #     "state": "CA",
+    # #     "phone": "326-123-5000",
+    # #     "website": "https://www.gunsnpetalsband.com",
+    # #     "facebook_link": "https://www.facebook.com/GunsNPetals",
+    # #     "seeking_venue": True,
+    # #     "seeking_description": "Looking for shows to perform at in the San Francisco Bay Area!",
+    # #     "image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
+    # #     "past_shows": [{
+    # #         "venue_id": 1,
+    # #         "venue_name": "The Musical Hop",
+    # #         "venue_image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60",
+    # #         "start_time": "2019-05-21T21:30:00.000Z"
+    # #     }],
+    # #     "upcoming_shows": [],
+    # #     "past_shows_count": 1,
+    # #     "upcoming_shows_count": 0,
+    # # }
+    # # data2 = {
+    # #     "id": 5,
+    # #     "name": "Matt Quevedo",
+    # #     "genres": ["Jazz"],
+    # #     "city": "New York",
+    # #     "state": "NY",
+    # #     "phone": "300-400-5000",
+    # #     "facebook_link": "https://www.facebook.com/mattquevedo923251523",
+    # #     "seeking_venue": False,
+    # #     "image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
+    # #     "past_shows": [{
+    # #         "venue_id": 3,
+    # #         "venue_name": "Park Square Live Music & Coffee",
+    # #         "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
+    # #         "start_time": "2019-06-15T23:00:00.000Z"
+    # #     }],
+    # #     "upcoming_shows": [],
+    # #     "past_shows_count": 1,
+    # #     "upcoming_shows_count": 0,
+    # # }
+    # # data3 = {
+    # #     "id": 6,
+    # #     "name": "The Wild Sax Band",
+    # #     "genres": ["Jazz", "Classical"],
+    # #     "city": "San Francisco",
+    # #     "state": "CA",
+    # #     "phone": "432-325-5432",
+    # #     "seeking_venue": False,
+    # #     "image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    # #     "past_shows": [],
+    # #     "upcoming_shows": [{
+    # #         "venue_id": 3,
+    # #         "venue_name": "Park Square Live Music & Coffee",
+    # #         "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
+    # #         "start_time": "2035-04-01T20:00:00.000Z"
+    # #     }, {
+    # #         "venue_id": 3,
+    # #         "venue_name": "Park Square Live Music & Coffee",
+    # #         "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
+    # #         "start_time": "2035-04-08T20:00:00.000Z"
+    # #     }, {
+    # #         "venue_id": 3,
+    # #         "venue_name": "Park Square Live Music & Coffee",
+    # #         "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
+    # #         "start_time": "2035-04-15T20:00:00.000Z"
+    # #     }],
+    # #     "past_shows_count": 0,
+    # #     "upcoming_shows_count": 3,
+    # # }
+    # data = list(filter(lambda d: d['id'] ==
+    #             artist_id, [data1, data2, data3]))[0]
+    # return render_template('pages/show_artist.html', artist=data)
+    return render_template('pages/show_artist.html', artist=curr_artist)
+
+
+@bp.route('/artists/<int:artist_id>/calendar')
+def artist_calendar(artist_id):
+    # Bucketed (week/month/year) show counts for an artist,
+    # optionally restricted with '?from=&to='
+    artist = Artist.query.get_or_404(artist_id)
+    calendar = get_calendar_data(artist, Show.artist_id, 'artist')
+    return render_template('pages/calendar.html', calendar=calendar)
+
+
+@bp.route('/artists/<int:artist_id>/matches')
+def artist_matches(artist_id):
+    # Venues seeking talent, ranked by genre overlap, location and
+    # past shows of this artist (see 'matchmaking.py')
+    limit = min(max(request.args.get('limit', MATCHES_DEFAULT_LIMIT, type=int), 1),
+                MATCHES_MAX_LIMIT)
+    venues = matches.recommend_venues(artist_id, limit)
+    if venues is None:
+        abort(404)
+    return jsonify({"count": len(venues), "data": venues})
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+    from forms import ArtistForm
+    form = ArtistForm()
+
+    # # Mock Data provided by default
+    # artist = {
+    #     "id": 4,
+    #     "name": "Guns N Petals",
+    #     "genres": ["Rock n Roll"],
+    #     "city": "San Francisco",
+    #     "state": "CA",
+    #     "phone": "326-123-5000",
+    #     "website": "https://www.gunsnpetalsband.com",
+    #     "facebook_link": "https://www.facebook.com/GunsNPetals",
+    #     "seeking_venue": True,
+    #     "seeking_description": "Looking for shows to perform at in the San Francisco Bay Area!",
+    #     "image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80"
+    # }
+
+    # TODO: populate form with fields from artist with ID <artist_id>
+
+    artist = Artist.query.get_or_404(artist_id)
+
+    form.name.data = artist.name
+    form.city.data = artist.city
+    form.state.data = artist.state
+    form.phone.data = artist.phone
+    form.website_link.data = artist.website
+    form.facebook_link.data = artist.facebook_link
+    form.seeking_venue.data = artist.seeking_venue
+    form.seeking_description.data = artist.seeking_description
+    form.image_link.data = artist.image_link
+
+    # Load genres
+    genres = []
+    for genre in artist.genres:
+        genres.append(genre.name)
+
+    form.genres.data = genres
+
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+    # TODO: take values from the form submitted, and update existing
+    # artist record with ID <artist_id> using the new attributes
+
+    error = False
+    updated_id = None
+    artist_name = request.form.get('name', '')
+    try:
+        updated_id = services.update_artist(
+            artist_id, services.get_artist_fields(request.form),
+            request.form.getlist('genres'))
+
+    except exc.SQLAlchemyError:
+        error = True
+        logger.exception('Updating artist %s failed', artist_id)
+
+    except Exception:
+        error = True
+        logger.exception('Updating artist %s failed', artist_id)
+
+    if error:
+        flash(f'Error updating artist "{artist_name}"', 'error')
+    elif updated_id is None:
+        abort(404)
+    else:
+        enqueue_follow_ups('artist', request.form.get('image_link'))
+        flash(f'Successfully updated artist "{artist_name}"', 'info')
+
+    return redirect(url_for('.show_artist', artist_id=artist_id))
+
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+
+@bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+    from forms import ArtistForm
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+
+@bp.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+    # called upon submitting the new artist listing form
+    # Artist and its genres are written in one round trip by the
+    # service layer, then redirect-after-POST to the new artist's page
+
+    error = False
+    artist_id = None
+    artist_name = request.form.get('name', '')
+    try:
+        artist_id = services.create_artist(
+            services.get_artist_fields(request.form),
+            request.form.getlist('genres'))
+
+    except exc.SQLAlchemyError:
+        logger.exception('Creating artist %r failed', artist_name)
+        error = True
+
+    except Exception:
+        error = True
+        logger.exception('Creating artist %r failed', artist_name)
+
+    finally:
+        if error:
+            flash(
+                f'An error occurred. Artist "{artist_name}" could not be listed.')
+            return redirect(url_for('.create_artist_form'))
+
+        enqueue_follow_ups('artist', request.form.get('image_link'))
+        flash(f'Artist "{artist_name}:{artist_id}" was successfully listed!')
+        return redirect(url_for('.show_artist', artist_id=artist_id))
@@ -0,0 +1,169 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:     # optional: '.br' variants are skipped without it
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Static asset pipeline.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# 'flask assets build' concatenates each bundle below, minifies it,
+# writes it to static/dist/ under a content-hashed name together
+# with precompressed '.gz' / '.br' copies, and records the mapping
+# in static/dist/manifest.json.
+#
+# Templates call 'asset_urls(<bundle>)': the hashed file when the
+# manifest has it, otherwise the individual source files (so a
+# fresh checkout works without a build). Hashed files never change,
+# so they are served with a one year 'immutable' Cache-Control.
+####################################################################
+
+ASSETS_DIST = 'dist'
+ASSETS_MANIFEST = 'manifest.json'
+ASSETS_MAX_AGE = 365 * 24 * 60 * 60     # seconds
+
+# bundle name -> source files (relative to the static folder), in load order
+BUNDLES = {
+    'css/bundle.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # loaded synchronously in <head>
+    'js/head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    # deferred, runs after jQuery (loaded at the end of <body>)
+    'js/deferred.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+
+def minify_css(source):
+    # Conservative: drops comments and redundant whitespace only
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    # Only trims line whitespace: the libraries are shipped minified
+    # already, and anything smarter needs a real JS parser
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def build_bundle(static_folder, name, sources):
+    contents = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+            contents.append(f.read())
+
+    if name.endswith('.css'):
+        data = minify_css('\n'.join(contents))
+    else:
+        data = ';\n'.join(minify_js(content) for content in contents)
+    data = data.encode('utf-8')
+
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    base, extension = os.path.splitext(name)
+    hashed_name = f'{base}.{digest}{extension}'
+
+    output = os.path.join(static_folder, ASSETS_DIST, hashed_name)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'wb') as f:
+        f.write(data)
+    with open(output + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(output + '.br', 'wb') as f:
+            f.write(brotli.compress(data))
+
+    return hashed_name
+
+
+def build_assets(static_folder):
+    manifest = {
+        name: build_bundle(static_folder, name, sources)
+        for name, sources in BUNDLES.items()
+    }
+
+    with open(os.path.join(static_folder, ASSETS_DIST, ASSETS_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, ASSETS_DIST, ASSETS_MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_urls(name):
+    manifest = current_app.extensions['assets']
+    if name in manifest:
+        return [url_for('static_dist', filename=manifest[name])]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+
+def serve_static_dist(filename):
+    # Serves a hashed bundle, preferring a precompressed variant
+    # the client accepts
+    dist_folder = os.path.join(current_app.static_folder, ASSETS_DIST)
+    accepted = request.accept_encodings
+
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[encoding] and os.path.isfile(os.path.join(dist_folder, filename + suffix)):
+            response = send_from_directory(dist_folder, filename + suffix)
+            response.headers['Content-Encoding'] = encoding
+            response.mimetype = 'text/css' if filename.endswith(
+                '.css') else 'application/javascript'
+            break
+    else:
+        response = send_from_directory(dist_folder, filename)
+
+    response.headers['Cache-Control'] = f'public, max-age={ASSETS_MAX_AGE}, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+assets_cli = AppGroup('assets', help='Static asset pipeline.')
+
+
+@assets_cli.command('build')
+def build_command():
+    """Bundle, minify, fingerprint and precompress static assets."""
+    manifest = build_assets(current_app.static_folder)
+    for name, hashed_name in sorted(manifest.items()):
+        click.echo(f'{name} -> {ASSETS_DIST}/{hashed_name}')
+    if brotli is None:
+        click.echo('brotli not installed: skipped .br variants')
+
+
+def init_assets(app):
+    app.extensions['assets'] = load_manifest(app.static_folder)
+    app.add_url_rule(f'{app.static_url_path}/{ASSETS_DIST}/<path:filename>',
+                     'static_dist', serve_static_dist)
+    app.jinja_env.globals['asset_urls'] = asset_urls
+    app.cli.add_command(assets_cli)
@@ -0,0 +1,253 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete
+from database import db
+from models import Venue, Artist, VenueGenre, ArtistGenre, Show
+
+#----------------------------------------------------------------------------#
+# Benchmarks.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# 'flask bench writes' posts to the write endpoints through the
+# test client (the full request/response cycle, without a network)
+# and reports p50/p95/max latency per endpoint. Everything it creates
+# is deleted again afterwards, so it can be run against a dev database.
+#
+# 'flask bench startup' measures a worker's cold start: importing
+# 'app' and calling 'create_app()' in a fresh interpreter, with
+# 'python -X importtime' showing which imports cost the most. With
+# '--max-ms' it fails when the start takes longer, for CI.
+#
+# 'flask bench pages' fetches the big read pages once per encoding
+# (identity, gzip, br) and reports the bytes on the wire, the time
+# to the first body chunk (TTFB) and to the last one.
+####################################################################
+
+BENCH_PREFIX = '[bench]'
+BENCH_PAGES = ('/shows', '/venues', '/artists', '/')
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))]
+
+
+def time_request(client, samples, url, data):
+    start = time.perf_counter()
+    response = client.post(url, data=data)
+    samples.append((time.perf_counter() - start) * 1000)
+    if response.status_code >= 400:
+        raise click.ClickException(f'POST {url} returned {response.status_code}')
+    return response
+
+
+def get_created_id(response):
+    # the create handlers redirect to '/<entity>/<id>'
+    return int(response.headers['Location'].rstrip('/').rsplit('/', 1)[-1])
+
+
+def get_bench_ids():
+    venue_ids = [venue_id for (venue_id,) in db.session.query(Venue.id).filter(
+        Venue.name.startswith(BENCH_PREFIX))]
+    artist_ids = [artist_id for (artist_id,) in db.session.query(Artist.id).filter(
+        Artist.name.startswith(BENCH_PREFIX))]
+    return venue_ids, artist_ids
+
+
+def cleanup():
+    venue_ids, artist_ids = get_bench_ids()
+
+    db.session.execute(delete(Show).where(
+        Show.venue_id.in_(venue_ids) | Show.artist_id.in_(artist_ids)))
+    db.session.execute(delete(VenueGenre).where(VenueGenre.venue_id.in_(venue_ids)))
+    db.session.execute(delete(ArtistGenre).where(ArtistGenre.artist_id.in_(artist_ids)))
+    db.session.execute(delete(Venue).where(Venue.id.in_(venue_ids)))
+    db.session.execute(delete(Artist).where(Artist.id.in_(artist_ids)))
+    db.session.commit()
+
+
+bench_cli = AppGroup('bench', help='Performance benchmarks.')
+
+
+@bench_cli.command('writes')
+@click.option('-n', '--iterations', default=50, show_default=True,
+              help='Requests per endpoint.')
+def writes_command(iterations):
+    """Measure the latency of the create/edit/delete endpoints."""
+    client = current_app.test_client()
+    current_app.config['WTF_CSRF_ENABLED'] = False
+
+    timings = {name: [] for name in (
+        'create venue', 'edit venue', 'create artist', 'edit artist',
+        'create show', 'delete venue')}
+    base_time = datetime.now().replace(minute=0, second=0, microsecond=0) + \
+        timedelta(days=3650)
+
+    try:
+        for i in range(iterations):
+            venue = {
+                "name": f'{BENCH_PREFIX} venue {i}', "city": 'San Francisco',
+                "state": 'CA', "address": '1 Bench St', "phone": '123-123-1234',
+                "genres": ['Jazz', 'Blues'], "seeking_talent": 'y'
+            }
+            artist = {
+                "name": f'{BENCH_PREFIX} artist {i}', "city": 'San Francisco',
+                "state": 'CA', "phone": '123-123-1234', "genres": ['Jazz']
+            }
+
+            venue_id = get_created_id(time_request(
+                client, timings['create venue'], '/venues/create', venue))
+            time_request(client, timings['edit venue'],
+                         f'/venues/{venue_id}/edit', dict(venue, genres=['Folk']))
+
+            artist_id = get_created_id(time_request(
+                client, timings['create artist'], '/artists/create', artist))
+            time_request(client, timings['edit artist'],
+                         f'/artists/{artist_id}/edit', dict(artist, genres=['Rock n Roll']))
+
+            time_request(client, timings['create show'], '/shows/create', {
+                "venue_id": venue_id, "artist_id": artist_id,
+                "start_time": (base_time + timedelta(hours=i * 4)).isoformat(),
+                "duration": 60
+            })
+
+        # shows would block the venue delete, drop them first
+        venue_ids, artist_ids = get_bench_ids()
+        db.session.execute(delete(Show).where(Show.venue_id.in_(venue_ids)))
+        db.session.commit()
+
+        for venue_id in venue_ids:
+            time_request(client, timings['delete venue'], f'/venues/{venue_id}', {})
+
+    finally:
+        cleanup()
+
+    click.echo(f'{"endpoint":<16}{"p50 ms":>10}{"p95 ms":>10}{"max ms":>10}')
+    for name, samples in timings.items():
+        if samples:
+            click.echo(f'{name:<16}{statistics.median(samples):>10.2f}'
+                       f'{percentile(samples, 0.95):>10.2f}{max(samples):>10.2f}')
+
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print((imported - start) * 1000, (created - imported) * 1000)
+"""
+
+
+def run_startup(root):
+    # (import ms, create_app ms, {top-level module: cumulative import us})
+    env = dict(os.environ)
+    env.pop('FLASK_RUN_FROM_CLI', None)     # start like a WSGI worker
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+        cwd=root, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise click.ClickException(result.stderr.strip().splitlines()[-1])
+
+    # 'import time: self [us] | cumulative | imported package', nested
+    # imports indented by two more spaces and listed before their
+    # importer: keep what 'app' imports directly
+    modules = {}
+    children = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children[name.strip()] = int(cumulative)
+        elif depth == 0:
+            if name.strip() == 'app':
+                modules = children
+            children = {}
+
+    import_ms, create_ms = map(float, result.stdout.split()[-2:])
+    return import_ms, create_ms, modules
+
+
+@bench_cli.command('startup')
+@click.option('-n', '--runs', default=3, show_default=True,
+              help='Fresh interpreters to start; the fastest run is reported.')
+@click.option('--top', default=15, show_default=True,
+              help="Slowest of app.py's imports to list.")
+@click.option('--max-ms', type=float, default=None,
+              help='Fail if import + create_app() takes longer.')
+def startup_command(runs, top, max_ms):
+    """Measure worker cold-start time (imports and create_app)."""
+    best = min((run_startup(current_app.root_path) for _ in range(max(runs, 1))),
+               key=lambda run: run[0] + run[1])
+    import_ms, create_ms, modules = best
+
+    click.echo(f'{"module":<32}{"cumulative ms":>14}')
+    for name in sorted(modules, key=modules.get, reverse=True)[:top]:
+        click.echo(f'{name:<32}{modules[name] / 1000:>14.1f}')
+    click.echo(f'import app: {import_ms:.1f} ms, create_app(): {create_ms:.1f} ms, '
+               f'total: {import_ms + create_ms:.1f} ms')
+
+    if max_ms is not None and import_ms + create_ms > max_ms:
+        raise click.ClickException(
+            f'startup took {import_ms + create_ms:.1f} ms, budget is {max_ms:.1f} ms')
+
+
+def time_page(client, url, encoding):
+    # (bytes on the wire, ms to the first chunk, ms to the last one)
+    start = time.perf_counter()
+    response = client.get(url, headers={"Accept-Encoding": encoding}, buffered=False)
+    size, first = 0, None
+    try:
+        for chunk in response.response:
+            if first is None:
+                first = time.perf_counter()
+            size += len(chunk)
+    finally:
+        response.close()
+    end = time.perf_counter()
+    if response.status_code != 200:
+        raise click.ClickException(f'GET {url} returned {response.status_code}')
+    if response.headers.get('Content-Encoding', 'identity') != encoding:
+        return None
+    return size, ((first or end) - start) * 1000, (end - start) * 1000
+
+
+@bench_cli.command('pages')
+@click.option('-n', '--runs', default=20, show_default=True,
+              help='Requests per page and encoding; medians are reported.')
+@click.option('-u', '--url', 'urls', multiple=True,
+              help=f'Page to fetch, repeatable [default: {", ".join(BENCH_PAGES)}].')
+def pages_command(runs, urls):
+    """Measure bytes on the wire and time to first byte per encoding."""
+    client = current_app.test_client()
+
+    click.echo(f'{"page":<12}{"encoding":<10}{"bytes":>10}{"ratio":>8}'
+               f'{"ttfb ms":>10}{"total ms":>10}')
+    for url in urls or BENCH_PAGES:
+        time_page(client, url, 'identity')      # warm up caches
+        identity_size = None
+        for encoding in ('identity', 'gzip', 'br'):
+            samples = [time_page(client, url, encoding) for _ in range(max(runs, 1))]
+            if None in samples:
+                click.echo(f'{url:<12}{encoding:<10}{"not offered":>10}')
+                continue
+            size = samples[-1][0]
+            identity_size = identity_size or size
+            click.echo(f'{url:<12}{encoding:<10}{size:>10}{size / identity_size:>8.2f}'
+                       f'{statistics.median(s[1] for s in samples):>10.2f}'
+                       f'{statistics.median(s[2] for s in samples):>10.2f}')
+
+
+def init_benchmarks(app):
+    app.cli.add_command(bench_cli)
@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+from jinja2 import nodes
+from jinja2.ext import Extension
+from database import on_commit
+from models import Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Caching helpers.
+#----------------------------------------------------------------------------#
+
+
+class LRUCache:
+    # Bounded, thread-safe least-recently-used cache. Entries also
+    # expire after 'ttl' seconds (None = never), which bounds how stale
+    # a worker can get when another worker changes the underlying data.
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class NullCache:
+    # Same interface, keeps nothing (FRAGMENT_CACHE_BACKEND = 'none')
+    hits = 0
+    misses = 0
+
+    def get(self, key, default=None):
+        return default
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+def get_fragment_cache(config):
+    backend = config['FRAGMENT_CACHE_BACKEND']
+    if backend == 'none':
+        return NullCache()
+    if backend == 'memory':
+        return LRUCache(maxsize=config['FRAGMENT_CACHE_SIZE'],
+                        ttl=config['FRAGMENT_CACHE_TTL'])
+    raise ValueError(f'Unknown FRAGMENT_CACHE_BACKEND "{backend}"')
+
+
+####################################################################
+# Entity versions: a per-process counter per (kind, id), bumped
+# whenever a write to that venue/artist is committed. Fragment keys
+# include them, so editing one artist only invalidates its tiles.
+#
+# Only the worker that handled the write sees the new version; the
+# fragments (also per process) have no shared store to keep it in.
+# Other workers keep serving the old tiles until they expire, so an
+# edit can take up to FRAGMENT_CACHE_TTL seconds to show everywhere.
+####################################################################
+
+_versions = {}
+
+
+def get_version(kind, entity_id):
+    return _versions.get((kind, entity_id), 0)
+
+
+def bump_version(kind, entity_id):
+    _versions[(kind, entity_id)] = get_version(kind, entity_id) + 1
+
+
+def versioned(kind, entity_id):
+    # used in templates as part of a '{% cache %}' key
+    return (kind, entity_id, get_version(kind, entity_id))
+
+
+on_commit(Venue, lambda venue_id: bump_version('venue', venue_id))
+on_commit(Artist, lambda artist_id: bump_version('artist', artist_id))
+
+
+####################################################################
+# Jinja fragment cache:
+#
+#   {% cache 'show-tile', show.start_time, versioned('artist', show.artist_id) %}
+#       ... expensive markup ...
+#   {% endcache %}
+#
+# The comma separated expressions form the key; the rendered body is
+# kept in the environment's bounded LRU ('environment.fragment_cache').
+####################################################################
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=LRUCache())
+        environment.globals['versioned'] = versioned
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.Tuple(key_parts, 'load')]),
+            [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key, caller):
+        cache = self.environment.fragment_cache
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = caller()
+            cache.set(key, fragment)
+        return fragment
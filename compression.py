@@ -0,0 +1,146 @@
+import zlib
+from flask import current_app, request
+from metrics import metrics
+
+try:
+    import brotli
+except ImportError:     # optional: without it, only gzip is offered
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Response compression.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# Text responses (HTML, JSON, CSS, JS, ...) are compressed with the
+# first of COMPRESS_ENCODINGS that the client accepts (Accept-Encoding,
+# q-values respected), 'br' needing the 'brotli' package:
+#   - whole responses only from COMPRESS_MIN_SIZE bytes on (below
+#     that the headers cost more than compression saves)
+#   - streamed responses (see 'utils.stream_page') chunk by chunk,
+#     flushing the compressor after every chunk, so the browser gets
+#     the page head while the rest is still being rendered
+# Responses that are already encoded (the precompressed static
+# bundles) or sent from a file (images) are left alone.
+#
+# Levels are tuned for pages compressed on every request, not for
+# the smallest output: COMPRESS_LEVEL (gzip) and
+# COMPRESS_BROTLI_QUALITY. 'flask bench pages' shows the bytes sent
+# and the time to first byte per encoding.
+####################################################################
+
+COMPRESS_MIMETYPES = frozenset((
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/calendar',
+    'application/json', 'application/javascript', 'image/svg+xml',
+))
+
+
+class GzipEncoder:
+    def __init__(self, level):
+        # wbits 16 + MAX_WBITS: a gzip header and trailer around deflate
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        # everything so far, decodable by the client right away
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+ENCODERS = {
+    'br': lambda config: BrotliEncoder(config['COMPRESS_BROTLI_QUALITY']),
+    'gzip': lambda config: GzipEncoder(config['COMPRESS_LEVEL']),
+}
+
+
+def get_encodings(config):
+    return [encoding for encoding in config['COMPRESS_ENCODINGS']
+            if encoding != 'br' or brotli is not None]
+
+
+def negotiate_encoding(encodings):
+    # None: send it as it is ('identity')
+    if not encodings:
+        return None
+    return request.accept_encodings.best_match(encodings)
+
+
+def compress_stream(chunks, encoder, encoding):
+    size = compressed_size = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = encoder.compress(chunk) + encoder.flush()
+            size += len(chunk)
+            compressed_size += len(data)
+            if data:
+                yield data
+        data = encoder.finish()
+        compressed_size += len(data)
+        yield data
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+        metrics.inc('fyyur_compression_input_bytes_total', size, encoding=encoding)
+        metrics.inc('fyyur_compression_output_bytes_total', compressed_size, encoding=encoding)
+
+
+def compress_response(response):
+    if response.direct_passthrough or request.method == 'HEAD' or \
+            response.status_code < 200 or response.status_code in (204, 206, 304) or \
+            'Content-Encoding' in response.headers or \
+            response.mimetype not in COMPRESS_MIMETYPES:
+        return response
+
+    config = current_app.config
+    if not response.is_streamed and \
+            response.calculate_content_length() < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(get_encodings(config))
+    if encoding is None:
+        return response
+
+    encoder = ENCODERS[encoding](config)
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoder, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        response.set_data(encoder.compress(data) + encoder.finish())
+        metrics.inc('fyyur_compression_input_bytes_total', len(data), encoding=encoding)
+        metrics.inc('fyyur_compression_output_bytes_total',
+                    response.content_length, encoding=encoding)
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # no longer the same bytes as the uncompressed representation
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    if not get_encodings(app.config):
+        return      # off: no hook at all
+    app.after_request(compress_response)
@@ -1,14 +1,316 @@
+import json
 import os
-SECRET_KEY = os.urandom(32)
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
 
-# Connect to the database
+def get_secret_key(path):
+    # One key shared by every worker (sessions and flash messages are
+    # signed with it): SECRET_KEY from the environment, otherwise a
+    # random key generated once into 'path'
+    if os.environ.get('SECRET_KEY'):
+        return os.environ['SECRET_KEY']
+    if not os.path.exists(path):
+        temp_path = f'{path}.{os.getpid()}'
+        with open(temp_path, 'w') as f:
+            f.write(os.urandom(32).hex())
+        os.chmod(temp_path, 0o600)
+        try:
+            os.link(temp_path, path)    # atomic: the first worker wins
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+    with open(path) as f:
+        return f.read().strip()
+
+
+####################################################################
+# Config profiles: FYYUR_PROFILE picks one of 'dev' (the default),
+# 'test', 'bench' or 'prod' (see PROFILES at the bottom). On top of
+# the profile, any setting can be overridden from the environment as
+# FYYUR_<SETTING>, e.g.
+#
+#     FYYUR_PROFILE=prod FYYUR_DATABASE_POOL_SIZE=20 gunicorn 'app:create_app()'
+#
+# Values are parsed after the profile's default: numbers, booleans
+# ('true'/'false'), and JSON for lists, tuples and dicts.
+# DATABASE_URL and SECRET_KEY are read as well.
+#
+# 'flask config show' prints the profile and every effective value.
+####################################################################
+
+class Config:
+    DEBUG = False
+    TESTING = False
+    SECRET_KEY = None       # set by load_config(), see get_secret_key()
+
+    # Sessions (see 'sessions.py'): 'filesystem', 'sqlite' or 'cookie'
+    SESSION_BACKEND = 'filesystem'
+    SESSION_DIR = os.path.join(basedir, '.sessions')
+    SESSION_SQLITE_PATH = os.path.join(basedir, '.sessions.db')
+    WTF_CSRF_CHECK_DEFAULT = False      # 'sessions.check_csrf' checks instead
+
+    # Connect to the database
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL', 'postgresql://postgres@localhost:5432/fyyur_db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ECHO = False
+
+    # Connection pool of each engine (primary and replicas); ignored
+    # for SQLite
+    DATABASE_POOL_SIZE = 5
+    DATABASE_MAX_OVERFLOW = 10
+    DATABASE_POOL_TIMEOUT = 30          # seconds to wait for a connection
+    DATABASE_POOL_RECYCLE = 1800        # seconds before a connection is replaced
+    DATABASE_POOL_PRE_PING = False
+
+    # Read replicas (see 'replicas.py'): read-only views query one of
+    # these; writes, and reads by a client within REPLICA_STICKY_SECONDS
+    # of its last write, use SQLALCHEMY_DATABASE_URI
+    SQLALCHEMY_REPLICA_URIS = []
+    REPLICA_STICKY_SECONDS = 5
+
+    # Templates: recompiled when changed on disk (slow, for development)
+    # or compiled once and cached on disk
+    TEMPLATES_AUTO_RELOAD = False
+    TEMPLATE_BYTECODE_CACHE_DIR = os.path.join(basedir, '.jinja_cache')
+
+    # Rendered tile fragments ('{% cache %}' blocks): 'memory' keeps
+    # them in a bounded in-process LRU, 'none' renders every time.
+    # With several workers an edit shows in the other workers' tiles
+    # only once theirs expire: FRAGMENT_CACHE_TTL is the staleness window
+    FRAGMENT_CACHE_BACKEND = 'memory'
+    FRAGMENT_CACHE_SIZE = 4096          # fragments
+    FRAGMENT_CACHE_TTL = 60             # seconds
+
+    # Search (see 'search.py', 'ratelimit.py'): GET results may be
+    # cached for SEARCH_CACHE_MAX_AGE seconds; every client gets a
+    # token bucket of RATELIMIT_BURST searches, refilled at
+    # RATELIMIT_RATE per second, kept in 'memory' or 'redis'
+    SEARCH_CACHE_MAX_AGE = 60           # seconds
+    RATELIMIT_BACKEND = 'memory'
+    RATELIMIT_REDIS_URL = 'redis://localhost:6379/0'
+    RATELIMIT_RATE = 1.0                # searches per second
+    RATELIMIT_BURST = 10
+
+    # Reverse proxies in front of the app (e.g. 1 for nginx): the
+    # client address and scheme are then taken from the last
+    # PROXY_COUNT X-Forwarded-For/-Proto entries, which only those
+    # proxies can set. 0 = not behind a proxy, the headers are ignored
+    PROXY_COUNT = 0
+
+    # Response compression (see 'compression.py'): text responses of
+    # COMPRESS_MIN_SIZE bytes or more, and streamed pages, are sent in
+    # the first of COMPRESS_ENCODINGS the client accepts, [] = off
+    COMPRESS_ENCODINGS = ['br', 'gzip']     # 'br' needs the 'brotli' package
+    COMPRESS_MIN_SIZE = 500             # bytes
+    COMPRESS_LEVEL = 6                  # gzip, 1 - 9
+    COMPRESS_BROTLI_QUALITY = 4         # brotli, 0 - 11
+
+    # JSON responses with sorted keys (stable, but slower)
+    JSON_SORT_KEYS = False
+
+    # Structured logs (see 'logs.py'): JSON lines, written by a
+    # background thread to a rotating file and/or stderr
+    LOG_LEVEL = 'INFO'
+    LOG_FILE = os.path.join(basedir, 'fyyur.log')    # None = no file
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 5
+    LOG_STDERR = False
+
+    # Metrics ('/metrics', see 'metrics.py'): with several worker
+    # processes, set METRICS_DIR to a directory they share
+    METRICS_DIR = None
+    METRICS_FLUSH_INTERVAL = 5          # seconds
+
+    # Sampling profiler (see 'profiling.py'), off unless a sample rate
+    # or a token is set; profiles are written to PROFILE_DIR
+    PROFILE_SAMPLE_RATE = 0.0           # fraction of requests, 0.0 - 1.0
+    PROFILE_ENDPOINTS = []              # e.g. ["venues.venues", "shows.shows"], [] = all
+    PROFILE_HEADER = 'X-Profile'
+    PROFILE_TOKEN = None                # requests sending it in PROFILE_HEADER are profiled
+    PROFILE_INTERVAL = 0.005            # seconds between stack samples
+    PROFILE_DIR = os.path.join(basedir, '.profiles')
+
+    # '/venues' directory snapshot (see 'directory.py'), shared by
+    # the workers of one host through DIRECTORY_SNAPSHOT_PATH
+    DIRECTORY_SNAPSHOT_PATH = os.path.join(basedir, '.snapshots', 'venues.pickle')
+    DIRECTORY_REBUILD_DELAY = 2         # seconds after a venue/show write
+    DIRECTORY_REBUILD_INTERVAL = 300    # seconds, rebuilt at least this often
+
+    # Show partitions (Postgres, see 'partitions.py'): monthly 'hot'
+    # partitions from SHOW_PARTITION_HOT_MONTHS back to
+    # SHOW_PARTITION_MONTHS_AHEAD ahead, yearly 'cold' ones before that
+    SHOW_PARTITION_HOT_MONTHS = 3
+    SHOW_PARTITION_MONTHS_AHEAD = 12
+    SHOW_PARTITION_CHECK_INTERVAL = 3600    # seconds, 0 = only 'flask partitions create'
+    SHOW_COLD_TABLESPACE = None         # tablespace for merged yearly partitions
+
+    # Image proxy ('/img'): thumbnails of image links are cached on disk
+    IMAGE_CACHE_DIR = os.path.join(basedir, '.image_cache')
+    IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+    IMAGE_WIDTHS = (160, 320, 640, 960)
+    IMAGE_PROXY_HOSTS = ('images.unsplash.com',)
+    IMAGE_PROXY_LOCAL_ROOT = None       # directory allowed for 'file://' sources
+    IMAGE_FETCH_TIMEOUT = 5             # seconds
+    IMAGE_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+
+    # Background jobs (see 'jobs.py'): 'memory' or 'database'
+    JOB_QUEUE_BACKEND = 'memory'
+    JOB_WORKERS = 2                     # threads per process, 0 = run inline
+    JOB_MAX_ATTEMPTS = 5
+    JOB_RETRY_BACKOFF = 2               # seconds, doubled after every failure
+    JOB_POLL_INTERVAL = 1               # seconds between polls of the 'Job' table
+    JOB_LEASE_TIMEOUT = 300             # seconds before a stuck job is picked up again
+
+    # Trending scores (see 'trending.py'): buffered deltas are written
+    # every TRENDING_FLUSH_INTERVAL seconds and on shutdown (an empty
+    # table is seeded by the first run)
+    TRENDING_FLUSH_INTERVAL = 30        # seconds
+
+    # Page-view analytics (see 'analytics.py'): hits are buffered and
+    # written every ANALYTICS_FLUSH_INTERVAL seconds or ANALYTICS_FLUSH_EVENTS
+    # hits, whichever comes first, and on shutdown
+    ANALYTICS_FLUSH_INTERVAL = 5        # seconds
+    ANALYTICS_FLUSH_EVENTS = 1000
+    ANALYTICS_DAYS = 30                 # days shown on '/analytics'
+
+
+class DevConfig(Config):
+    # Enable debug mode.
+    DEBUG = True
+    TEMPLATES_AUTO_RELOAD = True
+    FRAGMENT_CACHE_BACKEND = 'none'     # template edits show up right away
+    JSON_SORT_KEYS = True
+    LOG_STDERR = True
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL', 'postgresql://postgres@localhost:5432/fyyur_test')
+    WTF_CSRF_ENABLED = False
+    SESSION_BACKEND = 'cookie'
+    FRAGMENT_CACHE_BACKEND = 'none'
+    JSON_SORT_KEYS = True
+    LOG_FILE = None
+    RATELIMIT_BURST = 1000
+    JOB_WORKERS = 0                     # jobs run inline, deterministically
+
+
+class ProdConfig(Config):
+    DATABASE_POOL_SIZE = 10
+    DATABASE_MAX_OVERFLOW = 20
+    DATABASE_POOL_PRE_PING = True
+    JOB_QUEUE_BACKEND = 'database'
+
+
+class BenchConfig(ProdConfig):
+    # production settings against a throwaway database
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL', 'postgresql://postgres@localhost:5432/fyyur_bench')
+    JOB_QUEUE_BACKEND = 'memory'
+
+
+PROFILES = {
+    'dev': DevConfig,
+    'test': TestConfig,
+    'bench': BenchConfig,
+    'prod': ProdConfig,
+}
+ENV_PREFIX = 'FYYUR_'
+
+
+def parse_env_value(raw, default):
+    if isinstance(default, bool):
+        if raw.strip().lower() not in ('1', 'true', 'yes', 'on', '0', 'false', 'no', 'off', ''):
+            raise ValueError(f'expected a boolean, got "{raw}"')
+        return raw.strip().lower() in ('1', 'true', 'yes', 'on')
+    if isinstance(default, int):
+        return int(raw)
+    if isinstance(default, float):
+        return float(raw)
+    if isinstance(default, (list, tuple, dict)):
+        value = json.loads(raw)
+        return tuple(value) if isinstance(default, tuple) else value
+    return raw
+
+
+def get_engine_options(config):
+    if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return {}
+    return {
+        "pool_size": config['DATABASE_POOL_SIZE'],
+        "max_overflow": config['DATABASE_MAX_OVERFLOW'],
+        "pool_timeout": config['DATABASE_POOL_TIMEOUT'],
+        "pool_recycle": config['DATABASE_POOL_RECYCLE'],
+        "pool_pre_ping": config['DATABASE_POOL_PRE_PING'],
+    }
+
+
+def load_config(app, profile=None):
+    # Profile, then FYYUR_<SETTING> overrides, then derived settings
+    profile = profile or os.environ.get('FYYUR_PROFILE', 'dev')
+    if profile not in PROFILES:
+        raise ValueError(
+            f'Unknown config profile "{profile}" (expected one of {", ".join(PROFILES)})')
+    app.config.from_object(PROFILES[profile])
+
+    overrides = []
+    for name in get_setting_names(profile):
+        raw = os.environ.get(ENV_PREFIX + name)
+        if raw is not None:
+            try:
+                app.config[name] = parse_env_value(raw, app.config[name])
+            except ValueError as err:
+                raise ValueError(f'{ENV_PREFIX}{name}: {err}')
+            overrides.append(name)
+
+    # resolved here, not when this module is imported: it may have to
+    # create '.secret_key'
+    if not app.config['SECRET_KEY']:
+        app.config['SECRET_KEY'] = get_secret_key(os.path.join(basedir, '.secret_key'))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options(app.config)
+    app.config['CONFIG_PROFILE'] = profile
+    app.config['CONFIG_OVERRIDES'] = overrides
+
+
+def get_setting_names(profile):
+    return sorted(name for name in dir(PROFILES[profile]) if name.isupper())
+
+
+def get_display_value(name, value):
+    # hides secrets, including passwords inside database URIs
+    if name == 'SECRET_KEY':
+        return '********'
+    if isinstance(value, str) and '://' in value and '@' in value:
+        scheme, rest = value.split('://', 1)
+        credentials, host = rest.rsplit('@', 1)
+        if ':' in credentials:
+            return f'{scheme}://{credentials.split(":", 1)[0]}:********@{host}'
+    if isinstance(value, (list, tuple)):
+        return [get_display_value(name, item) for item in value]
+    return value
+
+
+config_cli = AppGroup('config', help='Configuration profiles.')
+
+
+@config_cli.command('show')
+def show_command():
+    """Print the config profile and its effective settings."""
+    config = current_app.config
+    profile = config['CONFIG_PROFILE']
+    click.echo(f'profile: {profile}')
+    for name in get_setting_names(profile) + ['SQLALCHEMY_ENGINE_OPTIONS']:
+        source = ' (env)' if name in config['CONFIG_OVERRIDES'] else ''
+        click.echo(f'{name} = {get_display_value(name, config[name])!r}{source}')
 
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://postgres@localhost:5432/fyyur_db'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
+def init_config(app):
+    app.cli.add_command(config_cli)
@@ -1,4 +1,55 @@
-import imp
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+# 'RoutingSession' sends read-only views to the replicas, if any
+# are configured (see 'replicas.py')
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+####################################################################
+# Commit hooks: in-process caches register a callback per model and
+# get called with the id of every instance of that model that was
+# inserted, updated or deleted, once the transaction has committed
+# (nothing is called on rollback)
+####################################################################
+
+_commit_hooks = {}
+
+
+def on_commit(model, callback):
+    _commit_hooks.setdefault(model, []).append(callback)
+
+
+def mark_written(session, model, entity_id):
+    # ORM flushes are tracked automatically; Core INSERT/UPDATE/DELETE
+    # statements (see 'services.py') report their writes through this
+    session.info.setdefault('written', set()).add((model, entity_id))
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_writes(session, flush_context):
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if type(instance) in _commit_hooks:
+            mark_written(session, type(instance), instance.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_commit_hooks(session):
+    for model, entity_id in session.info.pop('written', ()):
+        for callback in _commit_hooks.get(model, ()):
+            callback(entity_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_writes(session):
+    session.info.pop('written', None)
+
+
+def upsert(model):
+    # INSERT supporting '.on_conflict_do_update()' for the primary's
+    # dialect (Postgres, or SQLite in local development)
+    dialects = {'postgresql': postgresql, 'sqlite': sqlite}
+    return dialects[db.engine.dialect.name].insert(model)
@@ -0,0 +1,153 @@
+import mmap
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+from database import db, on_commit
+from models import Venue, Show
+from jobs import PeriodicTask
+
+#----------------------------------------------------------------------------#
+# Venue directory snapshot.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# '/venues' lists every venue by city with its upcoming show count,
+# the same page for every visitor. Instead of querying per city on
+# every request, the whole structure is built by one query into a
+# snapshot, pickled to DIRECTORY_SNAPSHOT_PATH (written to a temp
+# file, then renamed, so readers never see a partial one):
+#
+#     [(city, state, [(venue id, name, upcoming shows), ...]), ...]
+#
+# Every worker maps that file (mmap) and unpickles it only when it
+# has changed (a stat per request), swapping the new areas in, so a
+# request only renders the template.
+#
+# It is rebuilt by a background task within DIRECTORY_REBUILD_DELAY
+# seconds of a Venue or Show write committed in this process, and every
+# DIRECTORY_REBUILD_INTERVAL seconds (upcoming shows become past ones
+# as time goes by) unless another worker just did.
+####################################################################
+
+
+def build_snapshot(session):
+    # one query: venues with their upcoming show counts
+    upcoming = func.count(Show.id)
+    rows = session.query(
+        Venue.city, Venue.state, Venue.id, Venue.name, upcoming).outerjoin(
+        Show, and_(Show.venue_id == Venue.id, Show.start_time >= datetime.now())).group_by(
+        Venue.city, Venue.state, Venue.id, Venue.name).order_by(
+        Venue.state, Venue.city, Venue.id).all()
+
+    areas = []
+    for city, state, venue_id, name, num_upcoming_shows in rows:
+        if not areas or areas[-1][:2] != (city, state):
+            areas.append((city, state, []))
+        areas[-1][2].append((venue_id, name, num_upcoming_shows))
+    return areas
+
+
+def write_snapshot(path, areas):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as f:
+        pickle.dump(areas, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def read_snapshot(path):
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return pickle.loads(data)
+
+
+class VenueDirectory:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()    # one rebuild at a time
+        self._stamp = None      # (inode, mtime) of the loaded snapshot
+        self._areas = []        # what '/venues' renders
+        self.dirty = False
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def rebuild(self, path):
+        # In its own session, on the primary: it may run inside a
+        # request, whose session must stay open
+        self.dirty = False      # writes committed from here on rebuild again
+        session = Session(bind=db.engine)
+        try:
+            areas = build_snapshot(session)
+            write_snapshot(path, areas)
+        except Exception:
+            self.dirty = True
+            raise
+        finally:
+            session.close()
+        return len(areas)
+
+    def _swap(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp == self._stamp:
+            return True
+        with self._lock:
+            if stamp != self._stamp:
+                areas = [{
+                    "city": city,
+                    "state": state,
+                    "venues": [{
+                        "id": venue_id,
+                        "name": name,
+                        "num_upcoming_shows": num_upcoming_shows
+                    } for venue_id, name, num_upcoming_shows in venues]
+                } for city, state, venues in read_snapshot(path)]
+                self._areas, self._stamp = areas, stamp
+        return True
+
+    def get_areas(self):
+        path = current_app.config['DIRECTORY_SNAPSHOT_PATH']
+        if not self._swap(path):
+            # first requests on a fresh deploy: one builds it right here,
+            # the others wait for it
+            with self._build_lock:
+                if not self._swap(path):
+                    self.rebuild(path)
+                    self._swap(path)
+        return self._areas
+
+    def refresh(self):
+        # periodic task: after local writes, or when the snapshot has
+        # not been rebuilt (by any worker) for a whole interval
+        path = current_app.config['DIRECTORY_SNAPSHOT_PATH']
+        interval = current_app.config['DIRECTORY_REBUILD_INTERVAL']
+        try:
+            age = time.time() - os.stat(path).st_mtime
+        except FileNotFoundError:
+            age = None
+        if self.dirty or age is None or age >= interval:
+            with self._build_lock:
+                self.rebuild(path)
+
+
+venue_directory = VenueDirectory()
+
+# a committed venue or show write makes the snapshot stale
+on_commit(Venue, lambda venue_id: venue_directory.mark_dirty())
+on_commit(Show, lambda show_id: venue_directory.mark_dirty())
+
+
+def init_directory(app):
+    # checks every DIRECTORY_REBUILD_DELAY seconds whether to rebuild
+    rebuilder = PeriodicTask(app, venue_directory.refresh,
+                             app.config['DIRECTORY_REBUILD_DELAY'])
+    app.extensions['directory'] = rebuilder
+    app.before_request(rebuilder.start)
@@ -0,0 +1,315 @@
+import csv
+import heapq
+import math
+import os
+import threading
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, text, update
+from database import db, on_commit
+from models import Venue
+from replicas import read_from_primary
+
+#----------------------------------------------------------------------------#
+# Geocoding and nearby venue search.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# Venues get latitude/longitude from an offline geocoder: a lookup
+# of (city, state) in the bundled data/cities.csv, done when a venue
+# is written (see 'services.py') or in bulk by 'flask geo backfill'.
+#
+# '/venues/nearby' is answered by PostGIS when the extension is
+# installed (ST_DWithin on the expression index created by the
+# migration), otherwise by an in-process grid index: venues bucketed
+# in GEO_CELL_DEGREES cells, searched outwards from the query point
+# (see 'VenueGeoIndex.nearby'). The grid is loaded once and
+# then patched with the venues written in this process; other
+# workers' writes are picked up after GEO_INDEX_TTL seconds.
+#
+# The dataset only knows the cities in it: a venue elsewhere gets no
+# coordinates (a warning is logged when it is written, 'flask geo
+# backfill' lists the unknown cities) and can't be placed on the map,
+# so '/venues/nearby' reports how many venues have no known location
+# next to the results.
+####################################################################
+
+GEO_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'data', 'cities.csv')
+GEO_CELL_DEGREES = 0.1      # ~11km of latitude
+GEO_LNG_CELLS = round(360 / GEO_CELL_DEGREES)   # cells around a parallel
+GEO_INDEX_TTL = 300         # seconds
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+_places = None
+
+
+def normalize_place(city, state):
+    # 'St. Louis ', 'mo' -> ('st louis', 'MO')
+    city = ' '.join((city or '').replace('.', ' ').split()).lower()
+    return city, (state or '').strip().upper()
+
+
+def load_places(path=GEO_DATASET):
+    places = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            places[normalize_place(row['city'], row['state'])] = (
+                float(row['latitude']), float(row['longitude']))
+    return places
+
+
+def geocode(city, state):
+    # (latitude, longitude) of the city, or (None, None) if unknown
+    global _places
+    if _places is None:
+        _places = load_places()
+    return _places.get(normalize_place(city, state), (None, None))
+
+
+def get_distance(a):
+    # km from the haversine term 'a'
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def get_cell(latitude, longitude):
+    # longitude cells wrap around: 180 and -180 share one
+    half = GEO_LNG_CELLS // 2
+    return (math.floor(latitude / GEO_CELL_DEGREES),
+            (math.floor(longitude / GEO_CELL_DEGREES) + half) % GEO_LNG_CELLS - half)
+
+
+class VenueGeoIndex:
+    def __init__(self, ttl=GEO_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._cells = {}        # cell -> {venue id: entry}
+        self._entries = {}      # venue id -> cell
+        self._dirty = set()     # venues written since the last query
+
+    def _is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _query(self, *criteria):
+        return db.session.query(
+            Venue.id, Venue.name, Venue.city, Venue.state,
+            Venue.latitude, Venue.longitude).filter(
+            Venue.latitude.isnot(None), Venue.longitude.isnot(None), *criteria)
+
+    def _add(self, cells, entries, row):
+        # radians and cos(latitude) precomputed for 'nearby'
+        cell = get_cell(row.latitude, row.longitude)
+        latitude = math.radians(row.latitude)
+        cells.setdefault(cell, {})[row.id] = (
+            latitude, math.radians(row.longitude), math.cos(latitude),
+            row.id, row.name, row.city, row.state)
+        entries[row.id] = cell
+
+    def _refresh(self):
+        # Readers ('nearby') use '_cells' without the lock, so it is
+        # never changed in place: a new grid is built (or, for a few
+        # written venues, a copy sharing the untouched cells) and
+        # swapped in with one assignment
+        with self._lock, read_from_primary():
+            if self._is_stale():
+                cells, entries = {}, {}
+                self._dirty = set()
+                for row in self._query():
+                    self._add(cells, entries, row)
+                self._entries = entries
+                self._cells = cells
+                self._loaded_at = time.monotonic()
+            elif self._dirty:
+                venue_ids, self._dirty = self._dirty, set()
+                rows = self._query(Venue.id.in_(list(venue_ids))).all()
+                cells, entries = dict(self._cells), dict(self._entries)
+
+                changed = {entries.pop(venue_id, None) for venue_id in venue_ids}
+                changed.update(get_cell(row.latitude, row.longitude) for row in rows)
+                for cell in changed:
+                    if cell in cells:
+                        cells[cell] = dict(cells[cell])
+                for venue_id in venue_ids:
+                    cell = self._entries.get(venue_id)
+                    if cell is not None:
+                        cells[cell].pop(venue_id, None)
+                for row in rows:
+                    self._add(cells, entries, row)
+
+                self._entries = entries
+                self._cells = cells
+
+    def mark_dirty(self, venue_id):
+        self._dirty.add(venue_id)
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def nearby(self, latitude, longitude, radius_km, limit):
+        if self._is_stale() or self._dirty:
+            self._refresh()
+        cells = self._cells     # this grid, even if a refresh swaps it
+
+        # Candidates are compared on the haversine term 'a' (which grows
+        # with the distance) so the trigonometry per venue is minimal
+        sin, cos = math.sin, math.cos
+        lat = math.radians(latitude)
+        lng = math.radians(longitude)
+        cos_lat = cos(lat)
+        max_a = sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2) ** 2
+
+        closest = []    # max-heap of the best 'limit': (-a, id, entry)
+
+        def visit(cell):
+            for entry in cell.values():
+                a = sin((entry[0] - lat) / 2) ** 2 + \
+                    cos_lat * entry[2] * sin((entry[1] - lng) / 2) ** 2
+                if a > max_a:
+                    continue
+                if len(closest) < limit:
+                    heapq.heappush(closest, (-a, entry[3], entry))
+                elif a < -closest[0][0]:
+                    heapq.heapreplace(closest, (-a, entry[3], entry))
+
+        # Visits the cells in rings around the query point, keeping the
+        # 'limit' closest venues, and stops as soon as the next ring is
+        # necessarily farther away than all of them: in dense areas
+        # only a few cells are scanned whatever the radius
+        lat_span = radius_km / KM_PER_DEGREE
+        max_latitude = min(abs(latitude) + lat_span, 89.9)
+        cell_km = GEO_CELL_DEGREES * KM_PER_DEGREE * math.cos(math.radians(max_latitude))
+        lat_cells = math.ceil(lat_span / GEO_CELL_DEGREES) + 1
+        lng_cells = min(math.ceil(radius_km / cell_km) + 1, GEO_LNG_CELLS // 2)
+        center_lat, center_lng = get_cell(latitude, longitude)
+
+        # Near the poles the box spans (almost) every longitude; when it
+        # has more cells than the grid holds, scanning the grid is cheaper
+        if lng_cells >= GEO_LNG_CELLS // 2 or \
+                (2 * lat_cells + 1) * (2 * lng_cells + 1) > len(cells):
+            for cell in cells.values():
+                visit(cell)
+            lat_cells = lng_cells = -1     # no rings
+
+        for ring in range(max(lat_cells, lng_cells) + 1):
+            # everything in this ring is at least 'ring - 1' cells away
+            if len(closest) == limit and \
+                    get_distance(-closest[0][0]) <= (ring - 1) * cell_km:
+                break
+
+            for d_lat in range(-min(ring, lat_cells), min(ring, lat_cells) + 1):
+                if abs(d_lat) == ring:      # top or bottom edge: the whole row
+                    d_lngs = range(-min(ring, lng_cells), min(ring, lng_cells) + 1)
+                elif ring <= lng_cells:     # left and right edges
+                    d_lngs = (-ring, ring)
+                else:
+                    continue
+                for d_lng in d_lngs:
+                    # wrapped around the antimeridian
+                    cell_lng = (center_lng + d_lng + GEO_LNG_CELLS // 2) % GEO_LNG_CELLS \
+                        - GEO_LNG_CELLS // 2
+                    cell = cells.get((center_lat + d_lat, cell_lng))
+                    if cell:
+                        visit(cell)
+
+        return [{
+            "id": entry[3],
+            "name": entry[4],
+            "city": entry[5],
+            "state": entry[6],
+            "distance_km": round(get_distance(-a), 2)
+        } for a, _, entry in sorted(closest, reverse=True)]
+
+
+venue_locations = VenueGeoIndex()
+
+# a committed venue write only re-reads that venue on the next query
+on_commit(Venue, venue_locations.mark_dirty)
+
+
+_postgis = {}
+
+
+def has_postgis():
+    # checked once per database
+    engine = db.engine
+    if engine.url not in _postgis:
+        _postgis[engine.url] = engine.dialect.name == 'postgresql' and \
+            db.session.execute(text(
+                "SELECT 1 FROM pg_extension WHERE extname = 'postgis'")).first() is not None
+    return _postgis[engine.url]
+
+
+POSTGIS_NEARBY = text('''
+    SELECT id, name, city, state,
+           ST_Distance(geography(ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)),
+                       geography(ST_SetSRID(ST_MakePoint(:lng, :lat), 4326))) / 1000 AS distance_km
+    FROM "Venue"
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+      AND ST_DWithin(geography(ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)),
+                     geography(ST_SetSRID(ST_MakePoint(:lng, :lat), 4326)),
+                     :radius_m)
+    ORDER BY distance_km
+    LIMIT :limit
+''')
+
+
+def find_nearby_venues(latitude, longitude, radius_km, limit):
+    # Venues within 'radius_km', closest first
+    if has_postgis():
+        rows = db.session.execute(POSTGIS_NEARBY, {
+            "lat": latitude, "lng": longitude,
+            "radius_m": radius_km * 1000, "limit": limit})
+        return [{
+            "id": row.id,
+            "name": row.name,
+            "city": row.city,
+            "state": row.state,
+            "distance_km": round(row.distance_km, 2)
+        } for row in rows]
+
+    return venue_locations.nearby(latitude, longitude, radius_km, limit)
+
+
+def count_unlocated_venues():
+    # venues left out of every nearby search ("location unknown")
+    return db.session.query(func.count(Venue.id)).filter(
+        Venue.latitude.is_(None)).scalar()
+
+
+geo_cli = AppGroup('geo', help='Venue geocoding.')
+
+
+@geo_cli.command('backfill')
+@click.option('--all', 'refresh_all', is_flag=True,
+              help='Re-geocode venues that already have coordinates.')
+def backfill_command(refresh_all):
+    """Fill venue coordinates from the bundled city dataset."""
+    query = db.session.query(Venue.city, Venue.state).distinct()
+    if not refresh_all:
+        query = query.filter(Venue.latitude.is_(None))
+
+    located = missing = 0
+    for city, state in query.all():
+        latitude, longitude = geocode(city, state)
+        if latitude is None:
+            click.echo(f'unknown city: {city}, {state}')
+            missing += 1
+            continue
+
+        # one UPDATE per city instead of one per venue
+        stmt = update(Venue).where(Venue.city == city, Venue.state == state)
+        if not refresh_all:
+            stmt = stmt.where(Venue.latitude.is_(None))
+        located += db.session.execute(stmt.values(
+            latitude=latitude, longitude=longitude)).rowcount
+
+    db.session.commit()
+    venue_locations.invalidate()
+    click.echo(f'{located} venues located, {missing} cities not in the dataset')
+
+
+def init_geo(app):
+    app.cli.add_command(geo_cli)
@@ -0,0 +1,181 @@
+import heapq
+import threading
+import time
+from array import array
+from sqlalchemy import func
+from database import db, on_commit
+from models import Show
+from replicas import read_from_primary
+
+#----------------------------------------------------------------------------#
+# Co-performance graph.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# The shows form a bipartite artist <-> venue graph; an edge's
+# weight is the number of shows of that pair. It is kept in memory
+# in CSR form (compressed sparse rows), once per direction:
+#
+#   ids[row]                        artist (or venue) id of a row
+#   adjacency[offsets[row]:offsets[row + 1]]
+#                                   ids of its venues (or artists)
+#   weights[...]                    shows per edge, same positions
+#
+# so the two-hop questions of the detail pages ("similar venues",
+# "artists who played the same venues") are plain array walks
+# instead of self-joins on "Show".
+#
+# CSR arrays cannot grow in place: shows committed by this process
+# go to a small overlay of extra edges, merged in on read, and the
+# arrays are rebuilt once the overlay holds GRAPH_COMPACT_EDGES shows
+# (or after GRAPH_INDEX_TTL, which also picks up other workers'
+# shows and deletions).
+####################################################################
+
+GRAPH_INDEX_TTL = 600           # seconds
+GRAPH_COMPACT_EDGES = 10000
+GRAPH_RESULTS_LIMIT = 6
+
+
+class CSRAdjacency:
+    def __init__(self, edges):
+        # 'edges': (row id, column id, weight), sorted by row id
+        self.ids = array('q')
+        self.rows = {}          # id -> row
+        self.offsets = array('q', [0])
+        self.adjacency = array('q')     # column ids
+        self.weights = array('q')
+
+        for row_id, column_id, weight in edges:
+            if not self.ids or self.ids[-1] != row_id:
+                if self.ids:
+                    self.offsets.append(len(self.adjacency))
+                self.rows[row_id] = len(self.ids)
+                self.ids.append(row_id)
+            self.adjacency.append(column_id)
+            self.weights.append(weight)
+        if self.ids:
+            self.offsets.append(len(self.adjacency))
+
+    def neighbors(self, row_id):
+        # (column id, weight) pairs of 'row_id'
+        row = self.rows.get(row_id)
+        if row is None:
+            return ()
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return zip(self.adjacency[start:end], self.weights[start:end])
+
+
+def add_extra_edge(extra, copied, node_id, other_id):
+    # 'copied': ids whose inner dict is already this refresh's own copy
+    if node_id not in copied:
+        extra[node_id] = dict(extra.get(node_id, {}))
+        copied.add(node_id)
+    extra[node_id][other_id] = extra[node_id].get(other_id, 0) + 1
+
+
+class CoPerformanceGraph:
+    def __init__(self, ttl=GRAPH_INDEX_TTL, compact_edges=GRAPH_COMPACT_EDGES):
+        self.ttl = ttl
+        self.compact_edges = compact_edges
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        # (by artist, overlay by artist, by venue, overlay by venue); an
+        # overlay maps id -> {other id: extra shows}. Read without the
+        # lock, so never changed in place: replaced as a whole
+        self._graph = (CSRAdjacency(()), {}, CSRAdjacency(()), {})
+        self._extra_edges = 0   # shows in the overlay
+        self._pending = set()   # committed show ids not merged yet
+
+    def _is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _rebuild(self):
+        pairs = db.session.query(
+            Show.artist_id, Show.venue_id, func.count(Show.id)).group_by(
+            Show.artist_id, Show.venue_id).all()
+
+        self._graph = (
+            CSRAdjacency(sorted(pairs)), {},
+            CSRAdjacency(sorted(
+                (venue_id, artist_id, count) for artist_id, venue_id, count in pairs)), {})
+        self._extra_edges = 0
+        self._loaded_at = time.monotonic()
+
+    def _refresh(self):
+        with self._lock, read_from_primary():
+            if self._is_stale():
+                self._pending = set()
+                self._rebuild()
+                return
+
+            show_ids, self._pending = self._pending, set()
+            if not show_ids:
+                return
+
+            # copy on write: new outer dicts, and a new inner dict for
+            # every id that gets an extra edge
+            by_artist, extra_by_artist, by_venue, extra_by_venue = self._graph
+            extra_by_artist, extra_by_venue = dict(extra_by_artist), dict(extra_by_venue)
+            copied_artists, copied_venues = set(), set()
+            for artist_id, venue_id in db.session.query(
+                    Show.artist_id, Show.venue_id).filter(Show.id.in_(list(show_ids))):
+                add_extra_edge(extra_by_artist, copied_artists, artist_id, venue_id)
+                add_extra_edge(extra_by_venue, copied_venues, venue_id, artist_id)
+                self._extra_edges += 1
+
+            self._graph = (by_artist, extra_by_artist, by_venue, extra_by_venue)
+            if self._extra_edges >= self.compact_edges:
+                self._rebuild()
+
+    def mark_show(self, show_id):
+        self._pending.add(show_id)
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _neighbors(self, csr, extra, node_id):
+        # merged adjacency of the CSR row and the overlay
+        merged = dict(csr.neighbors(node_id))
+        for other_id, weight in extra.get(node_id, {}).items():
+            merged[other_id] = merged.get(other_id, 0) + weight
+        return merged
+
+    def _two_hop(self, first, first_extra, second, second_extra, node_id, limit):
+        # Nodes of the same kind sharing neighbors with 'node_id':
+        # (id, shared neighbors, shows of those neighbors there),
+        # most shared first
+        shared = {}
+        shows = {}
+        for middle_id in self._neighbors(first, first_extra, node_id):
+            for other_id, weight in self._neighbors(second, second_extra, middle_id).items():
+                if other_id != node_id:
+                    shared[other_id] = shared.get(other_id, 0) + 1
+                    shows[other_id] = shows.get(other_id, 0) + weight
+
+        best = heapq.nlargest(limit, shared, key=lambda other_id: (
+            shared[other_id], shows[other_id], -other_id))
+        return [(other_id, shared[other_id], shows[other_id]) for other_id in best]
+
+    def _ensure_fresh(self):
+        if self._is_stale() or self._pending:
+            self._refresh()
+        return self._graph
+
+    def similar_venues(self, venue_id, limit=GRAPH_RESULTS_LIMIT):
+        # venues that hosted the same artists as 'venue_id'
+        by_artist, extra_by_artist, by_venue, extra_by_venue = self._ensure_fresh()
+        return self._two_hop(by_venue, extra_by_venue,
+                             by_artist, extra_by_artist, venue_id, limit)
+
+    def co_performers(self, artist_id, limit=GRAPH_RESULTS_LIMIT):
+        # artists that played the venues 'artist_id' played
+        by_artist, extra_by_artist, by_venue, extra_by_venue = self._ensure_fresh()
+        return self._two_hop(by_artist, extra_by_artist,
+                             by_venue, extra_by_venue, artist_id, limit)
+
+
+co_performances = CoPerformanceGraph()
+
+# committed shows are merged into the overlay on the next read
+on_commit(Show, co_performances.mark_show)
@@ -0,0 +1,282 @@
+import hashlib
+import io
+import os
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse
+import click
+from flask import abort, current_app, request, send_file, url_for
+from flask.cli import AppGroup
+from logs import get_logger
+from metrics import metrics
+from search import SingleFlight
+
+try:
+    from PIL import Image
+except ImportError:     # optional: without Pillow originals are cached as-is
+    Image = None
+
+#----------------------------------------------------------------------------#
+# Image proxy and thumbnail cache.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# '/img?src=<url>&w=<width>' fetches an external 'image_link' (or a
+# file under static/) once, resizes it to one of IMAGE_WIDTHS and
+# re-encodes it as WebP (when the browser accepts it) or JPEG. The
+# result is stored in IMAGE_CACHE_DIR, which is capped at
+# IMAGE_CACHE_MAX_BYTES by evicting the least recently used files.
+#
+# Only hosts in IMAGE_PROXY_HOSTS are fetched (redirects included),
+# everything else is linked directly, so the proxy cannot be used to
+# reach arbitrary servers. 'file://' sources are accepted only below
+# IMAGE_PROXY_LOCAL_ROOT, which lets local files stand in for remote
+# URLs in development and tests.
+#
+# Concurrent misses for the same variant build it once (single
+# flight, see 'search.py'). Eviction lists the cache directory only
+# when this process's estimate of its size goes over the cap, and
+# then trims it to IMAGE_CACHE_TRIM of the cap; writes by other
+# workers are only seen at that listing, so the directory may
+# briefly exceed the cap.
+####################################################################
+
+logger = get_logger(__name__)
+
+IMAGE_MAX_AGE = 30 * 24 * 60 * 60       # seconds, browser cache for variants
+IMAGE_QUALITY = 80
+IMAGE_CACHE_TRIM = 0.9
+
+_cache_lock = threading.Lock()
+_cache_bytes = {}       # cache dir -> estimated size, None until listed
+
+builds = SingleFlight('fyyur_image_coalesced_total')
+
+
+def get_variant_path(src, width, fmt):
+    digest = hashlib.sha256(f'{src}|{width}|{fmt}'.encode('utf-8')).hexdigest()
+    return os.path.join(current_app.config['IMAGE_CACHE_DIR'], f'{digest}.{fmt}')
+
+
+def is_allowed_host(url):
+    parsed = urlparse(url)
+    return parsed.scheme in ('http', 'https') and \
+        parsed.hostname in current_app.config['IMAGE_PROXY_HOSTS']
+
+
+def is_proxied(src):
+    # True for sources the proxy is allowed to fetch
+    if not src:
+        return False
+    if src.startswith(current_app.static_url_path + '/'):
+        return True
+    if urlparse(src).scheme == 'file':
+        return bool(current_app.config['IMAGE_PROXY_LOCAL_ROOT'])
+    return is_allowed_host(src)
+
+
+class AllowedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    # follows a redirect only to another IMAGE_PROXY_HOSTS host
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not is_allowed_host(newurl):
+            raise urllib.error.HTTPError(
+                newurl, code, f'Redirect to a host not allowed: {newurl}', headers, fp)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_opener = urllib.request.build_opener(AllowedRedirectHandler)
+
+
+def fetch_source(src):
+    config = current_app.config
+    max_bytes = config['IMAGE_MAX_SOURCE_BYTES']
+
+    # files from static/ (e.g. the home page splash)
+    if src.startswith(current_app.static_url_path + '/'):
+        path = os.path.join(current_app.static_folder,
+                            src[len(current_app.static_url_path) + 1:])
+        root = current_app.static_folder
+    elif src.startswith('file://'):
+        path = urlparse(src).path
+        root = config['IMAGE_PROXY_LOCAL_ROOT']
+    else:
+        with _opener.open(src, timeout=config['IMAGE_FETCH_TIMEOUT']) as response:
+            data = response.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            raise ValueError(f'Image "{src}" exceeds {max_bytes} bytes')
+        return data
+
+    path = os.path.realpath(path)
+    if os.path.commonpath([path, os.path.realpath(root)]) != os.path.realpath(root):
+        raise ValueError(f'Image "{src}" is outside the allowed directory')
+    if os.path.getsize(path) > max_bytes:
+        raise ValueError(f'Image "{src}" exceeds {max_bytes} bytes')
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def resize_image(data, width, fmt):
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as err:
+        raise ValueError(str(err)) from err
+    image.thumbnail((width, width * 4))     # keeps the aspect ratio
+    if image.mode not in ('RGB', 'RGBA') or fmt == 'jpeg':
+        image = image.convert('RGB')
+
+    output = io.BytesIO()
+    image.save(output, format=fmt.upper(), quality=IMAGE_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def evict_image_cache(cache_dir, max_bytes, keep=None):
+    # Drops least recently used variants (by mtime, refreshed on every
+    # hit) until the directory fits in 'max_bytes', except 'keep' (the
+    # variant about to be served); returns its size. Other workers may
+    # be evicting at the same time, hence the FileNotFoundError guards
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(entry[1] for entry in entries)
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+def build_image_variant(src, width, fmt, path):
+    data = fetch_source(src)
+    if Image is not None:
+        data = resize_image(data, width, fmt)
+
+    cache_dir = current_app.config['IMAGE_CACHE_DIR']
+    max_bytes = current_app.config['IMAGE_CACHE_MAX_BYTES']
+    with _cache_lock:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)     # readers never see partial files
+
+        size = _cache_bytes.get(cache_dir)
+        size = None if size is None else size + len(data)
+        if size is None or size > max_bytes:
+            size = evict_image_cache(cache_dir, int(max_bytes * IMAGE_CACHE_TRIM), path)
+        _cache_bytes[cache_dir] = size
+    return path
+
+
+def get_image_variant(src, width, fmt):
+    # Returns the path of the cached variant, building it on a miss
+    path = get_variant_path(src, width, fmt)
+    if os.path.exists(path):
+        os.utime(path)      # mark as recently used
+        metrics.inc('fyyur_cache_hits_total', cache='image')
+        return path
+    metrics.inc('fyyur_cache_misses_total', cache='image')
+    return builds.do(path, build_image_variant, src, width, fmt, path)
+
+
+def negotiate_format():
+    if Image is not None and request.accept_mimetypes['image/webp']:
+        return 'webp'
+    return 'jpeg'
+
+
+def serve_image():
+    src = request.args.get('src', '')
+    width = request.args.get('w', type=int)
+    widths = current_app.config['IMAGE_WIDTHS']
+
+    if not is_proxied(src):
+        abort(404)
+    if width not in widths:
+        width = widths[-1]
+    fmt = negotiate_format()
+
+    try:
+        path = get_image_variant(src, width, fmt)
+        # opens the file, which another worker's eviction may have removed
+        response = send_file(path, mimetype=f'image/{fmt}' if Image is not None else None)
+    except (OSError, ValueError) as err:
+        logger.warning('Image %s unavailable: %s', src, err)
+        abort(404)
+
+    response.headers['Cache-Control'] = f'public, max-age={IMAGE_MAX_AGE}'
+    response.vary.add('Accept')
+    return response
+
+
+def image_url(src, width=None):
+    # Template helper: proxied thumbnail URL, or the raw link for
+    # sources the proxy does not handle
+    if not is_proxied(src):
+        return src
+    return url_for('image_proxy', src=src, w=width or current_app.config['IMAGE_WIDTHS'][-1])
+
+
+def image_srcset(src):
+    # Template helper: 'srcset' value listing every configured width
+    if not is_proxied(src):
+        return ''
+    return ', '.join(f'{image_url(src, width)} {width}w'
+                     for width in current_app.config['IMAGE_WIDTHS'])
+
+
+def warm_image(src):
+    # Builds every width/format variant of 'src'; returns how many
+    if not is_proxied(src):
+        return 0
+    built = 0
+    for width in current_app.config['IMAGE_WIDTHS']:
+        for fmt in (('webp', 'jpeg') if Image is not None else ('jpeg',)):
+            get_image_variant(src, width, fmt)
+            built += 1
+    return built
+
+
+images_cli = AppGroup('images', help='Image proxy cache.')
+
+
+@images_cli.command('warm')
+@click.option('--links/--no-links', default=True,
+              help='Also pre-render every venue/artist image_link.')
+def warm_command(links):
+    """Precompute the responsive variants of the static images."""
+    sources = [current_app.static_url_path + '/img/front-splash.jpg']
+
+    if links:
+        from database import db
+        from models import Venue, Artist
+        for model in (Venue, Artist):
+            sources.extend(link for (link,) in db.session.query(
+                model.image_link).filter(model.image_link != '').distinct())
+
+    built = 0
+    for src in filter(is_proxied, sources):
+        try:
+            built += warm_image(src)
+        except (OSError, ValueError) as err:
+            click.echo(f'skipped {src}: {err}')
+    click.echo(f'{built} image variants cached')
+
+
+def init_images(app):
+    app.add_url_rule('/img', 'image_proxy', serve_image)
+    app.jinja_env.globals['image_url'] = image_url
+    app.jinja_env.globals['image_srcset'] = image_srcset
+    app.cli.add_command(images_cli)
@@ -0,0 +1,451 @@
+import atexit
+import heapq
+import itertools
+import json
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+import click
+from flask import current_app, render_template
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, or_, select, update
+from database import db
+from models import Job
+from logs import get_logger
+
+#----------------------------------------------------------------------------#
+# Background jobs.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# Follow-up work after a write (warming caches, and later search
+# index / counter maintenance) is enqueued by the request handlers
+# and run by a small pool of worker threads, so the request returns
+# as soon as its own transaction has committed:
+#
+#     enqueue('warm_image_variants', venue.image_link)
+#
+# JOB_QUEUE_BACKEND picks where queued jobs live:
+#   'memory'    in-process heap; lost on restart, no setup needed
+#   'database'  the 'Job' table; survives restarts and is shared by
+#               every process ('flask jobs work' runs a dedicated
+#               worker). Works on Postgres and on SQLite locally.
+#
+# A failing job is retried JOB_MAX_ATTEMPTS times in total, waiting
+# JOB_RETRY_BACKOFF * 2^(attempt - 1) seconds in between. With
+# JOB_WORKERS = 0 jobs run inline in 'enqueue' (tests, CLI scripts).
+# Queue depth and recent failures are shown on '/jobs'.
+####################################################################
+
+logger = get_logger(__name__)
+
+JOB_RECENT_FAILURES = 20
+
+_tasks = {}
+
+
+def task(func):
+    # registers 'func' as a job, under its function name
+    _tasks[func.__name__] = func
+    return func
+
+
+class QueuedJob:
+    def __init__(self, job_id, name, args, attempts=0):
+        self.id = job_id
+        self.name = name
+        self.args = args
+        self.attempts = attempts
+
+
+class MemoryJobQueue:
+    backend = 'memory'
+
+    def __init__(self):
+        self._heap = []     # (run_at, id, job)
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._failures = deque(maxlen=JOB_RECENT_FAILURES)
+        self.running = 0
+        self.failed = 0
+
+    def put(self, name, args, delay=0):
+        job = QueuedJob(next(self._ids), name, args)
+        self._schedule(job, delay)
+        return job.id
+
+    def _schedule(self, job, delay):
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + delay, job.id, job))
+            self._condition.notify()
+
+    def claim(self, timeout):
+        # Next due job, or None after waiting up to 'timeout' seconds
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    job = heapq.heappop(self._heap)[2]
+                    job.attempts += 1
+                    self.running += 1
+                    return job
+                if now >= deadline:
+                    return None
+                wait = deadline - now
+                if self._heap:
+                    wait = min(wait, self._heap[0][0] - now)
+                self._condition.wait(wait)
+
+    def complete(self, job):
+        with self._condition:
+            self.running -= 1
+
+    def retry(self, job, delay, error):
+        with self._condition:
+            self.running -= 1
+        self._schedule(job, delay)
+
+    def fail(self, job, error):
+        with self._condition:
+            self.running -= 1
+            self.failed += 1
+            self._failures.appendleft({
+                "id": job.id, "name": job.name, "args": job.args,
+                "attempts": job.attempts, "error": error,
+                "failed_at": datetime.now()
+            })
+
+    def wake(self):
+        with self._condition:
+            self._condition.notify_all()
+
+    def get_counts(self):
+        now = time.monotonic()
+        with self._condition:
+            due = sum(1 for run_at, _, _ in self._heap if run_at <= now)
+            return {
+                "queued": due,
+                "scheduled": len(self._heap) - due,
+                "running": self.running,
+                "failed": self.failed
+            }
+
+    def get_failures(self):
+        with self._condition:
+            return list(self._failures)
+
+
+class DatabaseJobQueue:
+    backend = 'database'
+
+    def __init__(self, lease_timeout):
+        # a 'running' job whose worker died is picked up again once
+        # it has been running for longer than this (seconds)
+        self.lease_timeout = lease_timeout
+        self._wakeup = threading.Event()
+
+    def put(self, name, args, delay=0):
+        # own connection and transaction: the job is committed even if
+        # the request's session is rolled back later
+        with db.engine.begin() as connection:
+            job_id = connection.execute(insert(Job).values(
+                name=name, payload=json.dumps(args), status='queued', attempts=0,
+                run_at=datetime.now() + timedelta(seconds=delay),
+                created_at=datetime.now()).returning(Job.id)).scalar()
+        self._wakeup.set()
+        return job_id
+
+    def claim(self, timeout):
+        # One UPDATE ... RETURNING claims the oldest due job; on Postgres
+        # 'FOR UPDATE SKIP LOCKED' keeps concurrent workers from blocking
+        # on (or double-claiming) the same row. SQLite serializes writes,
+        # the status check in the outer WHERE covers it there.
+        now = datetime.now()
+        claimable = or_(
+            (Job.status == 'queued') & (Job.run_at <= now),
+            (Job.status == 'running') &
+            (Job.run_at <= now - timedelta(seconds=self.lease_timeout)))
+        next_job = select(Job.id).where(claimable).order_by(
+            Job.run_at).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+
+        with db.engine.begin() as connection:
+            row = connection.execute(
+                update(Job).where(Job.id == next_job, claimable).values(
+                    status='running', run_at=now, attempts=Job.attempts + 1)
+                .returning(Job.id, Job.name, Job.payload, Job.attempts)).first()
+
+        if row is None:
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            return None
+        return QueuedJob(row.id, row.name, json.loads(row.payload), row.attempts)
+
+    def complete(self, job):
+        with db.engine.begin() as connection:
+            connection.execute(delete(Job).where(Job.id == job.id))
+
+    def retry(self, job, delay, error):
+        with db.engine.begin() as connection:
+            connection.execute(update(Job).where(Job.id == job.id).values(
+                status='queued', last_error=error,
+                run_at=datetime.now() + timedelta(seconds=delay)))
+
+    def fail(self, job, error):
+        with db.engine.begin() as connection:
+            connection.execute(update(Job).where(Job.id == job.id).values(
+                status='failed', last_error=error))
+
+    def wake(self):
+        self._wakeup.set()
+
+    def get_counts(self):
+        now = datetime.now()
+        counts = {"queued": 0, "scheduled": 0, "running": 0, "failed": 0}
+        rows = db.session.query(
+            Job.status, Job.run_at <= now, func.count(Job.id)).group_by(
+            Job.status, Job.run_at <= now).all()
+        for status, due, count in rows:
+            if status == 'queued' and not due:
+                status = 'scheduled'
+            counts[status] = counts.get(status, 0) + count
+        return counts
+
+    def get_failures(self):
+        jobs = db.session.query(Job).filter(Job.status == 'failed').order_by(
+            Job.run_at.desc()).limit(JOB_RECENT_FAILURES).all()
+        return [{
+            "id": job.id, "name": job.name, "args": json.loads(job.payload),
+            "attempts": job.attempts, "error": job.last_error,
+            "failed_at": job.run_at
+        } for job in jobs]
+
+
+class JobWorkers:
+    def __init__(self, app, queue):
+        self.app = app
+        self.queue = queue
+        self.workers = app.config['JOB_WORKERS']
+        self.max_attempts = app.config['JOB_MAX_ATTEMPTS']
+        self.backoff = app.config['JOB_RETRY_BACKOFF']
+        self.poll_interval = app.config['JOB_POLL_INTERVAL']
+
+        # counters of this process
+        self.completed = 0
+        self.retried = 0
+
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self):
+        # Started lazily (first request or first enqueue) so CLI
+        # commands such as 'flask db upgrade' do not spawn workers
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        self.queue.wake()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._stopping.clear()
+
+    def _work(self):
+        while not self._stopping.is_set():
+            with self.app.app_context():
+                try:
+                    job = self.queue.claim(self.poll_interval)
+                    if job is not None:
+                        self.run(job)
+                except Exception:
+                    # e.g. the database is unreachable; back off and retry
+                    logger.exception('Job worker failed to claim a job')
+                    self._stopping.wait(self.poll_interval)
+
+    def run(self, job):
+        func = _tasks.get(job.name)
+        try:
+            if func is None:
+                raise LookupError(f'Unknown job "{job.name}"')
+            func(*job.args)
+
+        except Exception as err:
+            logger.exception('Job %s "%s" failed (attempt %s)', job.id, job.name, job.attempts)
+            db.session.rollback()
+            error = f'{type(err).__name__}: {err}'
+
+            if job.attempts >= self.max_attempts or func is None:
+                self.queue.fail(job, error)
+            else:
+                self.queue.retry(
+                    job, self.backoff * 2 ** (job.attempts - 1), error)
+                with self._lock:
+                    self.retried += 1
+            return False
+
+        self.queue.complete(job)
+        with self._lock:
+            self.completed += 1
+        return True
+
+    def enqueue(self, name, *args, delay=0):
+        if name not in _tasks:
+            raise LookupError(f'Unknown job "{name}"')
+
+        if self.workers <= 0 and not delay:
+            # no workers: run inline, once
+            try:
+                _tasks[name](*args)
+            except Exception:
+                logger.exception('Job "%s" failed', name)
+                db.session.rollback()
+            return None
+
+        job_id = self.queue.put(name, list(args), delay)
+        self.start()
+        return job_id
+
+    def get_status(self):
+        status = self.queue.get_counts()
+        status.update({
+            "backend": self.queue.backend,
+            "workers": len(self._threads),
+            "completed": self.completed,
+            "retried": self.retried,
+            "recent_failures": self.queue.get_failures()
+        })
+        return status
+
+
+class PeriodicTask:
+    # Runs 'func' every 'interval' seconds (or sooner, on 'wake') on a
+    # daemon thread, inside an app context, and once more when the
+    # interpreter exits (a graceful shutdown), for in-process buffers
+    # that need flushing
+    def __init__(self, app, func, interval):
+        self.app = app
+        self.func = func
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        exit_on_sigterm()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._loop, name=f'periodic-{self.func.__name__}', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.run()
+
+    def run(self):
+        with self.app.app_context():
+            try:
+                self.func()
+            except Exception:
+                logger.exception('Periodic task %s failed', self.func.__qualname__)
+                db.session.rollback()
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            self.run()
+
+
+def exit_on_sigterm():
+    # SIGTERM (e.g. from a process manager) kills Python without running
+    # the 'atexit' flushes; turn it into a normal exit, unless the
+    # server (e.g. gunicorn) already handles it
+    if threading.current_thread() is threading.main_thread() and \
+            signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+
+def enqueue(name, *args, delay=0):
+    # Queues job 'name' (a function decorated with '@task') with the
+    # given JSON-serializable arguments; returns the job id
+    return current_app.extensions['jobs'].enqueue(name, *args, delay=delay)
+
+
+#  Tasks
+#  ----------------------------------------------------------------
+
+@task
+def warm_image_variants(src):
+    # Builds the thumbnails of a new or changed image link before the
+    # first visitor asks for them
+    from images import warm_image
+    warm_image(src)
+
+
+#  Status page and CLI
+#  ----------------------------------------------------------------
+
+def jobs_status():
+    return render_template('pages/jobs.html',
+                           status=current_app.extensions['jobs'].get_status())
+
+
+jobs_cli = AppGroup('jobs', help='Background job queue.')
+
+
+@jobs_cli.command('work')
+def work_command():
+    """Run job workers in the foreground until interrupted."""
+    workers = current_app.extensions['jobs']
+    workers.workers = max(workers.workers, 1)
+    workers.start()
+    click.echo(f'{workers.workers} workers on the {workers.queue.backend} queue')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        workers.stop()
+
+
+@jobs_cli.command('status')
+def status_command():
+    """Print queue depth and worker counters."""
+    status = current_app.extensions['jobs'].get_status()
+    for key in ('backend', 'queued', 'scheduled', 'running', 'failed'):
+        click.echo(f'{key}: {status[key]}')
+
+
+def init_jobs(app):
+    if app.config['JOB_QUEUE_BACKEND'] == 'database':
+        queue = DatabaseJobQueue(app.config['JOB_LEASE_TIMEOUT'])
+    else:
+        queue = MemoryJobQueue()
+
+    workers = JobWorkers(app, queue)
+    app.extensions['jobs'] = workers
+    app.before_request(workers.start)
+    app.add_url_rule('/jobs', 'jobs_status', jobs_status)
+    app.cli.add_command(jobs_cli)
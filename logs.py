@@ -0,0 +1,202 @@
+import atexit
+import json
+import logging
+import queue
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, has_app_context, has_request_context, request
+from flask.logging import default_handler
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Structured logging.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# Every module logs through get_logger(__name__) (the 'fyyur.*'
+# loggers) and Flask's own app.logger. Records are rendered to one
+# JSON object per line and put on an in-memory queue; a single
+# QueueListener thread writes them to the rotating LOG_FILE (and
+# stderr with LOG_STDERR), so request threads never wait on disk.
+#
+# Records logged during a request carry its id (X-Request-ID, taken
+# from the request or generated, and echoed in the response), method,
+# path and route. After each request one 'request' record adds the
+# status, duration, and the time, statement count and row count of
+# the SQL it ran:
+#
+#   {"ts": "...", "level": "INFO", "logger": "fyyur.request",
+#    "msg": "request", "request_id": "5f0c...", "method": "GET",
+#    "path": "/venues/1", "route": "/venues/<int:venue_id>",
+#    "status": 200, "duration_ms": 12.4, "db_ms": 3.1,
+#    "db_queries": 4, "db_rows": 17}
+#
+# (Row counts come from the DB driver's cursor.rowcount; SQLite
+# reports none for SELECTs.)
+####################################################################
+
+LOGGER_NAME = 'fyyur'
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_PATTERN = re.compile(r'^[\w.-]{1,64}$')
+
+# attributes every LogRecord has; anything else was passed as 'extra'
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'taskName'}
+
+
+_listener = None    # the running QueueListener, one per process
+
+
+def get_logger(name):
+    return logging.getLogger(f'{LOGGER_NAME}.{name}')
+
+
+request_logger = get_logger('request')
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    # Runs in the thread that logs, while its request is still current
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+            record.route = request.url_rule.rule if request.url_rule else None
+        return True
+
+
+#  SQL timing
+#  ----------------------------------------------------------------
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append((context, time.perf_counter()))
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()[1]
+    if not has_app_context() or 'db_stats' not in g:
+        return
+    stats = g.db_stats
+    stats["time"] += elapsed
+    stats["queries"] += 1
+    if cursor.rowcount is not None and cursor.rowcount > 0:
+        stats["rows"] += cursor.rowcount
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    # a failed statement never gets to 'after_cursor_execute'; drop its
+    # start time, or the pooled connection keeps it for good
+    if exception_context.connection is None:
+        return
+    starts = exception_context.connection.info.get('query_start')
+    if starts and starts[-1][0] is exception_context.execution_context:
+        starts.pop()
+
+
+#  Request hooks
+#  ----------------------------------------------------------------
+
+def start_request():
+    request_id = request.headers.get(REQUEST_ID_HEADER, '')
+    if not REQUEST_ID_PATTERN.match(request_id):
+        request_id = uuid.uuid4().hex
+    g.request_id = request_id
+    g.request_start = time.perf_counter()
+    g.db_stats = {"time": 0.0, "queries": 0, "rows": 0}
+
+
+def log_request(response):
+    if 'request_start' not in g:
+        return response
+    stats = g.db_stats
+    request_logger.info('request', extra={
+        "status": response.status_code,
+        "duration_ms": round((time.perf_counter() - g.request_start) * 1000, 2),
+        "db_ms": round(stats["time"] * 1000, 2),
+        "db_queries": stats["queries"],
+        "db_rows": stats["rows"],
+    })
+    response.headers[REQUEST_ID_HEADER] = g.request_id
+    return response
+
+
+def stop_listener(listener):
+    # writes out what is still queued; safe to call more than once
+    if listener._thread is not None:
+        listener.stop()
+
+
+def stop_current_listener():
+    if _listener is not None:
+        stop_listener(_listener)
+
+
+def init_logging(app):
+    # The 'fyyur' loggers are shared by every app in the process: a
+    # later create_app() (tests, CLI) replaces the earlier listener
+    # and closes its log file
+    global _listener
+    if _listener is None:
+        atexit.register(stop_current_listener)
+    else:
+        stop_listener(_listener)
+        for handler in _listener.handlers:
+            handler.close()
+
+    handlers = []
+    if app.config['LOG_FILE']:
+        file_handler = RotatingFileHandler(
+            app.config['LOG_FILE'], maxBytes=app.config['LOG_MAX_BYTES'],
+            backupCount=app.config['LOG_BACKUP_COUNT'], encoding='utf-8')
+        handlers.append(file_handler)
+    if app.config['LOG_STDERR']:
+        handlers.append(logging.StreamHandler(sys.stderr))
+
+    # records are already rendered to JSON by the QueueHandler
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter('%(message)s'))
+
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    queue_handler.setFormatter(JSONFormatter())
+    queue_handler.addFilter(RequestContextFilter())
+
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listener = listener
+    app.extensions['logging'] = listener
+
+    app.logger.removeHandler(default_handler)
+    for logger in (app.logger, logging.getLogger(LOGGER_NAME)):
+        for handler in [h for h in logger.handlers if isinstance(h, QueueHandler)]:
+            logger.removeHandler(handler)   # from an earlier create_app()
+        logger.addHandler(queue_handler)
+        logger.setLevel(app.config['LOG_LEVEL'])
+        logger.propagate = False
+
+    app.before_request(start_request)
+    app.after_request(log_request)
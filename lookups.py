@@ -0,0 +1,78 @@
+import threading
+import time
+from database import db, on_commit
+from models import Venue, Artist
+from replicas import read_from_primary
+
+#----------------------------------------------------------------------------#
+# Cached id -> name lookups.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# In-process index of venue and artist names, used by the show
+# forms' searchable id pickers. It is loaded lazily on first use
+# (one 'SELECT id, name' per table), dropped whenever a Venue or
+# Artist write is committed in this process (see 'database.on_commit')
+# and refreshed after LOOKUP_CACHE_TTL seconds to pick up writes
+# made by other workers.
+####################################################################
+
+LOOKUP_CACHE_TTL = 300      # seconds
+LOOKUP_RESULTS_LIMIT = 20
+
+
+class EntityNameIndex:
+    def __init__(self, model, ttl=LOOKUP_CACHE_TTL):
+        self.model = model
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._names = {}
+        self._sorted = []   # (lowercased name, id, name), sorted by name
+
+    def _is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _load(self):
+        with self._lock, read_from_primary():
+            if not self._is_stale():
+                return
+            rows = db.session.query(self.model.id, self.model.name).all()
+            self._names = dict(rows)
+            self._sorted = sorted(
+                (name.lower(), entity_id, name) for entity_id, name in rows)
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def get_names(self):
+        if self._is_stale():
+            self._load()
+        return self._names
+
+    def get(self, entity_id):
+        return self.get_names().get(entity_id)
+
+    def search(self, term, limit=LOOKUP_RESULTS_LIMIT):
+        # Case-insensitive substring (or exact id) match, served from
+        # memory; results come back in name order
+        if self._is_stale():
+            self._load()
+
+        term = term.strip().lower()
+        results = []
+        for lowered, entity_id, name in self._sorted:
+            if term in lowered or term == str(entity_id):
+                results.append({"id": entity_id, "name": name})
+                if len(results) >= limit:
+                    break
+        return results
+
+
+venue_names = EntityNameIndex(Venue)
+artist_names = EntityNameIndex(Artist)
+
+# a committed write to a venue/artist drops that index
+on_commit(Venue, lambda venue_id: venue_names.invalidate())
+on_commit(Artist, lambda artist_id: artist_names.invalidate())
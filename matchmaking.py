@@ -0,0 +1,314 @@
+import heapq
+import math
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import func
+from database import db, on_commit
+from models import Venue, Artist, VenueGenre, ArtistGenre, Show
+from geo import geocode, get_distance, normalize_place
+from replicas import read_from_primary
+
+#----------------------------------------------------------------------------#
+# Artist <-> venue matchmaking.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# Ranks venues seeking talent for an artist (and artists seeking a
+# venue for a venue) by
+#   - genre overlap: Jaccard similarity of the two genre sets,
+#   - location: 1 in the same city, falling to 0 at
+#     MATCH_LOCATION_RANGE_KM (same state counts a little when a city
+#     is not in the geocoder's dataset),
+#   - history: past shows the pair already played together.
+#
+# Genre sets are kept as bitmasks (one bit per genre), and the
+# candidates of each side are bucketed by place and genre mask: all
+# candidates in a bucket share their genre and location score, so a
+# ranking scores each bucket once instead of every candidate (and
+# skips far away places once they cannot make the top any more).
+# Only the few candidates with a shared history are scored one by one.
+#
+# The index is loaded lazily; committed venue/artist writes are
+# re-read on the next ranking (see 'database.on_commit'), and the
+# show history is reloaded after a show write or MATCH_INDEX_TTL.
+####################################################################
+
+MATCH_INDEX_TTL = 600           # seconds
+MATCH_LOCATION_RANGE_KM = 500
+MATCH_RESULTS_LIMIT = 20
+
+MATCH_WEIGHTS = {
+    "genres": 0.6,
+    "location": 0.3,
+    "history": 0.1,
+}
+MATCH_HISTORY_SHOWS = 3         # past shows together for the full history score
+SAME_STATE_SCORE = 0.3
+
+
+def count_bits(mask):
+    return bin(mask).count('1')
+
+
+class MatchSide:
+    # One side of the match (venues or artists): every entity's genre
+    # mask and place, and the buckets of those currently seeking
+    def __init__(self, model, genre_model, foreign_key, seeking_column):
+        self.model = model
+        self.genre_model = genre_model
+        self.foreign_key = foreign_key
+        self.seeking_column = seeking_column
+        self.entries = {}       # id -> (name, city, state, mask, place, seeking)
+        self.buckets = {}       # place -> {mask: set of ids}
+
+    def load(self, genre_bits, entity_ids=None):
+        query = db.session.query(
+            self.model.id, self.model.name, self.model.city, self.model.state,
+            getattr(self.model, self.seeking_column))
+        genres = db.session.query(
+            getattr(self.genre_model, self.foreign_key), self.genre_model.name)
+        if entity_ids is not None:
+            query = query.filter(self.model.id.in_(entity_ids))
+            genres = genres.filter(
+                getattr(self.genre_model, self.foreign_key).in_(entity_ids))
+
+        masks = {}
+        for entity_id, genre in genres:
+            bit = genre_bits.setdefault(genre, 1 << len(genre_bits))
+            masks[entity_id] = masks.get(entity_id, 0) | bit
+
+        for entity_id in (entity_ids or ()):
+            self.remove(entity_id)
+        for entity_id, name, city, state, seeking in query:
+            self.add(entity_id, name, city, state, masks.get(entity_id, 0), bool(seeking))
+
+    def copy(self):
+        side = MatchSide(self.model, self.genre_model, self.foreign_key, self.seeking_column)
+        side.entries = dict(self.entries)
+        side.buckets = {place: {mask: set(ids) for mask, ids in masks.items()}
+                        for place, masks in self.buckets.items()}
+        return side
+
+    def add(self, entity_id, name, city, state, mask, seeking):
+        place = normalize_place(city, state)
+        self.entries[entity_id] = (name, city, state, mask, place, seeking)
+        if seeking:
+            self.buckets.setdefault(place, {}).setdefault(mask, set()).add(entity_id)
+
+    def remove(self, entity_id):
+        entry = self.entries.pop(entity_id, None)
+        if entry is not None and entry[5]:
+            mask, place = entry[3], entry[4]
+            self.buckets[place][mask].discard(entity_id)
+            if not self.buckets[place][mask]:
+                del self.buckets[place][mask]
+                if not self.buckets[place]:
+                    del self.buckets[place]
+
+
+class MatchState:
+    # Everything a ranking reads. Rankings run without the lock, so a
+    # state is never changed once published: refreshes build a new one
+    # (copying what they change) and swap it in with one assignment
+    def __init__(self, genre_bits, venues, artists, shows_by_artist, shows_by_venue):
+        self.genre_bits = genre_bits    # genre name -> bit
+        self.venues = venues
+        self.artists = artists
+        # past shows together: artist id -> {venue id: count}, and back
+        self.shows_by_artist = shows_by_artist
+        self.shows_by_venue = shows_by_venue
+
+    def get_genre_names(self, mask):
+        return sorted(genre for genre, bit in self.genre_bits.items() if mask & bit)
+
+
+class MatchIndex:
+    def __init__(self, ttl=MATCH_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._state = MatchState(
+            {}, MatchSide(Venue, VenueGenre, 'venue_id', 'seeking_talent'),
+            MatchSide(Artist, ArtistGenre, 'artist_id', 'seeking_venue'), {}, {})
+        self._history_stale = True
+        self._dirty = {'venue': set(), 'artist': set()}
+
+    def _is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _refresh(self):
+        # every condition is checked again under the lock: another
+        # thread may have refreshed in the meantime
+        with self._lock, read_from_primary():
+            state = self._state
+            genre_bits, venues, artists = state.genre_bits, state.venues, state.artists
+            shows_by_artist, shows_by_venue = state.shows_by_artist, state.shows_by_venue
+
+            if self._is_stale():
+                genre_bits = {}
+                venues = MatchSide(venues.model, venues.genre_model,
+                                   venues.foreign_key, venues.seeking_column)
+                artists = MatchSide(artists.model, artists.genre_model,
+                                    artists.foreign_key, artists.seeking_column)
+                self._dirty = {'venue': set(), 'artist': set()}
+                venues.load(genre_bits)
+                artists.load(genre_bits)
+                self._history_stale = True
+                self._loaded_at = time.monotonic()
+
+            sides = {'venue': venues, 'artist': artists}
+            for kind in ('venue', 'artist'):
+                if self._dirty[kind]:
+                    entity_ids, self._dirty[kind] = self._dirty[kind], set()
+                    if genre_bits is state.genre_bits:
+                        genre_bits = dict(genre_bits)
+                    if sides[kind] is getattr(state, kind + 's'):
+                        sides[kind] = sides[kind].copy()
+                    sides[kind].load(genre_bits, list(entity_ids))
+
+            if self._history_stale:
+                self._history_stale = False
+                shows_by_artist, shows_by_venue = {}, {}
+                for artist_id, venue_id, count in db.session.query(
+                        Show.artist_id, Show.venue_id, func.count(Show.id)).filter(
+                        Show.start_time < datetime.now()).group_by(
+                        Show.artist_id, Show.venue_id):
+                    shows_by_artist.setdefault(artist_id, {})[venue_id] = count
+                    shows_by_venue.setdefault(venue_id, {})[artist_id] = count
+
+            self._state = MatchState(genre_bits, sides['venue'], sides['artist'],
+                                     shows_by_artist, shows_by_venue)
+
+    def mark_dirty(self, kind, entity_id):
+        self._dirty[kind].add(entity_id)
+
+    def mark_history_stale(self):
+        self._history_stale = True
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _ensure_fresh(self):
+        # a cheap unlocked check; '_refresh' decides under the lock
+        if self._is_stale() or self._history_stale or \
+                self._dirty['venue'] or self._dirty['artist']:
+            self._refresh()
+        return self._state
+
+    def recommend_venues(self, artist_id, limit=MATCH_RESULTS_LIMIT):
+        # Venues seeking talent, best match for the artist first;
+        # None if there is no such artist
+        state = self._ensure_fresh()
+        return self._rank(state, state.artists, artist_id, state.venues,
+                          state.shows_by_artist.get(artist_id, {}), limit)
+
+    def recommend_artists(self, venue_id, limit=MATCH_RESULTS_LIMIT):
+        # Artists seeking a venue, best match for the venue first;
+        # None if there is no such venue
+        state = self._ensure_fresh()
+        return self._rank(state, state.venues, venue_id, state.artists,
+                          state.shows_by_venue.get(venue_id, {}), limit)
+
+    def _rank(self, state, own_side, entity_id, candidates, history, limit):
+        # 'history': candidate id -> past shows together
+        entry = own_side.entries.get(entity_id)
+        if entry is None:
+            return None
+        mask, place = entry[3], entry[4]
+        origin = geocode(*place)
+
+        # genre and location scores are computed once per distinct mask
+        # and place, then added up per bucket
+        genre_scores = {}
+
+        def get_genre_score(candidate_mask):
+            genres = genre_scores.get(candidate_mask)
+            if genres is None:
+                union = count_bits(mask | candidate_mask)
+                genres = MATCH_WEIGHTS["genres"] * (
+                    count_bits(mask & candidate_mask) / union if union else 0)
+                genre_scores[candidate_mask] = genres
+            return genres
+
+        location_scores = {
+            candidate_place: MATCH_WEIGHTS["location"] * get_location_score(
+                place, origin, candidate_place)
+            for candidate_place in candidates.buckets
+        }
+
+        # candidates with a show history get their own, individual score
+        individual = []
+        for candidate_id, count in history.items():
+            candidate = candidates.entries.get(candidate_id)
+            if candidate is None or not candidate[5]:
+                continue
+            score = get_genre_score(candidate[3]) + \
+                MATCH_WEIGHTS["history"] * min(1, count / MATCH_HISTORY_SHOWS) + \
+                MATCH_WEIGHTS["location"] * get_location_score(place, origin, candidate[4])
+            individual.append((score, candidate_id))
+
+        # Best buckets: places are visited closest first and the scan
+        # stops once no bucket of the remaining places (whose genre
+        # score is at most MATCH_WEIGHTS["genres"]) can beat the current
+        # ones. Every bucket holds at least one candidate, so 'limit'
+        # buckets are enough, plus one per history candidate (which may
+        # have been its bucket's only member)
+        needed = limit + len(individual)
+        best_buckets = []   # min-heap of (score, place, mask)
+        for candidate_place in sorted(location_scores, key=location_scores.get, reverse=True):
+            location = location_scores[candidate_place]
+            if len(best_buckets) == needed and \
+                    location + MATCH_WEIGHTS["genres"] <= best_buckets[0][0]:
+                break
+            for candidate_mask in candidates.buckets[candidate_place]:
+                bucket = (location + get_genre_score(candidate_mask),
+                          candidate_place, candidate_mask)
+                if len(best_buckets) < needed:
+                    heapq.heappush(best_buckets, bucket)
+                elif bucket[0] > best_buckets[0][0]:
+                    heapq.heapreplace(best_buckets, bucket)
+
+        results = individual
+        for score, candidate_place, candidate_mask in best_buckets:
+            results.extend((score, candidate_id) for candidate_id in
+                           sorted(candidates.buckets[candidate_place][candidate_mask])
+                           if candidate_id not in history)
+        results = heapq.nlargest(limit, results, key=lambda result: result[0])
+
+        return [self._describe(state.get_genre_names, candidates, candidate_id, score, mask, history)
+                for score, candidate_id in results if score > 0]
+
+    def _describe(self, get_genre_names, candidates, candidate_id, score, mask, history):
+        name, city, state, candidate_mask = candidates.entries[candidate_id][:4]
+        return {
+            "id": candidate_id,
+            "name": name,
+            "city": city,
+            "state": state,
+            "score": round(score, 3),
+            "shared_genres": get_genre_names(mask & candidate_mask),
+            "past_shows_together": history.get(candidate_id, 0)
+        }
+
+
+def get_location_score(place, origin, candidate_place):
+    if place == candidate_place:
+        return 1.0
+
+    target = geocode(*candidate_place)
+    if origin[0] is not None and target[0] is not None:
+        lat1, lng1, lat2, lng2 = map(math.radians, origin + target)
+        distance = get_distance(
+            math.sin((lat2 - lat1) / 2) ** 2 +
+            math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+        return max(0.0, 1 - distance / MATCH_LOCATION_RANGE_KM)
+
+    return SAME_STATE_SCORE if place[1] and place[1] == candidate_place[1] else 0.0
+
+
+matches = MatchIndex()
+
+on_commit(Venue, lambda venue_id: matches.mark_dirty('venue', venue_id))
+on_commit(Artist, lambda artist_id: matches.mark_dirty('artist', artist_id))
+on_commit(Show, lambda show_id: matches.mark_history_stale())
@@ -0,0 +1,288 @@
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+import weakref
+from flask import Response, current_app, g, request
+from flask import before_render_template, template_rendered
+from jobs import PeriodicTask
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+#----------------------------------------------------------------------------#
+# Prometheus metrics.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# '/metrics' serves the Prometheus text format:
+#   fyyur_requests_total{endpoint,method,status}     counter
+#   fyyur_request_duration_seconds{endpoint}         histogram
+#   fyyur_db_duration_seconds{endpoint}              histogram, SQL time per request
+#   fyyur_template_render_seconds{template}          histogram
+#   fyyur_cache_hits_total{cache} / _misses_total    counters ('fragment', 'image')
+#   fyyur_requests_in_flight                         gauge
+#   fyyur_rate_limited_total{scope}                  counter (see 'ratelimit.py')
+#   fyyur_search_coalesced_total                     counter (see 'search.py')
+#   fyyur_image_coalesced_total                      counter (see 'images.py')
+#   fyyur_compression_input_bytes_total{encoding}    counter, bytes before compression
+#   fyyur_compression_output_bytes_total{encoding}   counter, bytes sent (see 'compression.py')
+#
+# Recording takes no lock: every thread adds to its own shard (a
+# plain dict), and the shards are only summed when scraped. When a
+# thread exits its shard is folded into one shared by the exited
+# ones, so thread-per-request servers don't pile up shards.
+#
+# Under a multi-process server each worker only sees its own
+# requests, so with METRICS_DIR set every process also writes its
+# totals to METRICS_DIR/<pid>.json (every METRICS_FLUSH_INTERVAL
+# seconds, and on exit), and a scrape, whichever worker serves it,
+# adds up all the files. Counters and histograms of exited workers
+# are kept; gauges only count live ones. Empty METRICS_DIR when
+# redeploying, e.g.
+#     rm -rf /run/fyyur-metrics && gunicorn 'app:create_app()'
+####################################################################
+
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    "fyyur_requests_total": ('counter', 'Requests handled.'),
+    "fyyur_request_duration_seconds": ('histogram', 'Request latency.'),
+    "fyyur_db_duration_seconds": ('histogram', 'Time spent in SQL per request.'),
+    "fyyur_template_render_seconds": ('histogram', 'Template render time.'),
+    "fyyur_cache_hits_total": ('counter', 'Cache hits.'),
+    "fyyur_cache_misses_total": ('counter', 'Cache misses.'),
+    "fyyur_requests_in_flight": ('gauge', 'Requests being handled.'),
+    "fyyur_rate_limited_total": ('counter', 'Requests rejected by the rate limiter.'),
+    "fyyur_search_coalesced_total": ('counter', 'Searches answered by an identical running search.'),
+    "fyyur_image_coalesced_total": ('counter', 'Image misses answered by an identical running build.'),
+    "fyyur_compression_input_bytes_total": ('counter', 'Response bytes before compression.'),
+    "fyyur_compression_output_bytes_total": ('counter', 'Compressed response bytes sent.'),
+}
+
+
+class ShardOwner:
+    # lives in the thread's locals; collected when the thread exits
+    pass
+
+
+class Metrics:
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        # taken for a thread's first sample, its exit and scrapes;
+        # reentrant, a finalizer may run while its thread holds it
+        self._lock = threading.RLock()
+        self._shards = []
+        self._retired = {}      # samples of the threads that exited
+        self._collectors = {}
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            self._local.owner = ShardOwner()
+            weakref.finalize(self._local.owner, self._retire, shard)
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _retire(self, shard):
+        # its thread is gone, nothing writes to it anymore
+        with self._lock:
+            for key, value in shard.items():
+                add_sample(self._retired, key, value)
+            self._shards.remove(shard)
+
+    def inc(self, name, amount=1, **labels):
+        # counters and gauges (a gauge is inc'ed and dec'ed)
+        shard = self._shard()
+        key = (name, tuple(sorted(labels.items())))
+        shard[key] = shard.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        # histograms: per-bucket counts (the last one is +Inf), then the sum
+        shard = self._shard()
+        key = (name, tuple(sorted(labels.items())))
+        counts = shard.get(key)
+        if counts is None:
+            counts = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def add_collector(self, key, func):
+        # 'func' returns [(name, labels, value)], read at scrape time
+        self._collectors[key] = func
+
+    def snapshot(self):
+        # {(name, labels): value or bucket counts}, all threads added up
+        totals = {}
+        with self._lock:
+            for key, value in self._retired.items():
+                add_sample(totals, key, value)
+            for shard in list(self._shards):
+                for key, value in list(shard.items()):
+                    add_sample(totals, key, value)
+        for collect in list(self._collectors.values()):
+            for name, labels, value in collect():
+                add_sample(totals, (name, tuple(sorted(labels.items()))), value)
+        return totals
+
+
+def add_sample(totals, key, value):
+    if isinstance(value, list):
+        current = totals.get(key)
+        totals[key] = list(value) if current is None else [
+            a + b for a, b in zip(current, value)]
+    else:
+        totals[key] = totals.get(key, 0) + value
+
+
+metrics = Metrics()
+
+
+#  Multi-process registry
+#  ----------------------------------------------------------------
+
+def write_snapshot():
+    # this process's totals, for the other workers' scrapes
+    metrics_dir = current_app.config['METRICS_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    path = os.path.join(metrics_dir, f'{os.getpid()}.json')
+    temp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump([[name, labels, value]
+                   for (name, labels), value in metrics.snapshot().items()], f)
+    os.replace(temp_path, path)     # readers never see partial files
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_snapshots(metrics_dir):
+    totals = {}
+    for path in glob.glob(os.path.join(metrics_dir, '*.json')):
+        name = os.path.basename(path).split('.')[0]
+        if not name.isdigit():
+            continue
+        try:
+            with open(path) as f:
+                samples = json.load(f)
+        except (OSError, ValueError):
+            logger.warning('Skipping unreadable metrics file %s', path)
+            continue
+        alive = int(name) == os.getpid() or is_alive(int(name))
+        for name, labels, value in samples:
+            if METRICS.get(name, ('counter',))[0] == 'gauge' and not alive:
+                continue
+            add_sample(totals, (name, tuple(tuple(pair) for pair in labels)), value)
+    return totals
+
+
+#  Exposition
+#  ----------------------------------------------------------------
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def format_metrics(totals, buckets=METRICS_BUCKETS):
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        samples = sorted((labels, value) for (sample_name, labels), value in totals.items()
+                         if sample_name == name)
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            if kind != 'histogram':
+                lines.append(f'{name}{format_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {value[-1]}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def serve_metrics():
+    metrics_dir = current_app.config['METRICS_DIR']
+    if metrics_dir:
+        write_snapshot()
+        totals = read_snapshots(metrics_dir)
+    else:
+        totals = metrics.snapshot()
+    return Response(format_metrics(totals), mimetype='text/plain; version=0.0.4')
+
+
+#  Request and template hooks
+#  ----------------------------------------------------------------
+
+def start_request():
+    g.metrics_start = time.perf_counter()
+    metrics.inc('fyyur_requests_in_flight')
+
+
+def record_request(response):
+    if 'metrics_start' not in g:
+        return response
+    endpoint = request.endpoint or 'none'
+    metrics.inc('fyyur_requests_total', endpoint=endpoint,
+                method=request.method, status=response.status_code)
+    metrics.observe('fyyur_request_duration_seconds',
+                    time.perf_counter() - g.metrics_start, endpoint=endpoint)
+    if 'db_stats' in g:
+        metrics.observe('fyyur_db_duration_seconds', g.db_stats["time"], endpoint=endpoint)
+    return response
+
+
+def finish_request(error=None):
+    if g.pop('metrics_start', None) is not None:
+        metrics.inc('fyyur_requests_in_flight', -1)
+
+
+def start_render(sender, template, context, **extra):
+    g.setdefault('render_starts', []).append(time.perf_counter())
+
+
+def record_render(sender, template, context, **extra):
+    starts = g.get('render_starts')
+    if starts:
+        metrics.observe('fyyur_template_render_seconds',
+                        time.perf_counter() - starts.pop(), template=template.name)
+
+
+def init_metrics(app):
+    def collect_fragment_cache():
+        cache = app.jinja_env.fragment_cache
+        return [('fyyur_cache_hits_total', {"cache": 'fragment'}, cache.hits),
+                ('fyyur_cache_misses_total', {"cache": 'fragment'}, cache.misses)]
+
+    metrics.add_collector('fragment_cache', collect_fragment_cache)
+
+    if app.config['METRICS_DIR']:
+        writer = PeriodicTask(app, write_snapshot, app.config['METRICS_FLUSH_INTERVAL'])
+        app.extensions['metrics'] = writer
+        app.before_request(writer.start)
+
+    app.before_request(start_request)
+    app.after_request(record_request)
+    app.teardown_request(finish_request)
+    before_render_template.connect(start_render, app)
+    template_rendered.connect(record_render, app)
+    app.add_url_rule('/metrics', 'metrics', serve_metrics)
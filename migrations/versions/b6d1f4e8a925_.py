@@ -0,0 +1,134 @@
+"""empty message
+
+Revision ID: b6d1f4e8a925
+Revises: a4c8e1b7d392
+Create Date: 2026-10-19 21:37:15.206931
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d1f4e8a925'
+down_revision = 'a4c8e1b7d392'
+branch_labels = None
+depends_on = None
+
+# Range-partitions "Show" on start_time (Postgres 11 or newer, see
+# 'partitions.py'): yearly partitions for the years before the hot
+# window, monthly ones from January of the year it starts in to
+# MONTHS_AHEAD months ahead, and a default partition for the rest.
+# The app keeps creating the months ahead.
+#
+# The primary key becomes (id, start_time) -- a partitioned table's
+# unique constraints must include the partition key -- so start_time
+# is NOT NULL now. NOTE: fails if shows without a start_time exist;
+# delete or fix them first. The table is locked while its rows are
+# copied, run it in a maintenance window.
+HOT_MONTHS = 3
+MONTHS_AHEAD = 12
+
+SHOW_COLUMNS = 'id, venue_id, artist_id, start_time, duration'
+
+OVERLAP_CONSTRAINT = (
+    'ALTER TABLE "{table}" ADD CONSTRAINT "{name}_{side}_no_overlap" '
+    'EXCLUDE USING gist ({side}_id WITH =, '
+    'tsrange(start_time, start_time + make_interval(mins => duration)) WITH &&){where}')
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def create_partition(name, start, end):
+    op.execute(f'CREATE TABLE "{name}" PARTITION OF "Show_partitioned" '
+               f"FOR VALUES FROM ('{start}') TO ('{end}')")
+
+
+def add_overlap_constraints(table, name=None, where=''):
+    for side in ('venue', 'artist'):
+        op.execute(OVERLAP_CONSTRAINT.format(
+            table=table, name=name or table, side=side, where=where))
+
+
+def add_show_keys_and_indexes():
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_venue_id_fkey" '
+               'FOREIGN KEY (venue_id) REFERENCES "Venue" (id)')
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_artist_id_fkey" '
+               'FOREIGN KEY (artist_id) REFERENCES "Artist" (id)')
+    op.create_index(op.f('ix_Show_start_time'), 'Show', ['start_time'], unique=False)
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('LOCK TABLE "Show" IN ACCESS EXCLUSIVE MODE')
+    # the id sequence outlives the old table
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.execute(
+        'CREATE TABLE "Show_partitioned" ('
+        'id integer NOT NULL DEFAULT nextval(\'"Show_id_seq"\'::regclass), '
+        'venue_id integer NOT NULL, '
+        'artist_id integer NOT NULL, '
+        'start_time timestamp without time zone NOT NULL, '
+        'duration integer NOT NULL DEFAULT 120'
+        ') PARTITION BY RANGE (start_time)')
+
+    this_month = date.today().replace(day=1)
+    hot_year = add_months(this_month, -HOT_MONTHS).year
+    first = op.get_bind().execute(sa.text('SELECT min(start_time) FROM "Show"')).scalar()
+
+    # cold: one per year, hot: one per month
+    partitions = [(f'Show_y{year}', date(year, 1, 1), date(year + 1, 1, 1))
+                  for year in range(first.year if first else hot_year, hot_year)]
+    month = date(hot_year, 1, 1)
+    while month <= add_months(this_month, MONTHS_AHEAD):
+        partitions.append((f'Show_m{month:%Y_%m}', month, add_months(month, 1)))
+        month = add_months(month, 1)
+
+    for name, start, end in partitions:
+        create_partition(name, start, end)
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show_partitioned" DEFAULT')
+
+    op.execute(f'INSERT INTO "Show_partitioned" ({SHOW_COLUMNS}) '
+               f'SELECT {SHOW_COLUMNS} FROM "Show"')
+    op.execute('DROP TABLE "Show"')
+    op.execute('ALTER TABLE "Show_partitioned" RENAME TO "Show"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+
+    # keys and indexes on "Show" cascade to every partition, the
+    # overlap constraints can't (they don't include start_time with '=')
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_pkey" PRIMARY KEY (id, start_time)')
+    add_show_keys_and_indexes()
+    for name, start, end in partitions + [('Show_default', None, None)]:
+        add_overlap_constraints(name)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('LOCK TABLE "Show" IN ACCESS EXCLUSIVE MODE')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.execute(
+        'CREATE TABLE "Show_unpartitioned" ('
+        'id integer NOT NULL DEFAULT nextval(\'"Show_id_seq"\'::regclass), '
+        'venue_id integer NOT NULL, '
+        'artist_id integer NOT NULL, '
+        'start_time timestamp without time zone, '
+        'duration integer NOT NULL DEFAULT 120)')
+    op.execute(f'INSERT INTO "Show_unpartitioned" ({SHOW_COLUMNS}) '
+               f'SELECT {SHOW_COLUMNS} FROM "Show"')
+    op.execute('DROP TABLE "Show"')     # and all its partitions
+    op.execute('ALTER TABLE "Show_unpartitioned" RENAME TO "Show"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_pkey" PRIMARY KEY (id)')
+    add_show_keys_and_indexes()
+    add_overlap_constraints('Show', where=' WHERE (start_time IS NOT NULL)')
@@ -15,12 +15,32 @@ from database import db
 
 class Show(db.Model):
     __tablename__ = 'Show'
+
+    # Composite indexes so per-venue / per-artist time-window
+    # queries (calendar, past/upcoming) are served by range scans.
+    # On Postgres the table is partitioned by start_time, with
+    # (id, start_time) as its primary key (see 'partitions.py').
+    # NOTE: the model keeps 'id' as its only primary key on purpose:
+    # ids still come from one sequence, and SQLite can't generate ids for a
+    # composite key. Alembic's autogenerate doesn't compare primary
+    # keys, but don't let a generated migration touch "Show_pkey".
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey(
         'Venue.id'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey(
         'Artist.id'), nullable=False)
-    start_time = db.Column(db.DateTime, default=datetime.now())
+    start_time = db.Column(db.DateTime, default=datetime.now(), nullable=False, index=True)
+
+    # Length of the show in minutes. Together with 'start_time' it
+    # defines the booked interval; overlapping bookings for the same
+    # venue or artist are rejected (see 'scheduling.py')
+    duration = db.Column(db.Integer, nullable=False,
+                         default=120, server_default='120')
 
     def __repr__(self) -> str:
         formatted_date = datetime.strftime(
@@ -80,6 +100,10 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String())
 
+    # Filled by the offline geocoder from city/state (see 'geo.py')
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+
     # 'Genres' modeled separately to conform to 3rd-NF requirement
     genres = db.relationship('VenueGenre', backref='genre_venue', lazy=True)
     shows = db.relationship('Show', backref='show_venue')
@@ -155,6 +179,81 @@ class Artist(db.Model):
         return f'<Artist id: {self.id} name: {self.name} city: {self.city} state: {self.state} phone: {self.phone}>'
 
 
+
+# ----------- JOB Model ---------------
+
+####################################################################
+# Durable background jobs (JOB_QUEUE_BACKEND = 'database', see
+# 'jobs.py'). A row is claimed by one worker at a time; finished
+# jobs are deleted, failed ones are kept for the status page.
+####################################################################
+
+class Job(db.Model):
+    __tablename__ = 'Job'
+    __table_args__ = (
+        db.Index('ix_Job_status_run_at', 'status', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='[]')
+    # 'queued', 'running' or 'failed'
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    last_error = db.Column(db.Text)
+
+    def __repr__(self) -> str:
+        return f'<Job id: {self.id} name: {self.name} status: {self.status} attempts: {self.attempts}>'
+
+
+
+# ----------- TRENDING SCORE Model ---------------
+
+####################################################################
+# Forward-decayed popularity scores (see 'trending.py'), one row per
+# venue or artist. Processes add their buffered deltas to 'score'
+# with an upsert; nothing is ever recomputed in SQL.
+####################################################################
+
+class TrendingScore(db.Model):
+    __tablename__ = 'TrendingScore'
+
+    # 'venue' or 'artist'
+    kind = db.Column(db.String(20), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    score = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f'<TrendingScore kind: {self.kind} entity_id: {self.entity_id} score: {self.score}>'
+
+
+
+# ----------- PAGE VIEW Model ---------------
+
+####################################################################
+# Daily view counts of the venue and artist pages (see
+# 'analytics.py'): one row per page and day, incremented by batched
+# upserts of each process's buffered hits.
+####################################################################
+
+class PageView(db.Model):
+    __tablename__ = 'PageView'
+    __table_args__ = (
+        db.Index('ix_PageView_day', 'day'),
+    )
+
+    # 'venue' or 'artist'
+    kind = db.Column(db.String(20), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f'<PageView kind: {self.kind} entity_id: {self.entity_id} day: {self.day} views: {self.views}>'
+
+
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
 # class Show(db.Model):
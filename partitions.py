@@ -0,0 +1,229 @@
+import re
+from datetime import date
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import text
+from database import db
+from jobs import PeriodicTask
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+#----------------------------------------------------------------------------#
+# Show partitions.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# On Postgres, "Show" is range-partitioned on start_time (migration
+# b6d1f4e8a925):
+#   "Show_y2019"        cold: one partition per year, for the years
+#                       before the hot window
+#   "Show_m2026_10"     hot: one partition per month, from
+#                       SHOW_PARTITION_HOT_MONTHS months back to
+#                       SHOW_PARTITION_MONTHS_AHEAD months ahead
+#   "Show_default"      anything outside those (normally empty)
+# Queries bounding start_time by a value (not an expression on the
+# column) only touch the partitions in range: upcoming shows a few
+# small monthly ones, the latest past shows the newest ones first.
+#
+# Every worker checks every SHOW_PARTITION_CHECK_INTERVAL seconds
+# that the months ahead have their partitions and creates the
+# missing ones ('flask partitions create' does it right away).
+# 'flask partitions archive' merges the monthly partitions of the
+# years that left the hot window into one yearly partition, in
+# SHOW_COLD_TABLESPACE when set. "Show" is locked (reads included)
+# while a year's rows are copied: run it in a maintenance window.
+#
+# The overlap constraints can't be declared on a partitioned table,
+# each partition has its own; overlaps across a partition boundary
+# are prevented by the per venue/artist booking locks (see
+# 'scheduling.py').
+####################################################################
+
+SHOW_TABLE = 'Show'
+DEFAULT_PARTITION = 'Show_default'
+MONTHLY_PARTITION = re.compile(r'^Show_m(\d{4})_(\d{2})$')
+PARTITION_NAME = re.compile(r'^Show_(default|y\d{4}|m\d{4}_\d{2})$')
+
+# taken while creating or merging partitions, one worker at a time
+PARTITION_LOCK_KEY = 'fyyur-show-partitions'
+
+OVERLAP_CONSTRAINT = (
+    'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_{side}_no_overlap" '
+    'EXCLUDE USING gist ({side}_id WITH =, '
+    'tsrange(start_time, start_time + make_interval(mins => duration)) WITH &&)')
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def is_partitioned():
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    return db.session.execute(text(
+        'SELECT 1 FROM pg_partitioned_table '
+        "WHERE partrelid = to_regclass('\"Show\"')")).first() is not None
+
+
+def get_partitions():
+    # [(name, bounds, estimated rows, tablespace)]
+    return db.session.execute(text(
+        'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples, '
+        "coalesce(t.spcname, '') FROM pg_inherits i "
+        'JOIN pg_class c ON c.oid = i.inhrelid '
+        'LEFT JOIN pg_tablespace t ON t.oid = c.reltablespace '
+        "WHERE i.inhparent = to_regclass('\"Show\"') ORDER BY c.relname")).all()
+
+
+def lock_partitions():
+    db.session.execute(text('SELECT pg_advisory_xact_lock(hashtext(:key))'),
+                       {"key": PARTITION_LOCK_KEY})
+
+
+def include_migration_name(name, type_, parent_names):
+    # Alembic's autogenerate: the partitions aren't in the models,
+    # leave them (and their indexes) out of the comparison
+    return type_ != 'table' or not PARTITION_NAME.match(name)
+
+
+def create_partition(name, start, end, sources=(), tablespace=None):
+    # Builds the partition as a plain table, moves its rows in (from
+    # 'sources' and the default partition), then attaches it. Every step
+    # runs in one transaction: DETACH takes an ACCESS EXCLUSIVE lock on
+    # "Show" held until the commit, so when merging 'sources' all reads
+    # and writes of shows wait for the whole copy. Creating a partition
+    # without sources only moves the default partition's rows (normally
+    # none); the CHECK constraint lets ATTACH skip its validation scan.
+    preparer = db.engine.dialect.identifier_preparer
+    tablespace = f' TABLESPACE {preparer.quote(tablespace)}' if tablespace else ''
+    db.session.execute(text(
+        f'CREATE TABLE "{name}" (LIKE "{SHOW_TABLE}" INCLUDING DEFAULTS){tablespace}'))
+
+    bounds = {"start": start, "end": end}
+    for source in sources:
+        db.session.execute(text(f'ALTER TABLE "{SHOW_TABLE}" DETACH PARTITION "{source}"'))
+        db.session.execute(text(f'INSERT INTO "{name}" SELECT * FROM "{source}"'))
+        db.session.execute(text(f'DROP TABLE "{source}"'))
+    db.session.execute(text(
+        f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+        'WHERE start_time >= :start AND start_time < :end RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved'), bounds)
+
+    for side in ('venue', 'artist'):
+        db.session.execute(text(OVERLAP_CONSTRAINT.format(table=name, side=side)))
+    db.session.execute(text(
+        f'ALTER TABLE "{name}" ADD CONSTRAINT "{name}_bounds" '
+        f"CHECK (start_time >= '{start}' AND start_time < '{end}')"))
+    db.session.execute(text(
+        f'ALTER TABLE "{SHOW_TABLE}" ATTACH PARTITION "{name}" '
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"))
+    db.session.execute(text(f'ALTER TABLE "{name}" DROP CONSTRAINT "{name}_bounds"'))
+
+
+def create_future_partitions(today=None):
+    # Returns the names of the partitions created
+    if not is_partitioned():
+        return []
+    config = current_app.config
+    this_month = (today or date.today()).replace(day=1)
+    months = [add_months(this_month, i)
+              for i in range(config['SHOW_PARTITION_MONTHS_AHEAD'] + 1)]
+
+    existing = {name for name, *_ in get_partitions()}
+    if all(f'Show_m{month:%Y_%m}' in existing for month in months):
+        return []
+
+    created = []
+    try:
+        lock_partitions()
+        existing = {name for name, *_ in get_partitions()}
+        for month in months:
+            name = f'Show_m{month:%Y_%m}'
+            if name not in existing:
+                create_partition(name, month, add_months(month, 1))
+                created.append(name)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if created:
+        logger.info('Created Show partitions %s', ', '.join(created))
+    return created
+
+
+def archive_partitions(today=None):
+    # Merges the monthly partitions of every year entirely before the
+    # hot window into one yearly partition; returns the years merged
+    if not is_partitioned():
+        return []
+    config = current_app.config
+    hot_start = add_months((today or date.today()).replace(day=1),
+                           -config['SHOW_PARTITION_HOT_MONTHS'])
+
+    archived = []
+    try:
+        lock_partitions()
+        years = {}
+        for name, *_ in get_partitions():
+            match = MONTHLY_PARTITION.match(name)
+            if match and int(match.group(1)) < hot_start.year:
+                years.setdefault(int(match.group(1)), []).append(name)
+        for year, sources in sorted(years.items()):
+            create_partition(f'Show_y{year}', date(year, 1, 1), date(year + 1, 1, 1),
+                             sources, config['SHOW_COLD_TABLESPACE'])
+            db.session.commit()
+            archived.append(year)
+            lock_partitions()
+    except Exception:
+        db.session.rollback()
+        raise
+    return archived
+
+
+def check_partitions():
+    # periodic task: months ahead only, merging is left to the CLI
+    create_future_partitions()
+    db.session.close()
+
+
+partitions_cli = AppGroup('partitions', help='Partitions of the Show table (Postgres).')
+
+
+@partitions_cli.command('list')
+def list_command():
+    """List the Show partitions with their bounds and estimated rows."""
+    if not is_partitioned():
+        raise click.ClickException('"Show" is not partitioned (run "flask db upgrade")')
+    click.echo(f'{"partition":<18}{"rows":>12}  {"tablespace":<12}bounds')
+    for name, bounds, rows, tablespace in get_partitions():
+        click.echo(f'{name:<18}{max(int(rows), 0):>12}  {tablespace or "-":<12}{bounds}')
+
+
+@partitions_cli.command('create')
+def create_command():
+    """Create the monthly partitions for the months ahead."""
+    if not is_partitioned():
+        raise click.ClickException('"Show" is not partitioned (run "flask db upgrade")')
+    created = create_future_partitions()
+    click.echo(f'created {", ".join(created)}' if created else 'nothing to create')
+
+
+@partitions_cli.command('archive')
+def archive_command():
+    """Merge the monthly partitions of past years into yearly ones."""
+    if not is_partitioned():
+        raise click.ClickException('"Show" is not partitioned (run "flask db upgrade")')
+    archived = archive_partitions()
+    click.echo(f'archived {", ".join(map(str, archived))}' if archived else 'nothing to archive')
+
+
+def init_partitions(app):
+    app.cli.add_command(partitions_cli)
+    if not app.config['SHOW_PARTITION_CHECK_INTERVAL']:
+        return
+    checker = PeriodicTask(app, check_partitions, app.config['SHOW_PARTITION_CHECK_INTERVAL'])
+    app.extensions['partitions'] = checker
+    app.before_request(checker.start)
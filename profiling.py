@@ -0,0 +1,185 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import current_app, g, request
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+#----------------------------------------------------------------------------#
+# Sampling profiler.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# Opt-in: a request is profiled when
+#   - random() < PROFILE_SAMPLE_RATE (for PROFILE_ENDPOINTS only,
+#     if that list is not empty), or
+#   - it sends PROFILE_HEADER with the value of PROFILE_TOKEN
+#     (never, while PROFILE_TOKEN is unset), e.g.
+#         curl -H 'X-Profile: <token>' https://.../venues
+#
+# While any request is profiled, one sampler thread records the
+# stacks of the profiled threads every PROFILE_INTERVAL seconds.
+# Each sample is filed under the innermost of:
+#   [sql]               executing statements (sqlalchemy.engine, DB driver)
+#   [orm]               building objects from rows (sqlalchemy.orm)
+#   [format_datetime]   the 'datetime' template filter
+#   [jinja]             template code
+#   [app]               anything else
+# and written as a root frame, so a flame graph splits on it.
+#
+# Every profiled request is written to PROFILE_DIR as collapsed
+# stacks ('frame;frame;frame count' lines), the input of
+# flamegraph.pl, speedscope, etc.:
+#     flamegraph.pl .profiles/20261019T101500-venues.venues-5f0c.folded > venues.svg
+# and summarized in the log ('profile' records, time per category).
+####################################################################
+
+PROFILE_CATEGORIES = ('sql', 'orm', 'format_datetime', 'jinja', 'app')
+
+
+def get_category(filename, function):
+    path = filename.replace('\\', '/')
+    if '/sqlalchemy/engine/' in path or '/psycopg2/' in path or '/sqlite3/' in path:
+        return 'sql'
+    if '/sqlalchemy/orm/' in path:
+        return 'orm'
+    if function == 'format_datetime' and path.endswith('/utils.py'):
+        return 'format_datetime'
+    if '/jinja2/' in path or path.endswith('.html'):
+        return 'jinja'
+    return None
+
+
+def get_frame_name(frame):
+    code = frame.f_code
+    if code.co_filename.endswith('.html'):      # compiled template
+        return os.path.basename(code.co_filename)
+    module = frame.f_globals.get('__name__', os.path.basename(code.co_filename))
+    return f'{module}:{code.co_name}'
+
+
+def collapse(frame):
+    # 'category;outermost;...;innermost'
+    names = []
+    category = None
+    while frame is not None:
+        if category is None:
+            category = get_category(frame.f_code.co_filename, frame.f_code.co_name)
+        names.append(get_frame_name(frame))
+        frame = frame.f_back
+    names.append(f'[{category or "app"}]')
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._targets = {}      # thread id -> Counter of collapsed stacks
+        self._thread = None
+        self.interval = 0.005
+
+    def begin(self, thread_id):
+        with self._lock:
+            self._targets[thread_id] = Counter()
+            self._active.set()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name='profile-sampler', daemon=True)
+                self._thread.start()
+
+    def end(self, thread_id):
+        with self._lock:
+            samples = self._targets.pop(thread_id, Counter())
+            if not self._targets:
+                self._active.clear()
+        return samples
+
+    def _loop(self):
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                targets = list(self._targets.items())
+            try:
+                frames = sys._current_frames()
+                for thread_id, samples in targets:
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[collapse(frame)] += 1
+            except Exception:
+                logger.exception('Profile sampling failed')
+            finally:
+                frames = None   # don't keep the sampled frames alive
+
+
+sampler = StackSampler()
+
+
+def should_profile(config):
+    token = config['PROFILE_TOKEN']
+    if token and request.headers.get(config['PROFILE_HEADER']) == token:
+        return True
+    endpoints = config['PROFILE_ENDPOINTS']
+    if endpoints and request.endpoint not in endpoints:
+        return False
+    return random.random() < config['PROFILE_SAMPLE_RATE']
+
+
+def start_profile():
+    if should_profile(current_app.config):
+        g.profile_start = time.perf_counter()
+        sampler.begin(threading.get_ident())
+
+
+def write_profile(samples, profile_dir):
+    os.makedirs(profile_dir, exist_ok=True)
+    name = '-'.join([datetime.now().strftime('%Y%m%dT%H%M%S'),
+                     request.endpoint or 'none', g.get('request_id', '')[:8]])
+    path = os.path.join(profile_dir, f'{name}.folded')
+    with open(path, 'w') as f:
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+    return path
+
+
+def finish_profile(error=None):
+    start = g.pop('profile_start', None)
+    if start is None:
+        return
+    samples = sampler.end(threading.get_ident())
+    elapsed = time.perf_counter() - start
+    if not samples:
+        return
+
+    total = sum(samples.values())
+    categories = Counter()
+    for stack, count in samples.items():
+        categories[stack[1:stack.index(']')]] += count
+
+    try:
+        path = write_profile(samples, current_app.config['PROFILE_DIR'])
+    except OSError:
+        logger.exception('Writing profile failed')
+        return
+    logger.info('profile', extra={
+        "file": path,
+        "samples": total,
+        "duration_ms": round(elapsed * 1000, 2),
+        # share of the request's wall time, per category
+        "breakdown_ms": {category: round(elapsed * 1000 * categories[category] / total, 2)
+                         for category in PROFILE_CATEGORIES if categories[category]},
+    })
+
+
+def init_profiling(app):
+    sampler.interval = app.config['PROFILE_INTERVAL']
+    if app.config['PROFILE_SAMPLE_RATE'] <= 0 and not app.config['PROFILE_TOKEN']:
+        return      # off: no hooks at all
+    app.before_request(start_profile)
+    app.teardown_request(finish_profile)
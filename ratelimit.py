@@ -0,0 +1,136 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, current_app, request
+from logs import get_logger
+from metrics import metrics
+
+try:
+    import redis
+except ImportError:     # optional: only needed for RATELIMIT_BACKEND = 'redis'
+    redis = None
+
+logger = get_logger(__name__)
+
+#----------------------------------------------------------------------------#
+# Rate limiting.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# Token buckets per client (remote address, PROXY_COUNT must be set
+# behind a reverse proxy, see 'config.py') and scope: a bucket holds
+# up to RATELIMIT_BURST tokens and refills at RATELIMIT_RATE tokens a
+# second; every request takes one, and a request finding the bucket
+# empty gets '429 Too Many Requests' with a Retry-After header.
+#
+#     @bp.route('/venues/search')
+#     @rate_limited('search')
+#     def search_venues(): ...
+#
+# RATELIMIT_BACKEND picks where the buckets live:
+#   'memory'    per process (a client gets RATELIMIT_BURST per worker)
+#   'redis'     shared by all workers, in the Redis at RATELIMIT_REDIS_URL
+#               (needs the 'redis' package)
+# If Redis can't be reached, requests are let through (and logged).
+####################################################################
+
+RATELIMIT_MAX_CLIENTS = 10000   # buckets kept by the memory backend
+
+# refill, take one token, store; returns {allowed, tokens left}
+REDIS_TOKEN_BUCKET = '''
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+'''
+
+
+class MemoryBuckets:
+    def __init__(self, rate, burst, max_clients=RATELIMIT_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()   # key -> (tokens, updated), least recent first
+
+    def take(self, key):
+        # Returns (allowed, tokens left)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return allowed, tokens
+
+
+class RedisBuckets:
+    def __init__(self, rate, burst, url):
+        if redis is None:
+            raise RuntimeError("RATELIMIT_BACKEND 'redis' needs the 'redis' package")
+        self.rate = rate
+        self.burst = burst
+        self._client = redis.Redis.from_url(url, socket_timeout=0.1)
+        self._script = self._client.register_script(REDIS_TOKEN_BUCKET)
+
+    def take(self, key):
+        try:
+            allowed, tokens = self._script(
+                keys=[f'fyyur:ratelimit:{key}'], args=[self.rate, self.burst, time.time()])
+        except redis.RedisError:
+            logger.warning('Rate limiter unavailable, letting %s through', key, exc_info=True)
+            return True, self.burst
+        return bool(allowed), float(tokens)
+
+
+class RateLimiter:
+    def __init__(self, buckets):
+        self.buckets = buckets
+
+    def hit(self, key):
+        # Returns (allowed, seconds until the next token)
+        allowed, tokens = self.buckets.take(key)
+        return allowed, 0 if allowed else (1 - tokens) / self.buckets.rate
+
+
+def rate_limited(scope):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter = current_app.extensions['ratelimit']
+            allowed, retry_after = limiter.hit(f'{scope}:{request.remote_addr}')
+            if not allowed:
+                metrics.inc('fyyur_rate_limited_total', scope=scope)
+                response = Response('Too many requests, please slow down.', 429,
+                                    mimetype='text/plain')
+                response.headers['Retry-After'] = str(math.ceil(retry_after))
+                return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_ratelimit(app):
+    rate, burst = app.config['RATELIMIT_RATE'], app.config['RATELIMIT_BURST']
+    if app.config['RATELIMIT_BACKEND'] == 'redis':
+        buckets = RedisBuckets(rate, burst, app.config['RATELIMIT_REDIS_URL'])
+    elif app.config['RATELIMIT_BACKEND'] == 'memory':
+        buckets = MemoryBuckets(rate, burst)
+    else:
+        raise ValueError(f'Unknown RATELIMIT_BACKEND "{app.config["RATELIMIT_BACKEND"]}"')
+    app.extensions['ratelimit'] = RateLimiter(buckets)
@@ -0,0 +1,92 @@
+import random
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session as BaseSession
+from sqlalchemy import create_engine
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# With SQLALCHEMY_REPLICA_URIS set, the read-only views below run
+# their queries on a randomly picked replica (one per request);
+# everything else, flushes and INSERT/UPDATE/DELETE statements
+# always go to the primary (SQLALCHEMY_DATABASE_URI).
+#
+# Read-your-writes: a write request (any other endpoint, with a
+# method other than GET/HEAD) sets a short-lived cookie, and while
+# it is valid that client reads from the primary too, so it sees its
+# own change even if the replicas lag behind by a few seconds.
+#
+# The in-memory indexes (name lookups, matchmaking, co-performances,
+# trending, nearby venues) keep what they load for minutes, so they
+# load it from the primary ('read_from_primary'), whichever request
+# happens to trigger the load.
+####################################################################
+
+READ_ONLY_ENDPOINTS = {
+    'index', 'trending_page', 'analytics', 'metrics',
+    'venues.venues', 'venues.show_venue', 'venues.venue_calendar',
+    'venues.search_venues', 'venues.lookup_venues', 'venues.nearby_venues',
+    'venues.venue_matches',
+    'artists.artists', 'artists.show_artist', 'artists.artist_calendar',
+    'artists.search_artists', 'artists.lookup_artists', 'artists.artist_matches',
+    'shows.shows',
+}
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_COOKIE = 'read_primary_until'
+
+
+class RoutingSession(BaseSession):
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if has_request_context() and not self._flushing and \
+                not getattr(clause, 'is_dml', False):
+            replica = g.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+@contextmanager
+def read_from_primary():
+    # queries inside go to the primary even in a read-only view
+    replica = g.pop('replica', None) if has_request_context() else None
+    try:
+        yield
+    finally:
+        if replica is not None:
+            g.replica = replica
+
+
+def is_sticky():
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def choose_replica():
+    replicas = current_app.extensions['replicas']
+    if replicas and request.endpoint in READ_ONLY_ENDPOINTS and not is_sticky():
+        g.replica = random.choice(replicas)
+
+
+def mark_sticky(response):
+    if request.method not in READ_ONLY_METHODS and \
+            request.endpoint not in READ_ONLY_ENDPOINTS:
+        seconds = current_app.config['REPLICA_STICKY_SECONDS']
+        response.set_cookie(STICKY_COOKIE, str(time.time() + seconds),
+                            max_age=seconds, httponly=True, samesite='Lax')
+    return response
+
+
+def init_replicas(app):
+    engine_options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    app.extensions['replicas'] = [
+        create_engine(uri, **engine_options)
+        for uri in app.config.get('SQLALCHEMY_REPLICA_URIS', ())
+    ]
+    app.before_request(choose_replica)
+    app.after_request(mark_sticky)
@@ -0,0 +1,196 @@
+from datetime import timedelta
+from itertools import islice
+from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY
+from sqlalchemy import text
+from database import db, mark_written
+from models import Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Show Scheduling (double-booking detection).
+#----------------------------------------------------------------------------#
+
+####################################################################
+# A show occupies [start_time, start_time + duration). A venue or
+# an artist cannot hold two overlapping shows.
+#
+# The check below only reads shows starting inside
+# (new_start - MAX_SHOW_DURATION, new_end), i.e. a bounded range
+# scan over the (venue_id, start_time) / (artist_id, start_time)
+# indexes, so it stays O(log n) however long the history grows.
+#
+# Concurrent submissions are serialized per venue and per artist:
+# on Postgres the booking transaction first takes a transaction-level
+# advisory lock for every venue and artist it books (see
+# 'lock_show_bookings'), so the check always sees the shows of any
+# booking that ran before it. The exclusion constraints (migration
+# c7a2f9e4b613) remain as a backstop, making a losing commit fail
+# with an IntegrityError, but since "Show" is partitioned (see
+# 'partitions.py') they only hold within a partition: two shows
+# straddling a month boundary are only kept apart by the lock.
+####################################################################
+
+# advisory lock key spaces (the first key of pg_advisory_xact_lock)
+BOOKING_LOCK_VENUE = 1
+BOOKING_LOCK_ARTIST = 2
+
+DEFAULT_SHOW_DURATION = 120         # minutes
+MAX_SHOW_DURATION = 24 * 60         # minutes
+MAX_BATCH_SHOWS = 500               # rows per batch submission
+
+RECURRENCE_FREQUENCIES = {
+    'daily': DAILY,
+    'weekly': WEEKLY,
+    'monthly': MONTHLY
+}
+
+
+def get_show_end(start_time, duration):
+    return start_time + timedelta(minutes=duration or DEFAULT_SHOW_DURATION)
+
+
+def find_overlaps(intervals):
+    # Sweep over half-open (start, end, key) intervals sorted by start,
+    # keeping the one reaching furthest so far; anything starting before
+    # it ends overlaps it (a show ending at 22:00 does not clash with one
+    # starting at 22:00). Returns the keys involved in any overlap.
+    overlapping = set()
+    furthest = None
+    for interval in sorted(intervals, key=lambda i: i[0]):
+        if furthest is not None and interval[0] < furthest[1]:
+            overlapping.update((interval[2], furthest[2]))
+        if furthest is None or interval[1] > furthest[1]:
+            furthest = interval
+    return overlapping
+
+
+def find_booked_intervals(show_column, entity_ids, start_time, end_time):
+    # One range query for all the venues (or artists) of a batch
+    earliest_start = start_time - timedelta(minutes=MAX_SHOW_DURATION)
+
+    booked = db.session.query(show_column, Show.id, Show.start_time, Show.duration).filter(
+        show_column.in_(entity_ids),
+        Show.start_time > earliest_start,
+        Show.start_time < end_time).all()
+
+    intervals = {}
+    for entity_id, show_id, show_start, show_duration in booked:
+        intervals.setdefault(entity_id, []).append(
+            (show_start, get_show_end(show_start, show_duration), ('show', show_id)))
+    return intervals
+
+
+def lock_show_bookings(bookings):
+    # Blocks until no other transaction books any of these venues or
+    # artists; released at commit/rollback. Always taken in the same
+    # (key space, id) order, so two batches can't deadlock
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    keys = sorted({(BOOKING_LOCK_VENUE, booking["venue_id"]) for booking in bookings} |
+                  {(BOOKING_LOCK_ARTIST, booking["artist_id"]) for booking in bookings})
+    for key_space, entity_id in keys:
+        db.session.execute(text('SELECT pg_advisory_xact_lock(:key_space, :entity_id)'),
+                           {"key_space": key_space, "entity_id": entity_id})
+
+
+def check_show_bookings(bookings):
+    # Validates a batch of bookings (dicts with 'venue_id', 'artist_id',
+    # 'start_time' and 'duration') in one pass: one query per table for
+    # existence, one range query per side for conflicts, and overlaps
+    # against existing shows *and* within the batch itself.
+    result = {
+        "venues": {},
+        "artists": {},
+        "errors": []
+    }
+    if not bookings:
+        return result
+
+    if len(bookings) > MAX_BATCH_SHOWS:
+        result["errors"].append(
+            f'At most {MAX_BATCH_SHOWS} shows can be scheduled at once.')
+        return result
+
+    for row, booking in enumerate(bookings, start=1):
+        if not 0 < booking["duration"] <= MAX_SHOW_DURATION:
+            result["errors"].append(
+                f'Row {row}: show duration must be between 1 and {MAX_SHOW_DURATION} minutes.')
+    if result["errors"]:
+        return result
+
+    venue_ids = {booking["venue_id"] for booking in bookings}
+    artist_ids = {booking["artist_id"] for booking in bookings}
+
+    result["venues"] = dict(db.session.query(Venue.id, Venue.name).filter(
+        Venue.id.in_(venue_ids)).all())
+    result["artists"] = dict(db.session.query(Artist.id, Artist.name).filter(
+        Artist.id.in_(artist_ids)).all())
+
+    for venue_id in sorted(venue_ids - set(result["venues"])):
+        result["errors"].append(f'Venue with ID {venue_id} does not exist.')
+    for artist_id in sorted(artist_ids - set(result["artists"])):
+        result["errors"].append(f'Artist with ID {artist_id} does not exist.')
+    if result["errors"]:
+        return result
+
+    new_intervals = [
+        (booking["start_time"],
+         get_show_end(booking["start_time"], booking["duration"]),
+         ('row', row))
+        for row, booking in enumerate(bookings, start=1)]
+    window_start = min(interval[0] for interval in new_intervals)
+    window_end = max(interval[1] for interval in new_intervals)
+
+    for side, names in (('venue', result["venues"]), ('artist', result["artists"])):
+        show_column = getattr(Show, f'{side}_id')
+        booked = find_booked_intervals(
+            show_column, set(names), window_start, window_end)
+
+        for entity_id in sorted(names):
+            intervals = booked.get(entity_id, []) + [
+                interval for interval, booking in zip(new_intervals, bookings)
+                if booking[f'{side}_id'] == entity_id]
+
+            clashing_rows = sorted(
+                key[1] for key in find_overlaps(intervals) if key[0] == 'row')
+            for row in clashing_rows:
+                result["errors"].append(
+                    f'{"Row " + str(row) + ": " if len(bookings) > 1 else ""}'
+                    f'{side.capitalize()} "{names[entity_id]}" is already booked at that time.')
+
+    return result
+
+
+def expand_recurrence(venue_id, artist_id, start_time, duration=DEFAULT_SHOW_DURATION,
+                      frequency='weekly', interval=1, count=None, until=None):
+    # Turns a residency ("every week at 20:00, 10 times") into
+    # individual bookings, using dateutil's RFC 5545 recurrence rules.
+    # Stops one past MAX_BATCH_SHOWS, so that 'check_show_bookings'
+    # rejects a series too long for one batch instead of it being cut
+    if count is None and until is None:
+        count = 1
+
+    dates = rrule(RECURRENCE_FREQUENCIES[frequency], dtstart=start_time,
+                  interval=interval, count=count, until=until)
+
+    return [{
+        "venue_id": venue_id,
+        "artist_id": artist_id,
+        "start_time": date,
+        "duration": duration
+    } for date in islice(dates, MAX_BATCH_SHOWS + 1)]
+
+
+def insert_show_bookings(bookings):
+    # All rows go out as a single multi-row INSERT ... VALUES, in the
+    # caller's transaction (one commit for the whole batch).
+    # Returns the new show ids
+    show_ids = db.session.execute(Show.__table__.insert().values([{
+        "venue_id": booking["venue_id"],
+        "artist_id": booking["artist_id"],
+        "start_time": booking["start_time"],
+        "duration": booking["duration"]
+    } for booking in bookings]).returning(Show.id)).scalars().all()
+
+    for show_id in show_ids:
+        mark_written(db.session, Show, show_id)
+    return show_ids
@@ -0,0 +1,82 @@
+import threading
+from datetime import datetime
+from sqlalchemy import and_, func
+from database import db
+from models import Venue, Artist, Show
+from metrics import metrics
+
+#----------------------------------------------------------------------------#
+# Venue and artist search.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# One query per search: the name matches with their upcoming show
+# counts (outer join + GROUP BY instead of a COUNT per match).
+#
+# Identical searches running at the same time in a process share one
+# execution (single flight): the first caller queries, later callers
+# wait for and reuse its result. Results are plain dicts, safe to
+# hand to other threads.
+####################################################################
+
+SEARCH_MODELS = {
+    'venue': (Venue, Show.venue_id),
+    'artist': (Artist, Show.artist_id),
+}
+
+
+class SingleFlight:
+    def __init__(self, metric='fyyur_search_coalesced_total'):
+        self.metric = metric    # counts the callers that waited
+        self._lock = threading.Lock()
+        self._calls = {}    # key -> [done event, result, error]
+
+    def do(self, key, func, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [threading.Event(), None, None]
+
+        if not leader:
+            metrics.inc(self.metric)
+            call[0].wait()
+        else:
+            try:
+                call[1] = func(*args)
+            except Exception as err:
+                call[2] = err
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call[0].set()
+
+        if call[2] is not None:
+            raise call[2]
+        return call[1]
+
+
+searches = SingleFlight()
+
+
+def run_search(kind, search_term):
+    model, show_column = SEARCH_MODELS[kind]
+    upcoming = func.count(Show.id)
+    rows = db.session.query(model.id, model.name, upcoming).outerjoin(
+        Show, and_(show_column == model.id, Show.start_time >= datetime.now())).filter(
+        model.name.ilike(f'%{search_term}%')).group_by(
+        model.id, model.name).order_by(model.id).all()
+
+    return {
+        "count": len(rows),
+        "data": [{
+            "id": entity_id,
+            "name": name,
+            "num_upcoming_shows": num_upcoming_shows
+        } for entity_id, name, num_upcoming_shows in rows]
+    }
+
+
+def search(kind, search_term):
+    # ILIKE is case-insensitive, so differently cased terms are one search
+    return searches.do((kind, search_term.lower()), run_search, kind, search_term)
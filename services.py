@@ -0,0 +1,223 @@
+from datetime import datetime
+from sqlalchemy import insert, update, delete, select, values, column, String
+from database import db, mark_written
+from models import Venue, Artist, VenueGenre, ArtistGenre, TrendingScore
+from scheduling import lock_show_bookings, check_show_bookings, insert_show_bookings
+from geo import geocode
+from trending import trending
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+#----------------------------------------------------------------------------#
+# Write services (unit of work).
+#----------------------------------------------------------------------------#
+
+####################################################################
+# Every write handler in app.py goes through these functions.
+# They issue Core statements instead of building ORM objects, so
+# nothing is hydrated or lazy-loaded around the commit, and the
+# handlers get back just the id they need for the redirect.
+#
+# On Postgres an entity and its genre rows are written in ONE round
+# trip: the entity INSERT/UPDATE ... RETURNING id is a CTE that the
+# genre DELETE/INSERT reuse. Other databases (e.g. SQLite in local
+# development) get the same result with one statement per table.
+####################################################################
+
+
+class UnitOfWork:
+    # One transaction per request: commits when the block succeeds,
+    # rolls back on any error, and always releases the session.
+    #
+    #     with UnitOfWork() as session:
+    #         ...
+    def __enter__(self):
+        return db.session
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                db.session.commit()
+            else:
+                db.session.rollback()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.close()
+        return False
+
+
+def is_checked(value):
+    # WTForms checkboxes post 'y' instead of True/False
+    if type(value) is bool:
+        return value
+    return str(value or '').startswith('y')
+
+
+def get_venue_fields(form):
+    return {
+        "name": form.get('name', ''),
+        "city": form.get('city', ''),
+        "state": form.get('state', ''),
+        "address": form.get('address', ''),
+        "phone": form.get('phone', ''),
+        "image_link": form.get('image_link', ''),
+        "facebook_link": form.get('facebook_link', ''),
+        "website": form.get('website_link', ''),
+        "seeking_talent": is_checked(form.get('seeking_talent')),
+        "seeking_description": form.get('seeking_description', '')
+    }
+
+
+def get_artist_fields(form):
+    return {
+        "name": form.get('name', ''),
+        "city": form.get('city', ''),
+        "state": form.get('state', ''),
+        "phone": form.get('phone', ''),
+        "image_link": form.get('image_link', ''),
+        "facebook_link": form.get('facebook_link', ''),
+        "website": form.get('website_link', ''),
+        "seeking_venue": is_checked(form.get('seeking_venue')),
+        "seeking_description": form.get('seeking_description', '')
+    }
+
+
+def locate_venue(fields):
+    # adds the coordinates of the venue's city (None when unknown)
+    latitude, longitude = geocode(fields.get('city'), fields.get('state'))
+    if latitude is None:
+        logger.warning('No coordinates for %s, %s: the venue is left out of '
+                       'nearby searches', fields.get('city'), fields.get('state'))
+    return dict(fields, latitude=latitude, longitude=longitude)
+
+
+def write_with_genres(session, parent_stmt, genre_model, foreign_key, genres, replace=False):
+    # Runs 'parent_stmt' (an INSERT/UPDATE ... RETURNING id) and writes
+    # the genre rows for the returned id; with 'replace' the existing
+    # genres are deleted first. Returns the id, or None when the UPDATE
+    # matched no row.
+    genre_fk = getattr(genre_model, foreign_key)
+
+    if session.get_bind().dialect.name != 'postgresql':
+        parent_id = session.execute(parent_stmt).scalar()
+        if parent_id is None:
+            return None
+        if replace:
+            session.execute(delete(genre_model).where(genre_fk == parent_id))
+        if genres:
+            session.execute(insert(genre_model).values([
+                {"name": genre, foreign_key: parent_id} for genre in genres]))
+        return parent_id
+
+    parent = parent_stmt.cte('parent')
+    stmt = select(parent.c.id)
+
+    if replace:
+        stmt = stmt.add_cte(delete(genre_model).where(
+            genre_fk.in_(select(parent.c.id))).cte('old_genres'))
+
+    if genres:
+        genre_names = values(column('name', String), name='genre_names').data(
+            [(genre,) for genre in genres])
+        stmt = stmt.add_cte(insert(genre_model).from_select(
+            ['name', foreign_key],
+            select(genre_names.c.name, parent.c.id)).cte('new_genres'))
+
+    return session.execute(stmt).scalar()
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+def create_venue(fields, genres):
+    with UnitOfWork() as session:
+        venue_id = write_with_genres(
+            session, insert(Venue).values(**locate_venue(fields)).returning(Venue.id),
+            VenueGenre, 'venue_id', genres)
+        mark_written(session, Venue, venue_id)
+    trending.record('venue', venue_id, 'listing')
+    return venue_id
+
+
+def update_venue(venue_id, fields, genres):
+    with UnitOfWork() as session:
+        venue_id = write_with_genres(
+            session,
+            update(Venue).where(Venue.id == venue_id).values(
+                **locate_venue(fields)).returning(Venue.id),
+            VenueGenre, 'venue_id', genres, replace=True)
+        if venue_id is not None:
+            mark_written(session, Venue, venue_id)
+    return venue_id
+
+
+def delete_venue(venue_id):
+    # Returns the deleted venue's name, or None if there was no such venue
+    with UnitOfWork() as session:
+        session.execute(delete(VenueGenre).where(
+            VenueGenre.venue_id == venue_id))
+        session.execute(delete(TrendingScore).where(
+            TrendingScore.kind == 'venue', TrendingScore.entity_id == venue_id))
+        venue_name = session.execute(delete(Venue).where(
+            Venue.id == venue_id).returning(Venue.name)).scalar()
+        if venue_name is not None:
+            mark_written(session, Venue, venue_id)
+    trending.remove('venue', venue_id)
+    return venue_name
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+def create_artist(fields, genres):
+    with UnitOfWork() as session:
+        artist_id = write_with_genres(
+            session, insert(Artist).values(**fields).returning(Artist.id),
+            ArtistGenre, 'artist_id', genres)
+        mark_written(session, Artist, artist_id)
+    trending.record('artist', artist_id, 'listing')
+    return artist_id
+
+
+def update_artist(artist_id, fields, genres):
+    with UnitOfWork() as session:
+        artist_id = write_with_genres(
+            session,
+            update(Artist).where(Artist.id == artist_id).values(
+                **fields).returning(Artist.id),
+            ArtistGenre, 'artist_id', genres, replace=True)
+        if artist_id is not None:
+            mark_written(session, Artist, artist_id)
+    return artist_id
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+def schedule_shows(bookings):
+    # Validates and inserts one or many shows in a single transaction.
+    # Returns the 'check_show_bookings' result (venue/artist names and
+    # errors) with the new show ids under "show_ids"
+    with UnitOfWork():
+        # serializes bookings of the same venues/artists, so the check
+        # below can't miss a concurrent one (see 'scheduling.py')
+        lock_show_bookings(bookings)
+        result = check_show_bookings(bookings)
+        result["show_ids"] = []
+        if not result["errors"]:
+            result["show_ids"] = insert_show_bookings(bookings)
+
+    # bookkeeping only: the shows are committed whatever happens here
+    if result["show_ids"]:
+        try:
+            now = datetime.now()
+            for booking in bookings:
+                if booking["start_time"] >= now:
+                    trending.record('venue', booking["venue_id"], 'show')
+                    trending.record('artist', booking["artist_id"], 'show')
+        except Exception:
+            logger.exception('Recording scheduled shows for trending failed')
+    return result
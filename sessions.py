@@ -0,0 +1,238 @@
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import click
+from flask import current_app, request
+from flask.cli import AppGroup
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from flask_wtf.csrf import CSRFProtect
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+#----------------------------------------------------------------------------#
+# Server-side sessions.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# The session cookie only carries a random session id, signed with
+# SECRET_KEY; the data (flash messages, the CSRF token) is kept on
+# the server, in the store picked by SESSION_BACKEND:
+#   'filesystem'    one file per session in SESSION_DIR
+#   'sqlite'        one row per session in SESSION_SQLITE_PATH
+#   'cookie'        Flask's signed cookie sessions (no server store)
+# More stores can be added to SESSION_STORES: load / save / delete /
+# purge by session id.
+#
+# Sessions are only written when they change, and a visitor with an
+# empty session gets no cookie at all. Stored sessions expire after
+# PERMANENT_SESSION_LIFETIME; 'flask sessions purge' deletes the
+# expired ones (e.g. from cron).
+#
+# Every worker (and every host sharing SESSION_DIR) reads the same
+# store with the same key, so sessions survive worker restarts.
+#
+# Every POST/PUT/PATCH/DELETE must carry the session's CSRF token
+# (Flask-WTF's CSRFProtect: the forms' 'csrf_token' field, or an
+# X-CSRFToken header), except JSON requests to CSRF_JSON_ENDPOINTS:
+# a cross-site form can't send an application/json body without a
+# CORS preflight, which is never allowed.
+####################################################################
+
+SESSION_SALT = 'fyyur-session'
+SESSION_ID_PATTERN = re.compile(r'^[\w-]{32,64}$')
+
+CSRF_JSON_ENDPOINTS = {'shows.create_show_batch_submission'}
+
+csrf = CSRFProtect()
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        self.accessed = True
+        return super().__contains__(key)
+
+
+class FilesystemStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid):
+        try:
+            with open(self._path(sid)) as f:
+                expires, data = f.read().split('\n', 1)
+        except (FileNotFoundError, ValueError):
+            return None
+        return data if float(expires) > time.time() else None
+
+    def save(self, sid, data, expires):
+        path = self._path(sid)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(f'{expires}\n{data}')
+        os.replace(temp_path, path)
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def purge(self):
+        purged = 0
+        for name in os.listdir(self.directory):
+            if SESSION_ID_PATTERN.match(name) and self.load(name) is None:
+                self.delete(name)
+                purged += 1
+        return purged
+
+
+class SQLiteStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()     # one connection per thread
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS session '
+                '(sid TEXT PRIMARY KEY, expires REAL NOT NULL, data TEXT NOT NULL)')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+        return connection
+
+    def load(self, sid):
+        row = self._connect().execute(
+            'SELECT data FROM session WHERE sid = ? AND expires > ?',
+            (sid, time.time())).fetchone()
+        return row[0] if row else None
+
+    def save(self, sid, data, expires):
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO session (sid, expires, data) VALUES (?, ?, ?)',
+                (sid, expires, data))
+
+    def delete(self, sid):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM session WHERE sid = ?', (sid,))
+
+    def purge(self):
+        with self._connect() as connection:
+            return connection.execute(
+                'DELETE FROM session WHERE expires <= ?', (time.time(),)).rowcount
+
+
+SESSION_STORES = {
+    'filesystem': lambda config: FilesystemStore(config['SESSION_DIR']),
+    'sqlite': lambda config: SQLiteStore(config['SESSION_SQLITE_PATH']),
+}
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=SESSION_SALT)
+
+    def open_session(self, app, request):
+        signed = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+        if signed:
+            try:
+                sid = self._signer(app).unsign(signed).decode()
+            except BadSignature:
+                sid = None
+            if sid and SESSION_ID_PATTERN.match(sid):
+                data = self.store.load(sid)
+                if data is not None:
+                    return ServerSession(session_json_serializer.loads(data), sid=sid)
+        # a new id, even for an unknown one (no session fixation)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = app.config['SESSION_COOKIE_NAME']
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+
+        self.store.save(session.sid, session_json_serializer.dumps(dict(session)),
+                        time.time() + app.permanent_session_lifetime.total_seconds())
+        response.set_cookie(
+            name, self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+
+def check_csrf():
+    # before every request (WTF_CSRF_CHECK_DEFAULT is off, this
+    # replaces CSRFProtect's own check)
+    if not current_app.config['WTF_CSRF_ENABLED'] or request.endpoint is None:
+        return
+    if request.is_json and request.endpoint in CSRF_JSON_ENDPOINTS:
+        return
+    csrf.protect()
+
+
+sessions_cli = AppGroup('sessions', help='Server-side sessions.')
+
+
+@sessions_cli.command('purge')
+def purge_command():
+    """Delete expired sessions from the session store."""
+    store = current_app.extensions.get('sessions')
+    if store is None:
+        raise click.ClickException('SESSION_BACKEND is "cookie", nothing to purge')
+    click.echo(f'{store.purge()} expired sessions deleted')
+
+
+def init_sessions(app):
+    backend = app.config['SESSION_BACKEND']
+    csrf.init_app(app)
+    app.before_request(check_csrf)
+    app.cli.add_command(sessions_cli)
+    if backend == 'cookie':
+        return
+    if backend not in SESSION_STORES:
+        raise ValueError(f'Unknown SESSION_BACKEND "{backend}"')
+    store = SESSION_STORES[backend](app.config)
+    app.extensions['sessions'] = store
+    app.session_interface = ServerSessionInterface(store)
@@ -0,0 +1,313 @@
+from datetime import timezone
+from flask import Blueprint, render_template, request
+from flask import flash, redirect, url_for, jsonify
+from sqlalchemy import exc
+from database import db
+from models import Venue, Artist, Show
+from scheduling import expand_recurrence
+from scheduling import DEFAULT_SHOW_DURATION, RECURRENCE_FREQUENCIES
+from utils import get_time_window, filter_time_window, stream_page
+import services
+from logs import get_logger
+
+#----------------------------------------------------------------------------#
+# Show pages.
+#----------------------------------------------------------------------------#
+
+bp = Blueprint('shows', __name__)
+logger = get_logger(__name__)
+
+
+def parse_start_time(value):
+    # Shows are stored with naive times: an explicit offset
+    # ('2040-01-01T20:00:00+02:00') is converted to UTC and dropped
+    import dateutil.parser
+
+    start_time = dateutil.parser.parse(str(value))
+    if start_time.tzinfo is not None:
+        start_time = start_time.astimezone(timezone.utc).replace(tzinfo=None)
+    return start_time
+
+
+def parse_int(value, default=None):
+    # only a missing value (not 0) falls back to the default
+    if value is None or str(value).strip() == '':
+        return default
+    return int(value)
+
+
+def parse_show_batch(data):
+    # Builds the bookings for '/shows/batch' from either explicit rows
+    # (JSON 'shows' list, or one "venue_id, artist_id, start_time[, duration]"
+    # per line in the form's 'rows') or a recurrence rule.
+    # Raises ValueError with a displayable message on malformed input
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object.')
+
+    if data.get('shows') is not None:
+        if not isinstance(data['shows'], list):
+            raise ValueError('"shows" must be a list of shows.')
+        rows = []
+        for row, show in enumerate(data['shows'], start=1):
+            if not isinstance(show, dict):
+                raise ValueError(
+                    f'Row {row}: expected an object with venue_id, artist_id and start_time.')
+            rows.append([show.get('venue_id'), show.get('artist_id'),
+                         show.get('start_time'), show.get('duration')])
+    elif (data.get('rows') or '').strip():
+        rows = [[column.strip() for column in line.split(',')]
+                for line in data['rows'].splitlines() if line.strip()]
+    else:
+        rows = None
+
+    if rows is not None:
+        bookings = []
+        for row, columns in enumerate(rows, start=1):
+            if len(columns) not in (3, 4):
+                raise ValueError(
+                    f'Row {row}: expected "venue_id, artist_id, start_time[, duration]".')
+            try:
+                booking = {
+                    "venue_id": int(columns[0]),
+                    "artist_id": int(columns[1]),
+                    "start_time": parse_start_time(columns[2]),
+                    "duration": parse_int((columns[3:] or [None])[0], DEFAULT_SHOW_DURATION)
+                }
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f'Row {row}: invalid id, start time or duration.')
+            if booking["duration"] < 1:
+                raise ValueError(f'Row {row}: show duration must be at least 1 minute.')
+            bookings.append(booking)
+        return bookings
+
+    frequency = data.get('frequency') or 'weekly'
+    if frequency not in RECURRENCE_FREQUENCIES:
+        raise ValueError(f'Unknown recurrence frequency "{frequency}".')
+    try:
+        venue_id = int(data.get('venue_id'))
+        artist_id = int(data.get('artist_id'))
+        start_time = parse_start_time(data.get('start_time'))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(
+            'Recurrence needs a valid venue id, artist id and start time.')
+    try:
+        duration = parse_int(data.get('duration'), DEFAULT_SHOW_DURATION)
+        interval = parse_int(data.get('interval'), 1)
+        count = parse_int(data.get('count'))
+        until = parse_start_time(data['until']) if data.get('until') else None
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('Recurrence needs a valid duration, interval, count and end date.')
+
+    if duration < 1:
+        raise ValueError('Show duration must be at least 1 minute.')
+    if interval < 1:
+        raise ValueError('Recurrence interval must be at least 1.')
+    if count is not None and count < 1:
+        raise ValueError('Recurrence count must be at least 1.')
+    return expand_recurrence(venue_id, artist_id, start_time, duration=duration,
+                             frequency=frequency, interval=interval,
+                             count=count, until=until)
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@bp.route('/shows')
+def shows():
+    # displays list of shows at /shows
+    # TODO: replace with real venues data.
+
+    # Optional time window ('?from=&to=') and venue/artist filters,
+    # answered by range scans over the 'start_time' indexes
+    # Only the columns the listing shows, joined in the same query (no
+    # lazy load per show before the first byte is sent)
+    start, end = get_time_window(request.args)
+    q_shows = db.session.query(
+        Show.venue_id, Venue.name, Show.artist_id, Artist.name,
+        Artist.image_link, Show.start_time).join(
+        Venue, Venue.id == Show.venue_id).join(
+        Artist, Artist.id == Show.artist_id)
+    q_shows = filter_time_window(q_shows, start, end)
+
+    venue_id = request.args.get('venue_id', type=int)
+    if venue_id is not None:
+        q_shows = q_shows.filter(Show.venue_id == venue_id)
+
+    artist_id = request.args.get('artist_id', type=int)
+    if artist_id is not None:
+        q_shows = q_shows.filter(Show.artist_id == artist_id)
+
+    data = [{
+        "venue_id": venue_id,
+        "venue_name": venue_name,
+        "artist_id": artist_id,
+        "artist_name": artist_name,
+        "artist_image_link": artist_image_link,
+        "start_time": start_time
+    } for venue_id, venue_name, artist_id, artist_name, artist_image_link, start_time
+        in q_shows.order_by(Show.start_time)]
+
+    # data = [{
+    #     "venue_id": 1,
+    #     "venue_name": "The Musical Hop",
+    #     "artist_id": 4,
+    #     "artist_name": "Guns N Petals",
+    #     "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
+    #     "start_time": "2019-05-21T21:30:00.000Z"
+    # }, {
+    #     "venue_id": 3,
+    #     "venue_name": "Park Square Live Music & Coffee",
+    #     "artist_id": 5,
+    #     "artist_name": "Matt Quevedo",
+    #     "artist_image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
+    #     "start_time": "2019-06-15T23:00:00.000Z"
+    # }, {
+    #     "venue_id": 3,
+    #     "venue_name": "Park Square Live Music & Coffee",
+    #     "artist_id": 6,
+    #     "artist_name": "The Wild Sax Band",
+    #     "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #     "start_time": "2035-04-01T20:00:00.000Z"
+    # }, {
+    #     "venue_id": 3,
+    #     "venue_name": "Park Square Live Music & Coffee",
+    #     "artist_id": 6,
+    #     "artist_name": "The Wild Sax Band",
+    #     "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #     "start_time": "2035-04-08T20:00:00.000Z"
+    # }, {
+    #     "venue_id": 3,
+    #     "venue_name": "Park Square Live Music & Coffee",
+    #     "artist_id": 6,
+    #     "artist_name": "The Wild Sax Band",
+    #     "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #     "start_time": "2035-04-15T20:00:00.000Z"
+    # }]
+    return stream_page('pages/shows.html', shows=data)
+
+
+@bp.route('/shows/create')
+def create_shows():
+    # renders form. do not touch.
+    from forms import ShowForm
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+
+@bp.route('/shows/create', methods=['POST'])
+def create_show_submission():
+    # called to create new shows in the db, upon submitting new show listing form
+
+    error = False
+    booking_errors = []
+    try:
+        venue_id = int(request.form.get('venue_id', '1'))
+        artist_id = int(request.form.get('artist_id', '1'))
+        start_time = parse_start_time(request.form.get('start_time'))
+        duration = parse_int(request.form.get('duration'), DEFAULT_SHOW_DURATION)
+
+        # Existence + double-booking check and insert in one transaction;
+        # the names for the flash message come back from the check, so
+        # nothing is lazy-loaded after commit
+        result = services.schedule_shows([{
+            "venue_id": venue_id,
+            "artist_id": artist_id,
+            "start_time": start_time,
+            "duration": duration
+        }])
+        booking_errors = result["errors"]
+
+    except exc.IntegrityError as err:
+        # A concurrent submission booked an overlapping slot between our
+        # check and the commit; the exclusion constraint rejected this one
+        error = True
+        booking_errors.append(
+            'The venue or artist was booked for an overlapping time in the meantime.')
+        logger.warning('Overlapping booking rejected: %s', err)
+
+    except exc.SQLAlchemyError:
+        error = True
+        logger.exception('Creating show failed')
+
+    except Exception:
+        error = True
+        logger.exception('Creating show failed')
+
+    if booking_errors:
+        for message in booking_errors:
+            flash(f'Show could not be listed. {message}', 'error')
+    elif error:
+        flash('An error occurred. Show could not be listed.')
+    else:
+        flash(
+            f'Show "{result["artists"][artist_id]}:{artist_id} => {result["venues"][venue_id]}:{venue_id}" was successfully listed!')
+        return redirect(url_for('.shows', venue_id=venue_id))
+
+    return redirect(url_for('.create_shows'))
+
+
+@bp.route('/shows/batch')
+def create_show_batch_form():
+    from forms import ShowBatchForm
+    form = ShowBatchForm()
+    return render_template('forms/new_show_batch.html', form=form)
+
+
+@bp.route('/shows/batch', methods=['POST'])
+def create_show_batch_submission():
+    # Bulk / recurring show creation (tours, weekly residencies).
+    # Accepts the batch form or a JSON body; every row is validated in
+    # one pass and all of them are inserted in a single statement and
+    # transaction -- either the whole batch is listed or none of it.
+
+    is_json = request.is_json
+    data = (request.get_json(silent=True) or {}) if is_json else request.form
+
+    status = 400        # invalid input, unless something below fails
+    batch_errors = []
+    created = 0
+    try:
+        bookings = parse_show_batch(data)
+
+        if not bookings:
+            batch_errors.append('No shows to schedule.')
+        else:
+            result = services.schedule_shows(bookings)
+            batch_errors = result["errors"]
+            created = len(result["show_ids"])
+
+    except ValueError as err:
+        batch_errors.append(str(err))
+
+    except exc.IntegrityError as err:
+        # lost a race against a concurrent booking (exclusion constraint)
+        status = 409
+        batch_errors.append(
+            'A venue or artist was booked for an overlapping time in the meantime.')
+        logger.warning('Overlapping booking rejected: %s', err)
+
+    except exc.SQLAlchemyError:
+        status = 500
+        logger.exception('Creating show batch failed')
+
+    except Exception:
+        status = 500
+        logger.exception('Creating show batch failed')
+
+    if status == 500:
+        batch_errors.append('An error occurred. Shows could not be listed.')
+
+    if is_json:
+        return jsonify({
+            "success": not batch_errors,
+            "created": created,
+            "errors": batch_errors
+        }), 201 if created else status
+
+    if created:
+        flash(f'{created} shows were successfully listed!')
+        return redirect(url_for('.shows'))
+
+    for message in batch_errors:
+        flash(f'Shows could not be listed. {message}', 'error')
+    return redirect(url_for('.create_show_batch_form'))
@@ -2,3 +2,32 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Searchable id pickers for the show forms: fills the <datalist>
+// attached to an input from its JSON lookup endpoint as the user types
+(function () {
+  var lists = document.querySelectorAll('datalist[data-lookup]');
+  Array.prototype.forEach.call(lists, function (list) {
+    var input = document.querySelector('input[list="' + list.id + '"]');
+    var timer = null;
+    if (!input) { return; }
+
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        fetch(list.getAttribute('data-lookup') + '?q=' + encodeURIComponent(input.value))
+          .then(function (response) { return response.json(); })
+          .then(function (results) {
+            list.innerHTML = '';
+            results.forEach(function (result) {
+              var option = document.createElement('option');
+              option.value = result.id;
+              option.label = result.name;
+              option.textContent = result.name;
+              list.appendChild(option);
+            });
+          });
+      }, 150);
+    });
+  });
+})();
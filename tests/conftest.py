@@ -0,0 +1,39 @@
+import os
+import sys
+import pytest
+
+# the app's modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    # create_app('test') on a throwaway SQLite file; 'settings' are
+    # passed as FYYUR_<SETTING> overrides (see 'config.py')
+    def make_app(**settings):
+        monkeypatch.setenv('SECRET_KEY', 'test')
+        monkeypatch.setenv('FYYUR_SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "fyyur.db"}')
+        monkeypatch.setenv('FYYUR_DIRECTORY_SNAPSHOT_PATH', str(tmp_path / 'directory.pickle'))
+        for name, value in settings.items():
+            monkeypatch.setenv(f'FYYUR_{name}', value)
+        from app import create_app
+        return create_app('test')
+    return make_app
+
+
+@pytest.fixture
+def seeded_app(make_app):
+    # tables created, with one venue (id 1) and one artist (id 1)
+    app = make_app()
+    from database import db
+    from models import Venue, Artist
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                  address='1015 Folsom Street', phone='123-123-1234'),
+            Artist(name='Guns N Petals', city='San Francisco', state='CA',
+                   phone='326-123-5000'),
+        ])
+        db.session.commit()
+    return app
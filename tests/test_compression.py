@@ -0,0 +1,149 @@
+import gzip
+import zlib
+import pytest
+from flask import Flask, Response, send_file
+import compression
+from compression import get_encodings, init_compression
+
+PAGE = '<p>' + 'Upcoming shows at the Musical Hop. ' * 100 + '</p>'
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(COMPRESS_ENCODINGS=['br', 'gzip'], COMPRESS_MIN_SIZE=500,
+                      COMPRESS_LEVEL=6, COMPRESS_BROTLI_QUALITY=4)
+    init_compression(app)
+
+    @app.route('/page')
+    def page():
+        response = Response(PAGE, mimetype='text/html')
+        response.set_etag('v1')
+        return response
+
+    @app.route('/small')
+    def small():
+        return Response('<p>ok</p>', mimetype='text/html')
+
+    @app.route('/stream')
+    def stream():
+        return Response((f'<p>chunk {i}</p>' for i in range(3)), mimetype='text/html')
+
+    @app.route('/image')
+    def image():
+        return Response(b'\x89PNG' + b'\0' * 1000, mimetype='image/png')
+
+    @app.route('/bundle.js')
+    def bundle():
+        response = Response(gzip.compress(PAGE.encode()), mimetype='application/javascript')
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    @app.route('/file')
+    def file():
+        return send_file(__file__, mimetype='text/plain')
+
+    return app
+
+
+def get(app, path, accept_encoding=None, method='GET'):
+    headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+    return app.test_client().open(path, method=method, headers=headers)
+
+
+def test_gzip_when_accepted(app):
+    response = get(app, '/page', 'gzip, deflate')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.vary
+    assert gzip.decompress(response.data).decode() == PAGE
+    assert int(response.headers['Content-Length']) == len(response.data) < len(PAGE)
+
+
+def test_identity_without_accept_encoding(app):
+    response = get(app, '/page')
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.vary
+    assert response.data.decode() == PAGE
+
+
+@pytest.mark.parametrize('accept_encoding', ['gzip;q=0', 'deflate', 'identity'])
+def test_identity_when_gzip_is_refused(app, accept_encoding):
+    response = get(app, '/page', accept_encoding)
+    assert 'Content-Encoding' not in response.headers
+    assert response.data.decode() == PAGE
+
+
+def test_q_values_pick_the_encoding(app, monkeypatch):
+    # negotiation only: 'br' is offered but encoded with gzip here
+    monkeypatch.setattr(compression, 'get_encodings', lambda config: ['br', 'gzip'])
+    monkeypatch.setitem(compression.ENCODERS, 'br', compression.ENCODERS['gzip'])
+    assert get(app, '/page', 'br;q=0.5, gzip').headers['Content-Encoding'] == 'gzip'
+    assert get(app, '/page', 'br, gzip').headers['Content-Encoding'] == 'br'
+    assert get(app, '/page', '*').headers['Content-Encoding'] == 'br'
+
+
+def test_br_is_only_offered_with_brotli(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    assert get_encodings({'COMPRESS_ENCODINGS': ['br', 'gzip']}) == ['gzip']
+    assert get_encodings({'COMPRESS_ENCODINGS': ['br']}) == []
+
+
+def test_brotli():
+    brotli = pytest.importorskip('brotli')
+    app = Flask(__name__)
+    app.config.update(COMPRESS_ENCODINGS=['br', 'gzip'], COMPRESS_MIN_SIZE=0,
+                      COMPRESS_LEVEL=6, COMPRESS_BROTLI_QUALITY=4)
+    init_compression(app)
+    app.add_url_rule('/page', 'page', lambda: Response(PAGE, mimetype='text/html'))
+    response = get(app, '/page', 'gzip, br')
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data).decode() == PAGE
+
+
+def test_small_responses_are_left_alone(app):
+    response = get(app, '/small', 'gzip')
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == b'<p>ok</p>'
+
+
+@pytest.mark.parametrize('path, encoding', [
+    ('/image', None),           # not text
+    ('/bundle.js', 'gzip'),     # already compressed
+    ('/file', None),            # sent from a file
+])
+def test_other_responses_are_left_alone(app, path, encoding):
+    response = get(app, path, 'gzip')
+    assert response.headers.get('Content-Encoding') == encoding
+    assert 'Accept-Encoding' not in response.vary
+
+
+def test_head_is_left_alone(app):
+    assert 'Content-Encoding' not in get(app, '/page', 'gzip', method='HEAD').headers
+
+
+def test_streamed_pages_are_flushed_per_chunk(app):
+    response = app.test_client().get('/stream', headers={'Accept-Encoding': 'gzip'},
+                                     buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+
+    # every chunk can be decoded as soon as it arrives
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    pieces = [decoder.decompress(data) for data in response.response]
+    assert [piece for piece in pieces if piece] == \
+        [f'<p>chunk {i}</p>'.encode() for i in range(3)]
+    assert decoder.eof
+
+
+def test_strong_etag_becomes_weak(app):
+    response = get(app, '/page', 'gzip')
+    assert response.get_etag() == ('v1', True)
+    assert get(app, '/page').get_etag() == ('v1', False)
+
+
+def test_off_without_encodings():
+    app = Flask(__name__)
+    app.config.update(COMPRESS_ENCODINGS=[])
+    init_compression(app)
+    app.add_url_rule('/page', 'page', lambda: Response(PAGE, mimetype='text/html'))
+    assert 'Content-Encoding' not in get(app, '/page', 'gzip').headers
@@ -0,0 +1,92 @@
+import math
+import random
+from collections import namedtuple
+import pytest
+import services
+from geo import EARTH_RADIUS_KM, VenueGeoIndex, get_cell
+
+Row = namedtuple('Row', 'id name city state latitude longitude')
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def scatter(rng, rows, count, latitude, longitude, spread):
+    for _ in range(count):
+        lng = longitude + rng.uniform(-spread, spread)
+        rows.append(Row(len(rows) + 1, f'Venue {len(rows) + 1}', 'City', 'ST',
+                        latitude + rng.uniform(-spread, spread),
+                        (lng + 180) % 360 - 180))
+
+
+@pytest.fixture(scope='module')
+def rows():
+    # dense clusters (ring search) around a city, in the far north and
+    # across the antimeridian, plus a few venues anywhere
+    rng = random.Random(1)
+    rows = []
+    scatter(rng, rows, 1500, 40.7, -74.0, 1.5)
+    scatter(rng, rows, 1500, 78.2, 15.6, 3.0)
+    scatter(rng, rows, 500, -16.5, 179.9, 1.0)
+    scatter(rng, rows, 200, 89.7, 0.0, 0.25)
+    scatter(rng, rows, 300, 0.0, 0.0, 90.0)
+    return rows
+
+
+@pytest.fixture(scope='module')
+def index(rows):
+    index = VenueGeoIndex()
+    index._query = lambda *criteria: rows
+    return index
+
+
+def brute_force(rows, latitude, longitude, radius_km, limit):
+    found = sorted((haversine(latitude, longitude, row.latitude, row.longitude), row.id)
+                   for row in rows)
+    return [venue_id for distance, venue_id in found if distance <= radius_km][:limit]
+
+
+@pytest.mark.parametrize('latitude, longitude', [
+    (40.7, -74.0),
+    (41.9, -72.6),      # the edge of a cluster
+    (78.2, 15.6),       # high latitude: cells are ~2km wide
+    (80.5, 18.0),
+    (89.9, 120.0),      # next to the pole: every longitude is close
+    (-16.5, 179.95),    # just west of the antimeridian
+    (-16.5, -179.95),   # just east of it
+    (0.0, 0.0),
+])
+@pytest.mark.parametrize('radius_km, limit', [
+    (2, 10), (15, 10), (50, 25), (300, 5), (5000, 20),
+])
+def test_nearby_matches_brute_force(rows, index, latitude, longitude, radius_km, limit):
+    found = index.nearby(latitude, longitude, radius_km, limit)
+    assert [venue["id"] for venue in found] == \
+        brute_force(rows, latitude, longitude, radius_km, limit)
+    assert all(venue["distance_km"] <= radius_km for venue in found)
+
+
+def test_venue_across_the_antimeridian_is_found():
+    index = VenueGeoIndex()
+    index._query = lambda *criteria: [
+        Row(1, 'East', 'Suva', 'FJ', -18.0, 179.99),
+        Row(2, 'West', 'Taveuni', 'FJ', -18.0, -179.99),
+    ]
+    assert [venue["id"] for venue in index.nearby(-18.0, -179.99, 5, 10)] == [2, 1]
+
+
+def test_cells_wrap_at_the_antimeridian():
+    assert get_cell(10.0, 180.0) == get_cell(10.0, -180.0)
+
+
+def test_venues_without_a_location_are_reported(seeded_app, caplog):
+    assert services.locate_venue({"city": 'Springfield', "state": 'ZZ'})["latitude"] is None
+    assert 'Springfield, ZZ' in caplog.text
+
+    # the seeded venue has no coordinates
+    response = seeded_app.test_client().get('/venues/nearby?lat=37.77&lng=-122.42')
+    assert response.get_json()["location_unknown"] == 1
@@ -0,0 +1,118 @@
+import io
+import os
+import urllib.error
+import pytest
+import images
+from metrics import metrics
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    # 'file://' sources below 'origin' stand in for remote images
+    app = make_app()
+    app.config.update(IMAGE_CACHE_DIR=str(tmp_path / 'cache'),
+                      IMAGE_PROXY_LOCAL_ROOT=str(tmp_path / 'origin'),
+                      IMAGE_WIDTHS=(160, 320))
+    os.mkdir(tmp_path / 'origin')
+    Image.new('RGB', (800, 600), 'steelblue').save(tmp_path / 'origin' / 'photo.png')
+    return app
+
+
+@pytest.fixture
+def photo(tmp_path):
+    return f'file://{tmp_path / "origin" / "photo.png"}'
+
+
+def get_image(app, src, width=160, accept='image/webp,*/*'):
+    return app.test_client().get('/img', query_string={"src": src, "w": width},
+                                 headers={'Accept': accept})
+
+
+def cache_hits():
+    return metrics.snapshot().get(('fyyur_cache_hits_total', (('cache', 'image'),)), 0)
+
+
+def test_variant_is_built_and_cached(app, photo, tmp_path):
+    response = get_image(app, photo)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'public' in response.headers['Cache-Control']
+    assert Image.open(io.BytesIO(response.data)).size == (160, 120)
+    assert len(os.listdir(tmp_path / 'cache')) == 1
+
+    # served from the cache, even with the original gone
+    os.remove(tmp_path / 'origin' / 'photo.png')
+    hits = cache_hits()
+    assert get_image(app, photo).data == response.data
+    assert cache_hits() == hits + 1
+
+
+def test_jpeg_without_webp_and_unknown_widths(app, photo):
+    response = get_image(app, photo, width=5000, accept='image/jpeg')
+    assert response.mimetype == 'image/jpeg'
+    assert Image.open(io.BytesIO(response.data)).size == (320, 240)   # the largest
+
+
+@pytest.mark.parametrize('src', [
+    'https://evil.example.com/photo.png',
+    'http://127.0.0.1:5432/',
+    'ftp://images.unsplash.com/photo.png',
+    '',
+])
+def test_other_hosts_are_not_proxied(app, src):
+    assert get_image(app, src).status_code == 404
+    with app.test_request_context():
+        assert images.image_url(src) == src
+
+
+def test_allowed_hosts_are_proxied(app):
+    with app.test_request_context():
+        assert images.image_url('https://images.unsplash.com/photo-1', 160) == \
+            '/img?src=https://images.unsplash.com/photo-1&w=160'
+
+
+def test_redirect_to_another_host_is_refused(app):
+    handler = images.AllowedRedirectHandler()
+    with app.test_request_context(), pytest.raises(urllib.error.HTTPError):
+        handler.redirect_request(None, None, 302, 'Found', {}, 'http://169.254.169.254/')
+
+
+def test_path_outside_the_root_is_refused(app, tmp_path):
+    Image.new('RGB', (10, 10)).save(tmp_path / 'secret.png')
+    os.symlink(tmp_path / 'secret.png', tmp_path / 'origin' / 'link.png')
+    for src in (f'file://{tmp_path / "origin"}/../secret.png',
+                f'file://{tmp_path / "secret.png"}',
+                f'file://{tmp_path / "origin" / "link.png"}'):
+        assert get_image(app, src).status_code == 404
+        with app.app_context(), pytest.raises(ValueError):
+            images.fetch_source(src)
+    assert not os.path.exists(tmp_path / 'cache') or not os.listdir(tmp_path / 'cache')
+
+
+def test_file_sources_need_a_local_root(app, photo):
+    app.config['IMAGE_PROXY_LOCAL_ROOT'] = None
+    assert get_image(app, photo).status_code == 404
+
+
+def test_not_an_image(app, tmp_path):
+    (tmp_path / 'origin' / 'notes.png').write_text('not an image')
+    assert get_image(app, f'file://{tmp_path / "origin" / "notes.png"}').status_code == 404
+
+
+def test_original_is_cached_as_is_without_pillow(app, photo, tmp_path, monkeypatch):
+    monkeypatch.setattr(images, 'Image', None)
+    response = get_image(app, photo)
+    assert response.status_code == 200
+    assert response.data == (tmp_path / 'origin' / 'photo.png').read_bytes()
+    # no WebP without Pillow, whatever the browser accepts
+    assert os.listdir(tmp_path / 'cache')[0].endswith('.jpeg')
+
+
+def test_eviction_keeps_the_cache_under_its_cap(app, photo, tmp_path):
+    app.config['IMAGE_CACHE_MAX_BYTES'] = 1
+    assert get_image(app, photo).status_code == 200
+    response = get_image(app, photo, width=320)
+    assert response.status_code == 200     # the variant just built is kept
+    assert len(os.listdir(tmp_path / 'cache')) == 1
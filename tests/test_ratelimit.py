@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+import pytest
+from flask import Flask
+import ratelimit
+from ratelimit import MemoryBuckets, RateLimiter, init_ratelimit, rate_limited
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(ratelimit, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_burst_then_empty(clock):
+    buckets = MemoryBuckets(rate=1.0, burst=3)
+    assert [buckets.take('a')[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_refills_at_the_rate(clock):
+    buckets = MemoryBuckets(rate=2.0, burst=2)
+    buckets.take('a'), buckets.take('a')
+    assert buckets.take('a')[0] is False
+    clock.now += 0.5    # one token back
+    assert buckets.take('a')[0] is True
+    assert buckets.take('a')[0] is False
+
+
+def test_never_refills_past_the_burst(clock):
+    buckets = MemoryBuckets(rate=1.0, burst=2)
+    buckets.take('a')
+    clock.now += 3600
+    assert buckets.take('a') == (True, 1)
+
+
+def test_clients_have_their_own_buckets(clock):
+    buckets = MemoryBuckets(rate=1.0, burst=1)
+    assert buckets.take('a')[0] is True
+    assert buckets.take('a')[0] is False
+    assert buckets.take('b')[0] is True
+
+
+def test_least_recent_client_is_forgotten(clock):
+    buckets = MemoryBuckets(rate=1.0, burst=1, max_clients=2)
+    buckets.take('a'), buckets.take('b'), buckets.take('c')
+    # 'a' was dropped and starts again with a full bucket
+    assert buckets.take('a')[0] is True
+    assert buckets.take('c')[0] is False
+
+
+def test_retry_after(clock):
+    limiter = RateLimiter(MemoryBuckets(rate=0.5, burst=1))
+    assert limiter.hit('a') == (True, 0)
+    clock.now += 1      # half a token
+    assert limiter.hit('a') == (False, pytest.approx(1.0))
+
+
+def test_rate_limited_view(clock):
+    app = Flask(__name__)
+    app.config.update(RATELIMIT_BACKEND='memory', RATELIMIT_RATE=0.25, RATELIMIT_BURST=2)
+    init_ratelimit(app)
+
+    @app.route('/search')
+    @rate_limited('search')
+    def search():
+        return 'results'
+
+    client = app.test_client()
+    assert [client.get('/search').status_code for _ in range(2)] == [200, 200]
+    response = client.get('/search')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '4'
+    # another client isn't affected
+    assert client.get('/search', environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code == 200
+
+
+def test_unknown_backend():
+    app = Flask(__name__)
+    app.config.update(RATELIMIT_BACKEND='memcached', RATELIMIT_RATE=1.0, RATELIMIT_BURST=1)
+    with pytest.raises(ValueError):
+        init_ratelimit(app)
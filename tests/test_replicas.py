@@ -0,0 +1,143 @@
+import time
+import pytest
+from flask import g
+from sqlalchemy import update
+from database import db
+from models import Venue
+from replicas import READ_ONLY_ENDPOINTS, STICKY_COOKIE, read_from_primary
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(SQLALCHEMY_REPLICA_URIS=f'["sqlite:///{tmp_path / "replica.db"}"]')
+
+
+def request(app, path, method='GET', cookie=None):
+    # a request context with the before_request hooks run
+    headers = {'Cookie': f'{STICKY_COOKIE}={cookie}'} if cookie is not None else {}
+    context = app.test_request_context(path, method=method, headers=headers)
+    context.push()
+    app.preprocess_request()
+    return context
+
+
+def bound_to(app, **kwargs):
+    engine = db.session.get_bind(**kwargs)
+    if engine is app.extensions['replicas'][0]:
+        return 'replica'
+    assert engine.url == db.engine.url
+    return 'primary'
+
+
+def sticky_cookie(response):
+    # (value, Set-Cookie header) or None
+    for header in response.headers.getlist('Set-Cookie'):
+        if header.startswith(f'{STICKY_COOKIE}='):
+            return header.split(';')[0].split('=', 1)[1], header
+    return None
+
+
+def test_read_only_endpoints_exist(app):
+    assert READ_ONLY_ENDPOINTS <= {rule.endpoint for rule in app.url_map.iter_rules()}
+
+
+@pytest.mark.parametrize('path', ['/venues', '/artists/1', '/shows', '/venues/lookup?q=ho'])
+def test_read_only_views_use_the_replica(app, path):
+    context = request(app, path)
+    try:
+        assert bound_to(app) == 'replica'
+    finally:
+        context.pop()
+
+
+@pytest.mark.parametrize('path, method', [
+    ('/venues/create', 'GET'),
+    ('/venues/create', 'POST'),
+    ('/shows/create', 'POST'),
+])
+def test_other_views_use_the_primary(app, path, method):
+    context = request(app, path, method)
+    try:
+        assert g.get('replica') is None
+        assert bound_to(app) == 'primary'
+    finally:
+        context.pop()
+
+
+def test_writes_always_go_to_the_primary(app):
+    context = request(app, '/venues')
+    try:
+        assert bound_to(app, clause=update(Venue).values(name='x')) == 'primary'
+        assert bound_to(app, clause=Venue.__table__.insert()) == 'primary'
+        assert bound_to(app, clause=Venue.__table__.select()) == 'replica'
+    finally:
+        context.pop()
+
+
+def test_read_from_primary(app):
+    context = request(app, '/venues')
+    try:
+        with read_from_primary():
+            assert bound_to(app) == 'primary'
+        assert bound_to(app) == 'replica'
+    finally:
+        context.pop()
+
+
+def test_write_sets_the_sticky_cookie(app):
+    context = request(app, '/venues/create', 'POST')
+    try:
+        cookie = sticky_cookie(app.process_response(app.response_class('')))
+    finally:
+        context.pop()
+    assert cookie is not None
+    value, header = cookie
+    assert 'Max-Age=5' in header and 'HttpOnly' in header
+    until = float(value)
+    assert time.time() < until <= time.time() + 5
+
+
+@pytest.mark.parametrize('path, method', [
+    ('/venues', 'GET'),
+    ('/venues/create', 'GET'),          # the form, nothing written yet
+    ('/venues/search', 'POST'),         # read-only, even though it's a POST
+])
+def test_reads_dont_set_the_sticky_cookie(app, path, method):
+    context = request(app, path, method)
+    try:
+        assert sticky_cookie(app.process_response(app.response_class(''))) is None
+    finally:
+        context.pop()
+
+
+def test_client_reads_its_writes_from_the_primary(app):
+    context = request(app, '/venues/create', 'POST')
+    try:
+        cookie = sticky_cookie(app.process_response(app.response_class('')))
+    finally:
+        context.pop()
+
+    context = request(app, '/venues', cookie=cookie[0])
+    try:
+        assert bound_to(app) == 'primary'
+    finally:
+        context.pop()
+
+
+@pytest.mark.parametrize('cookie', [str(time.time() - 1), 'not a time', ''])
+def test_expired_or_invalid_cookie_uses_the_replica(app, cookie):
+    context = request(app, '/venues', cookie=cookie)
+    try:
+        assert bound_to(app) == 'replica'
+    finally:
+        context.pop()
+
+
+def test_no_replicas(make_app):
+    app = make_app()
+    context = request(app, '/venues')
+    try:
+        assert g.get('replica') is None
+        assert db.session.get_bind().url == db.engine.url
+    finally:
+        context.pop()
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+from scheduling import MAX_BATCH_SHOWS, expand_recurrence, find_overlaps
+
+
+def at(hour, minute=0):
+    return datetime(2030, 5, 1, hour, minute)
+
+
+#  find_overlaps
+#  ----------------------------------------------------------------
+
+def test_back_to_back_shows_do_not_overlap():
+    assert find_overlaps([
+        (at(20), at(22), 'a'),
+        (at(22), at(23), 'b'),
+    ]) == set()
+
+
+def test_overlapping_shows_are_both_reported():
+    assert find_overlaps([
+        (at(20), at(22), 'a'),
+        (at(21, 59), at(23), 'b'),
+        (at(23), at(23, 30), 'c'),
+    ]) == {'a', 'b'}
+
+
+def test_overlap_with_a_long_show_is_found_past_shorter_ones():
+    # 'c' starts after 'b' ends but inside the long 'a'
+    assert find_overlaps([
+        (at(18), at(23), 'a'),
+        (at(18, 30), at(19), 'b'),
+        (at(21), at(21, 30), 'c'),
+    ]) == {'a', 'b', 'c'}
+
+
+def test_intervals_are_sorted_first():
+    assert find_overlaps([
+        (at(21), at(22), 'late'),
+        (at(20), at(21, 30), 'early'),
+    ]) == {'late', 'early'}
+
+
+def test_no_intervals():
+    assert find_overlaps([]) == set()
+
+
+#  expand_recurrence
+#  ----------------------------------------------------------------
+
+def test_weekly_residency():
+    bookings = expand_recurrence(1, 2, at(20), duration=90, frequency='weekly', count=4)
+    assert [booking["start_time"] for booking in bookings] == [
+        at(20) + timedelta(weeks=week) for week in range(4)]
+    assert all(booking["venue_id"] == 1 and booking["artist_id"] == 2 and
+               booking["duration"] == 90 for booking in bookings)
+
+
+def test_until_is_inclusive():
+    bookings = expand_recurrence(1, 2, at(20), frequency='daily', interval=2,
+                                 until=at(20) + timedelta(days=6))
+    assert [booking["start_time"].day for booking in bookings] == [1, 3, 5, 7]
+
+
+def test_one_show_without_count_or_until():
+    assert len(expand_recurrence(1, 2, at(20))) == 1
+
+
+def test_long_series_yield_one_too_many():
+    # one past the cap, so the batch check rejects it instead of
+    # silently dropping the rest
+    until = at(20) + timedelta(days=10000)
+    assert len(expand_recurrence(1, 2, at(20), frequency='daily', count=600)) == \
+        MAX_BATCH_SHOWS + 1
+    assert len(expand_recurrence(1, 2, at(20), frequency='daily', until=until)) == \
+        MAX_BATCH_SHOWS + 1
+
+
+def test_long_series_are_rejected(seeded_app):
+    response = seeded_app.test_client().post('/shows/batch', json={
+        "venue_id": 1, "artist_id": 1, "start_time": '2040-01-01T20:00:00',
+        "frequency": 'daily', "count": 600})
+    assert response.status_code == 400
+    assert response.get_json() == {"success": False, "created": 0, "errors": [
+        f'At most {MAX_BATCH_SHOWS} shows can be scheduled at once.']}
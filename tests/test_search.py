@@ -0,0 +1,94 @@
+import threading
+import pytest
+from metrics import metrics
+from search import SingleFlight
+
+METRIC = 'fyyur_search_coalesced_total'
+
+
+def coalesced():
+    return metrics.snapshot().get((METRIC, ()), 0)
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight(METRIC)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def search(term):
+        calls.append(term)
+        started.set()
+        release.wait(5)
+        return [term.upper()]
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('q', search, 'jazz')))
+    leader.start()
+    started.wait(5)
+
+    before = coalesced()
+    followers = [threading.Thread(target=lambda: results.append(flight.do('q', search, 'jazz')))
+                 for _ in range(7)]
+    for thread in followers:
+        thread.start()
+    while coalesced() < before + 7:     # all of them waiting
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert calls == ['jazz']
+    assert results == [['JAZZ']] * 8
+
+
+def test_sequential_calls_run_again():
+    flight = SingleFlight(METRIC)
+    calls = []
+    assert flight.do('q', lambda: calls.append(1) or len(calls)) == 1
+    assert flight.do('q', lambda: calls.append(1) or len(calls)) == 2
+
+
+def test_different_keys_dont_wait_for_each_other():
+    flight = SingleFlight(METRIC)
+    inner = []
+
+    def outer():
+        # would deadlock if 'b' waited for 'a'
+        inner.append(flight.do('b', lambda: 'b'))
+        return 'a'
+
+    assert flight.do('a', outer) == 'a'
+    assert inner == ['b']
+
+
+def test_errors_reach_every_caller_and_are_not_kept():
+    flight = SingleFlight(METRIC)
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('database went away')
+
+    errors = []
+
+    def call():
+        try:
+            flight.do('q', fail)
+        except RuntimeError as err:
+            errors.append(err)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    before = coalesced()
+    follower = threading.Thread(target=call)
+    follower.start()
+    while coalesced() < before + 1:
+        threading.Event().wait(0.001)
+    release.set()
+    leader.join(5), follower.join(5)
+
+    assert len(errors) == 2 and errors[0] is errors[1]
+    with pytest.raises(ValueError):
+        flight.do('q', lambda: int('not cached'))
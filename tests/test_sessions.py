@@ -0,0 +1,62 @@
+import re
+import pytest
+
+
+@pytest.fixture
+def client(seeded_app):
+    seeded_app.config['WTF_CSRF_ENABLED'] = True
+    return seeded_app.test_client()
+
+
+def get_csrf_token(client, path):
+    page = client.get(path).get_data(as_text=True)
+    return re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+
+
+VENUE = {
+    "name": 'The Dueling Pianos Bar', "city": 'New York', "state": 'NY',
+    "address": '335 Delancey Street', "phone": '914-003-1132', "genres": 'Jazz',
+}
+
+
+def test_form_post_without_token_is_refused(client):
+    response = client.post('/venues/create', data=VENUE)
+    assert response.status_code == 400
+    assert b'CSRF' in response.data
+
+
+def test_form_post_with_token_is_accepted(client):
+    token = get_csrf_token(client, '/venues/create')
+    response = client.post('/venues/create', data=dict(VENUE, csrf_token=token))
+    assert response.status_code == 302
+
+
+def test_token_in_a_header(client):
+    token = get_csrf_token(client, '/venues/create')
+    response = client.post('/venues/create', data=VENUE, headers={'X-CSRFToken': token})
+    assert response.status_code == 302
+
+
+def test_token_from_another_session_is_refused(seeded_app, client):
+    token = get_csrf_token(seeded_app.test_client(), '/venues/create')
+    response = client.post('/venues/create', data=dict(VENUE, csrf_token=token))
+    assert response.status_code == 400
+
+
+def test_delete_needs_the_token(client):
+    assert client.post('/venues/1').status_code == 400
+    assert client.delete('/venues/1').status_code == 400
+
+
+def test_json_batch_needs_no_token(client):
+    response = client.post('/shows/batch', json={"shows": [
+        {"venue_id": 1, "artist_id": 1, "start_time": '2040-01-01T20:00:00'}]})
+    assert response.status_code == 201
+
+
+def test_form_batch_needs_the_token(client):
+    response = client.post('/shows/batch', data={"rows": '1, 1, 2040-01-01T20:00:00'})
+    assert response.status_code == 400
+    # the same body as text/plain, as a cross-site form could send it
+    response = client.post('/shows/batch', data='{"shows": []}', content_type='text/plain')
+    assert response.status_code == 400
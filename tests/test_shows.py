@@ -0,0 +1,73 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import exc
+from database import db
+from models import Show
+import services
+from shows import parse_start_time
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2040-01-01T20:00:00', datetime(2040, 1, 1, 20)),
+    ('2040-01-01T20:00:00+02:00', datetime(2040, 1, 1, 18)),
+    ('2040-01-01T20:00:00Z', datetime(2040, 1, 1, 20)),
+    ('2040-01-01 01:30-05:00', datetime(2040, 1, 1, 6, 30)),
+])
+def test_start_times_are_naive_utc(value, expected):
+    start_time = parse_start_time(value)
+    assert start_time == expected and start_time.tzinfo is None
+
+
+def test_show_with_an_offset_is_listed(seeded_app):
+    response = seeded_app.test_client().post('/shows/batch', json={"shows": [
+        {"venue_id": 1, "artist_id": 1, "start_time": '2040-01-01T20:00:00+02:00'}]})
+    assert response.status_code == 201
+    assert response.get_json()["created"] == 1
+    with seeded_app.app_context():
+        assert db.session.query(Show.start_time).scalar() == datetime(2040, 1, 1, 18)
+
+
+def test_trending_failure_does_not_fail_a_committed_booking(seeded_app, monkeypatch):
+    def fail(*args):
+        raise RuntimeError('trending is down')
+    monkeypatch.setattr(services.trending, 'record', fail)
+
+    response = seeded_app.test_client().post('/shows/batch', json={"shows": [
+        {"venue_id": 1, "artist_id": 1, "start_time": '2040-01-01T20:00:00'}]})
+    assert response.status_code == 201
+    assert response.get_json() == {"success": True, "created": 1, "errors": []}
+
+
+def post_batch(app, body):
+    response = app.test_client().post('/shows/batch', json=body)
+    return response.status_code, response.get_json()["errors"]
+
+
+@pytest.mark.parametrize('body, message', [
+    ([{"venue_id": 1}], 'Expected a JSON object.'),
+    ({"shows": {"venue_id": 1}}, '"shows" must be a list of shows.'),
+    ({"shows": ['1, 1, 2040-01-01']}, 'Row 1: expected an object with venue_id, '
+                                      'artist_id and start_time.'),
+    ({"shows": [{"venue_id": 1, "artist_id": 1, "start_time": '2040-01-01T20:00',
+                 "duration": 0}]}, 'Row 1: show duration must be at least 1 minute.'),
+    ({"venue_id": 1, "artist_id": 1, "start_time": '2040-01-01T20:00', "duration": 0},
+     'Show duration must be at least 1 minute.'),
+    ({"venue_id": 1, "artist_id": 1, "start_time": '2040-01-01T20:00', "interval": 0},
+     'Recurrence interval must be at least 1.'),
+    ({"venue_id": 1, "artist_id": 1, "start_time": '2040-01-01T20:00', "count": 0},
+     'Recurrence count must be at least 1.'),
+    ({"venue_id": 1, "artist_id": 1, "start_time": '2040-01-01T20:00', "count": 'x'},
+     'Recurrence needs a valid duration, interval, count and end date.'),
+    ({"shows": []}, 'No shows to schedule.'),
+])
+def test_invalid_batches_are_rejected(seeded_app, body, message):
+    assert post_batch(seeded_app, body) == (400, [message])
+
+
+def test_database_failure_is_a_server_error(seeded_app, monkeypatch):
+    def fail(bookings):
+        raise exc.OperationalError('INSERT', {}, Exception('database went away'))
+    monkeypatch.setattr(services, 'schedule_shows', fail)
+    assert post_batch(seeded_app, {"shows": [
+        {"venue_id": 1, "artist_id": 1, "start_time": '2040-01-01T20:00'}]}) == \
+        (500, ['An error occurred. Shows could not be listed.'])
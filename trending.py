@@ -0,0 +1,258 @@
+import heapq
+import threading
+import time
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, func
+from database import db, upsert
+from models import Show, TrendingScore
+from lookups import venue_names, artist_names
+from replicas import read_from_primary
+from jobs import PeriodicTask
+from logs import get_logger
+
+#----------------------------------------------------------------------------#
+# Trending venues and artists.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# Popularity scores built from events, each worth TRENDING_WEIGHTS
+# and decaying exponentially with a half-life of
+# TRENDING_HALF_LIFE_DAYS:
+#   'view'      a detail page was viewed
+#   'show'      an upcoming show was booked
+#   'listing'   the venue/artist was just listed
+#
+# Decay is applied forwards: an event at time t adds
+#     weight * 2^((t - TRENDING_EPOCH) / half-life)
+# and a score is only divided by 2^((now - TRENDING_EPOCH) / half-life)
+# for display. Stored scores therefore never have to be decayed or
+# re-ranked as time passes: they only grow, ordering between them
+# stays correct, and per-process deltas can simply be added up in
+# the table. (Floats overflow after ~1000 half-lives, i.e. in about
+# 20 years with the default half-life; move the epoch before then.)
+#
+# Every process keeps all scores in memory, ranked in a heap: an
+# update pushes the new score (O(log n)) and leaves the old entry
+# behind as stale, '/' and '/trending' pop the top K in O(K log n).
+# Deltas are buffered and upserted every TRENDING_FLUSH_INTERVAL
+# seconds (and on shutdown); the totals, including other processes'
+# deltas, are re-read after TRENDING_RELOAD_TTL. An empty table is
+# seeded from the upcoming shows by that same periodic task, never
+# by a request.
+####################################################################
+
+logger = get_logger(__name__)
+
+TRENDING_EPOCH = datetime(2026, 1, 1)
+TRENDING_HALF_LIFE_DAYS = 7
+TRENDING_RELOAD_TTL = 300       # seconds
+TRENDING_RESULTS_LIMIT = 10
+TRENDING_STALE_ENTRIES = 1000   # heap entries kept beyond 2 per score
+
+TRENDING_WEIGHTS = {
+    "view": 1,
+    "show": 5,
+    "listing": 10,
+}
+
+
+def get_decay_factor(when=None):
+    # 2^(half-lives since TRENDING_EPOCH)
+    elapsed = ((when or datetime.now()) - TRENDING_EPOCH).total_seconds()
+    return 2.0 ** (elapsed / (TRENDING_HALF_LIFE_DAYS * 86400))
+
+
+class TrendingBoard:
+    # Scores of one kind (venues or artists)
+    def __init__(self):
+        self.scores = {}        # id -> forward-decayed score
+        self.ranking = []       # heap of (-score, id); stale once the score changed
+        self.pending = {}       # id -> score added since the last flush
+
+    def add(self, entity_id, amount):
+        score = self.scores.get(entity_id, 0) + amount
+        self.scores[entity_id] = score
+        heapq.heappush(self.ranking, (-score, entity_id))
+        if len(self.ranking) > 2 * len(self.scores) + TRENDING_STALE_ENTRIES:
+            self._rank()
+
+    def remove(self, entity_id):
+        # its heap entries go stale
+        self.scores.pop(entity_id, None)
+        self.pending.pop(entity_id, None)
+
+    def load(self, scores):
+        # stored totals, plus what this process has not flushed yet
+        self.scores = dict(scores)
+        for entity_id, amount in self.pending.items():
+            self.scores[entity_id] = self.scores.get(entity_id, 0) + amount
+        self._rank()
+
+    def _rank(self):
+        # drops the stale entries
+        self.ranking = [(-score, entity_id) for entity_id, score in self.scores.items()]
+        heapq.heapify(self.ranking)
+
+    def best(self, limit, include):
+        # Up to 'limit' (-score, id) of the ids 'include' accepts, best
+        # first. Stale entries met on the way are dropped, the others
+        # are pushed back
+        results = []
+        popped = []
+        while self.ranking and len(results) < limit:
+            entry = heapq.heappop(self.ranking)
+            score, entity_id = entry
+            if self.scores.get(entity_id) != -score or \
+                    (popped and popped[-1] == entry):
+                continue
+            popped.append(entry)
+            if include(entity_id):
+                results.append(entry)
+        for entry in popped:
+            heapq.heappush(self.ranking, entry)
+        return results
+
+
+class TrendingScores:
+    def __init__(self, ttl=TRENDING_RELOAD_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._seeded = False
+        self.boards = {'venue': TrendingBoard(), 'artist': TrendingBoard()}
+        self.names = {'venue': venue_names, 'artist': artist_names}
+
+    def _is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _refresh(self):
+        scores = {kind: {} for kind in self.boards}
+        with read_from_primary():
+            for kind, entity_id, score in db.session.query(
+                    TrendingScore.kind, TrendingScore.entity_id, TrendingScore.score):
+                if kind in scores:
+                    scores[kind][entity_id] = score
+
+        with self._lock:
+            for kind, board in self.boards.items():
+                board.load(scores[kind])
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def record(self, kind, entity_id, event, count=1, when=None):
+        amount = count * TRENDING_WEIGHTS[event] * get_decay_factor(when)
+        with self._lock:
+            board = self.boards[kind]
+            board.add(entity_id, amount)
+            board.pending[entity_id] = board.pending.get(entity_id, 0) + amount
+
+    def remove(self, kind, entity_id):
+        with self._lock:
+            self.boards[kind].remove(entity_id)
+
+    def top(self, kind, limit=TRENDING_RESULTS_LIMIT):
+        # The 'limit' best scores: [{"id", "name", "score"}], where the
+        # score is decayed to now. Deleted entities (no longer in the
+        # name index) are skipped
+        if self._is_stale():
+            self._refresh()
+
+        names = self.names[kind].get_names()
+        decay = get_decay_factor()
+        with self._lock:
+            best = self.boards[kind].best(limit, names.__contains__)
+        return [{
+            "id": entity_id,
+            "name": names[entity_id],
+            "score": round(-score / decay, 2)
+        } for score, entity_id in best]
+
+    def sync(self):
+        # periodic task: seeds an empty table (checked once per
+        # process), then flushes the buffered deltas
+        if not self._seeded:
+            if db.session.query(TrendingScore.kind).first() is None:
+                seed_scores()
+                self.invalidate()
+            self._seeded = True
+        return self.flush()
+
+    def flush(self):
+        # Adds the buffered deltas to 'TrendingScore' in one batched
+        # upsert; on failure they are put back for the next flush.
+        # Returns the number of rows written
+        with self._lock:
+            rows = []
+            for kind, board in self.boards.items():
+                rows.extend({"kind": kind, "entity_id": entity_id, "score": amount}
+                            for entity_id, amount in board.pending.items())
+                board.pending = {}
+        if not rows:
+            return 0
+
+        error = False
+        try:
+            stmt = upsert(TrendingScore)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['kind', 'entity_id'],
+                set_={"score": TrendingScore.score + stmt.excluded.score})
+            db.session.execute(stmt, rows)
+            db.session.commit()
+        except Exception:
+            error = True
+            db.session.rollback()
+            logger.exception('Writing %s trending scores failed', len(rows))
+        finally:
+            db.session.close()
+
+        if error:
+            with self._lock:
+                for row in rows:
+                    pending = self.boards[row["kind"]].pending
+                    pending[row["entity_id"]] = pending.get(row["entity_id"], 0) + row["score"]
+            return 0
+        return len(rows)
+
+
+trending = TrendingScores()
+
+
+def seed_scores():
+    # Initial scores from the upcoming shows, for a new 'TrendingScore'
+    # table (or after 'flask trending rebuild'); rows that already
+    # exist are left alone, so concurrent seeding is harmless
+    amount = TRENDING_WEIGHTS["show"] * get_decay_factor()
+    rows = []
+    for kind, column in (('venue', Show.venue_id), ('artist', Show.artist_id)):
+        rows.extend({"kind": kind, "entity_id": entity_id, "score": count * amount}
+                    for entity_id, count in db.session.query(
+                        column, func.count(Show.id)).filter(
+                        Show.start_time >= datetime.now()).group_by(column))
+    if rows:
+        db.session.execute(upsert(TrendingScore).on_conflict_do_nothing(), rows)
+        db.session.commit()
+    return len(rows)
+
+
+trending_cli = AppGroup('trending', help='Trending venues and artists.')
+
+
+@trending_cli.command('rebuild')
+def rebuild_command():
+    """Reset trending scores to the upcoming show counts."""
+    db.session.execute(delete(TrendingScore))
+    seeded = seed_scores()
+    db.session.commit()
+    trending.invalidate()
+    click.echo(f'{seeded} scores seeded from upcoming shows')
+
+
+def init_trending(app):
+    flusher = PeriodicTask(app, trending.sync, app.config['TRENDING_FLUSH_INTERVAL'])
+    app.extensions['trending'] = flusher
+    app.before_request(flusher.start)
+    app.cli.add_command(trending_cli)
@@ -0,0 +1,255 @@
+from datetime import datetime
+from flask import current_app, flash, make_response, render_template, request, session
+from flask import g, get_flashed_messages, stream_template
+from sqlalchemy import func
+from database import db
+from models import Show
+from jobs import enqueue
+from logs import get_logger
+
+#----------------------------------------------------------------------------#
+# View helpers shared by the blueprints.
+#----------------------------------------------------------------------------#
+
+####################################################################
+# babel and dateutil.parser are only needed by a few pages but take
+# a noticeable share of a worker's startup, so they are imported
+# inside the functions that use them (see 'flask bench startup')
+####################################################################
+
+logger = get_logger(__name__)
+
+# streamed pages are sent in chunks of at least this many bytes
+STREAM_CHUNK_SIZE = 4096
+
+# past shows listed on a venue or artist page, the most recent first
+PAST_SHOWS_LIMIT = 50
+
+MATCHES_DEFAULT_LIMIT = 20
+MATCHES_MAX_LIMIT = 100
+
+# Allowed calendar bucket sizes (passed straight to 'date_trunc' on
+# Postgres); on SQLite, the datetime() modifiers giving the same start
+# of the period (weeks start on Monday)
+CALENDAR_BUCKETS = ('week', 'month', 'year')
+CALENDAR_SQLITE_MODIFIERS = {
+    'week': ('weekday 0', '-6 days', 'start of day'),
+    'month': ('start of month',),
+    'year': ('start of year',),
+}
+
+
+def format_datetime(value, format='medium'):
+    import babel.dates
+    import dateutil.parser
+    from datetime import datetime
+
+    if type(value) != str:
+        value = datetime.strftime(value, format="%m/%d/%Y, %H:%M:%S")
+
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def get_formatted_shows(shows, shows_for='venue'):
+    fmtd_shows = []
+    for show in shows:
+        data = dict()
+        if shows_for == 'venue':  # if 'venue', get artist details
+            show_artist = show.show_artist
+            data["artist_id"] = show_artist.id
+            data["artist_name"] = show_artist.name
+            data["artist_image_link"] = show_artist.image_link
+            data["start_time"] = show.start_time
+
+        else:   # if shows_for == 'artist', then get venue details
+            show_venue = show.show_venue
+            data["venue_id"] = show_venue.id
+            data["venue_name"] = show_venue.name
+            data["venue_image_link"] = show_venue.image_link
+            data["start_time"] = show.start_time
+
+        fmtd_shows.append(data)
+
+    return fmtd_shows
+
+
+def count_past_shows(show_column, entity_id, now, listed):
+    # The past shows list stops at PAST_SHOWS_LIMIT; only a full list
+    # needs the whole history counted (index-only, per partition)
+    if listed < PAST_SHOWS_LIMIT:
+        return listed
+    return db.session.query(func.count()).select_from(Show).filter(
+        show_column == entity_id, Show.start_time < now).scalar()
+
+
+def get_time_window(args):
+    # Reads the optional '?from=&to=' query params into datetimes.
+    # Invalid values are ignored so the page still renders unfiltered
+    import dateutil.parser
+
+    window = []
+    for key in ('from', 'to'):
+        value = args.get(key, '').strip()
+        try:
+            window.append(dateutil.parser.parse(value) if value else None)
+        except (ValueError, OverflowError):
+            flash(f'Ignoring invalid "{key}" date "{value}"', 'error')
+            window.append(None)
+
+    return tuple(window)
+
+
+def filter_time_window(query, start=None, end=None):
+    # Half-open [start, end) bounds on Show.start_time, so the
+    # 'start_time' indexes can be used as a range scan
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    return query
+
+
+def get_calendar_buckets(show_column, entity_id, bucket='month', start=None, end=None):
+    # Aggregates show counts per week/month/year inside the database,
+    # so a long show history never has to be loaded row by row
+    if db.session.get_bind().dialect.name == 'sqlite':
+        period = func.datetime(Show.start_time, *CALENDAR_SQLITE_MODIFIERS[bucket])
+    else:
+        period = func.date_trunc(bucket, Show.start_time)
+    period = period.label('period')
+
+    q_buckets = db.session.query(period, func.count(Show.id)).filter(
+        show_column == entity_id)
+    q_buckets = filter_time_window(q_buckets, start, end)
+    q_buckets = q_buckets.group_by(period).order_by(period)
+
+    # (SQLite returns the periods as text)
+    return [{
+        "period": datetime.fromisoformat(row[0]) if isinstance(row[0], str) else row[0],
+        "count": row[1]
+    } for row in q_buckets.all()]
+
+
+def get_calendar_data(entity, show_column, entity_type):
+    from dateutil.relativedelta import relativedelta
+
+    bucket = request.args.get('bucket', 'month')
+    if bucket not in CALENDAR_BUCKETS:
+        bucket = 'month'
+    start, end = get_time_window(request.args)
+
+    buckets = get_calendar_buckets(
+        show_column, entity.id, bucket=bucket, start=start, end=end)
+
+    # each bucket links to the /shows listing for that period only
+    for item in buckets:
+        item["end"] = item["period"] + relativedelta(**{bucket + 's': 1})
+
+    return {
+        "id": entity.id,
+        "name": entity.name,
+        "type": entity_type,
+        "bucket": bucket,
+        "buckets": buckets,
+        "total_shows": sum(item["count"] for item in buckets),
+        "from": start,
+        "to": end
+    }
+
+
+def get_related_panel(related, names):
+    # Named entries for the co-performance panels of the detail pages;
+    # ids no longer in the name index (deleted) are skipped
+    panel = []
+    for entity_id, shared, shows in related:
+        name = names.get(entity_id)
+        if name is not None:
+            panel.append({
+                "id": entity_id,
+                "name": name,
+                "shared": shared,
+                "shows": shows
+            })
+    return panel
+
+
+def enqueue_follow_ups(kind, image_link):
+    # Deferred work after a venue/artist is created or edited: the
+    # thumbnails of its image are built on the job workers (see
+    # 'jobs.py') so the redirect is sent right away. The write itself
+    # already succeeded, so failures are only logged. Deletes need no
+    # job, and neither do the name pickers: this process drops its
+    # index on commit, the others reload theirs within
+    # LOOKUP_CACHE_TTL (see 'lookups.py')
+    if not image_link:
+        return
+    try:
+        enqueue('warm_image_variants', image_link)
+    except Exception:
+        logger.exception('Enqueueing %s follow-up jobs failed', kind)
+
+
+def get_search_response(template, results, search_term):
+    # GET searches may be cached by browsers and proxies for
+    # SEARCH_CACHE_MAX_AGE seconds, unless the page carries a flash
+    # message meant for this visitor only
+    private = '_flashes' in session
+    response = make_response(render_template(
+        template, results=results, search_term=search_term))
+    if request.method == 'GET' and not private:
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config['SEARCH_CACHE_MAX_AGE']
+    return response
+
+
+def buffer_chunks(chunks, size=STREAM_CHUNK_SIZE):
+    # jinja yields every few template statements; one write (and one
+    # compressor flush) per few KB instead
+    buffered, buffered_size = [], 0
+    try:
+        for chunk in chunks:
+            buffered.append(chunk)
+            buffered_size += len(chunk)
+            if buffered_size >= size:
+                yield ''.join(buffered)
+                buffered, buffered_size = [], 0
+        if buffered:
+            yield ''.join(buffered)
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def log_stream_errors(chunks, template_name, extra):
+    # The request has been answered by the time a streamed page fails,
+    # so Flask doesn't log it; 'extra' identifies the request
+    try:
+        yield from chunks
+    except Exception:
+        logger.exception('Streaming %s failed', template_name, extra=extra)
+        raise
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def stream_page(template_name, **context):
+    # Renders a large listing page while it is being sent: the layout
+    # and the first tiles reach the browser before the last ones are
+    # rendered. The status and headers go out first, so a rendering
+    # error can only cut the page short (it is logged), not turn it
+    # into a 500 page; the data is queried in the view, before this.
+    #
+    # The session is saved before the body is rendered: the flash
+    # messages the layout shows are taken out of it here
+    get_flashed_messages(with_categories=True)
+    chunks = stream_template(template_name, **context)
+    return current_app.response_class(
+        buffer_chunks(log_stream_errors(chunks, template_name, {
+            "request_id": g.get('request_id'), "path": request.path})),
+        mimetype='text/html')
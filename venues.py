@@ -0,0 +1,555 @@
+from datetime import datetime
+from flask import Blueprint, render_template, request
+from flask import flash, redirect, url_for, jsonify, abort
+from sqlalchemy import exc
+from database import db
+from models import Venue, Artist, Show
+from lookups import venue_names
+from directory import venue_directory
+from geo import find_nearby_venues, count_unlocated_venues
+from matchmaking import matches
+from graph import co_performances
+from utils import get_calendar_data, get_related_panel, enqueue_follow_ups
+from utils import get_search_response, stream_page
+from utils import MATCHES_DEFAULT_LIMIT, MATCHES_MAX_LIMIT
+from utils import PAST_SHOWS_LIMIT, count_past_shows
+import services
+from search import search
+from ratelimit import rate_limited
+from logs import get_logger
+
+#----------------------------------------------------------------------------#
+# Venue pages.
+#----------------------------------------------------------------------------#
+
+bp = Blueprint('venues', __name__)
+logger = get_logger(__name__)
+
+NEARBY_DEFAULT_RADIUS = 25     # km
+NEARBY_MAX_RADIUS = 500
+NEARBY_DEFAULT_LIMIT = 50
+NEARBY_MAX_LIMIT = 200
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@bp.route('/venues')
+def venues():
+    # TODO: replace with real venues data.
+    #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
+
+    error = False
+    data = []
+    try:
+        # #####################################################################
+        # # Commented: Re-implemented to satisfy review requirements
+        # #####################################################################
+        # # Distinct cities fetch
+        # distinct_cities = db.session.query(Venue).distinct(Venue.city).all()
+
+        # # All upcoming shows
+        # upc_shows = Show.query.filter(Show.start_time >= datetime.now()).all()
+
+        # for venue in distinct_cities:
+        #     city = venue.city
+        #     state = venue.state
+
+        #     upc_city_venues = [
+        #         {
+        #             "id": show.show_venue.id,
+        #             "name": show.show_venue.name,
+        #             "num_upcoming_shows": len(
+        #                 [s for s in upc_shows if s.show_venue.city == city and s.show_venue.name == show.show_venue.name])
+        #         } for show in upc_shows if show.show_venue.city == city]
+
+        #     # copy created to avoid in-place modification
+        #     # when removing duplicates
+        #     copy_upc_city_venues = upc_city_venues.copy()
+
+        #     # Remove duplicates
+        #     names = []
+        #     for t in copy_upc_city_venues:
+        #         if t['name'] in names:
+        #             upc_city_venues.remove(t)
+        #         else:
+        #             names.append(t['name'])
+        #     names = None  # clear memory
+
+        #     data.append({
+        #         'city': city,
+        #         'state': state,
+        #         'venues': upc_city_venues
+        #     })
+        # # ####################################################################
+
+        # #####################################################################
+        # # Commented: replaced by the shared directory snapshot
+        # #####################################################################
+        # # Distinct cities fetch
+        # distinct_cities = db.session.query(Venue).distinct(Venue.city).all()
+
+        # for location in distinct_cities:
+        #     city = location.city
+        #     state = location.state
+
+        #     city_venues = db.session.query(
+        #         Venue).filter(Venue.city == city).all()
+
+        #     venues_list = []
+        #     for venue in city_venues:
+        #         venue_upc_shows_count = db.session.query(Show).join(
+        #             Venue).filter(Show.venue_id == venue.id).filter(
+        #                 Show.start_time >= datetime.now()).count()
+
+        #         venues_list.append({
+        #             "id": venue.id,
+        #             "name": venue.name,
+        #             "num_upcoming_shows": venue_upc_shows_count
+        #         })
+
+        #     data.append({
+        #         "city": city,
+        #         "state": state,
+        #         "venues": venues_list
+        #     })
+        # # ####################################################################
+
+        # Cities -> venues -> upcoming show counts, prebuilt and shared
+        # by all workers (see 'directory.py')
+        data = venue_directory.get_areas()
+
+        # Mock data provided by default
+        # data = [{
+        #     "city": "San Francisco",
+        #     "state": "CA",
+        #     "venues": [{
+        #         "id": 1,
+        #         "name": "The Musical Hop",
+        #         "num_upcoming_shows": 0,
+        #     }, {
+        #         "id": 3,
+        #         "name": "Park Square Live Music & Coffee",
+        #         "num_upcoming_shows": 1,
+        #     }]
+        # }, {
+        #     "city": "New York",
+        #     "state": "NY",
+        #     "venues": [{
+        #         "id": 2,
+        #         "name": "The Dueling Pianos Bar",
+        #         "num_upcoming_shows": 0,
+        #     }]
+        # }]
+
+    except exc.SQLAlchemyError:
+        error = True
+        logger.exception('Fetching venues failed')
+
+    except Exception:
+        error = True
+        logger.exception('Fetching venues failed')
+
+    finally:
+        if db.session:
+            if error:
+                db.session.rollback()
+                flash('Fetch failed', 'error')
+                # return redirect(url_for('index'))
+
+            db.session.close()
+
+        return stream_page('pages/venues.html', areas=data)
+
+
+@bp.route('/venues/search', methods=['GET', 'POST'])
+@rate_limited('search')
+def search_venues():
+    # TODO: implement search on venues with partial string search. Ensure it is case-insensitive.
+    # seach for Hop should return "The Musical Hop".
+    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+
+    # GET (cacheable, see 'get_search_response') or the older POST form
+    search_term = request.values.get('search_term', '')
+    response = search('venue', search_term)
+
+    # # Mock data provided by default
+    # response = {
+    #     "count": 1,
+    #     "data": [{
+    #         "id": 2,
+    #         "name": "The Dueling Pianos Bar",
+    #         "num_upcoming_shows": 0,
+    #     }]
+    # }
+    # return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+
+    return get_search_response('pages/search_venues.html', response, search_term)
+
+
+@bp.route('/venues/<int:venue_id>')
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    # TODO: replace with real venue data from the venues table, using venue_id
+
+    curr_venue = Venue.query.get_or_404(venue_id)
+    curr_venue = curr_venue.to_dico()
+
+    # Moderating 'genres' for display
+    curr_venue['genres'] = [genre.name for genre in curr_venue['genres']]
+
+    # # ##############################################################
+    # COMMENTED for re-implementation to meet Review Requirement
+    # # ##############################################################
+    # q_upcoming_shows = Show.query.filter(
+    #     Show.venue_id == venue_id, Show.start_time >= datetime.now())
+
+    # q_past_shows = Show.query.filter(
+    #     Show.venue_id == venue_id, Show.start_time < datetime.now())
+
+    # past_shows = get_formatted_shows(q_past_shows.all(), shows_for='venue')
+    # upcoming_shows = get_formatted_shows(
+    #     q_upcoming_shows.all(), shows_for='venue')
+    # # ##############################################################
+
+    # One 'now' for both lists, compared with start_time as it is, so
+    # Postgres only scans the Show partitions in range (see
+    # 'partitions.py'): the upcoming ones, and for past shows the
+    # newest partitions first, stopping at PAST_SHOWS_LIMIT
+    now = datetime.now()
+    q_upcoming_shows = db.session.query(Show).join(Artist).filter(
+        Show.venue_id == venue_id).filter(Show.start_time >= now).order_by(
+        Show.start_time).all()
+
+    q_past_shows = db.session.query(Show).join(Artist).filter(
+        Show.venue_id == venue_id).filter(Show.start_time < now).order_by(
+        Show.start_time.desc()).limit(PAST_SHOWS_LIMIT).all()
+
+    past_shows = []
+    for show in q_past_shows:
+        past_shows.append({
+            "artist_id": show.show_artist.id,
+            "artist_name": show.show_artist.name,
+            "artist_image_link": show.show_artist.image_link,
+            "start_time": show.start_time
+        })
+
+    upcoming_shows = []
+    for show in q_upcoming_shows:
+        upcoming_shows.append({
+            "artist_id": show.show_artist.id,
+            "artist_name": show.show_artist.name,
+            "artist_image_link": show.show_artist.image_link,
+            "start_time": show.start_time
+        })
+
+    curr_venue["past_shows"] = past_shows
+    curr_venue["upcoming_shows"] = upcoming_shows
+    curr_venue["past_shows_count"] = count_past_shows(
+        Show.venue_id, venue_id, now, len(past_shows))
+    curr_venue["upcoming_shows_count"] = len(upcoming_shows)
+
+    # two-hop panels, answered from the in-memory graph (see 'graph.py')
+    curr_venue["similar_venues"] = get_related_panel(
+        co_performances.similar_venues(venue_id), venue_names)
+
+    # # Mock data provided by default
+    # data1 = {
+    #     "id": 1,
+    #     "name": "The Musical Hop",
+    #     "genres": ["Jazz", "Reggae", "Swing", "Classical", "Folk"],
+    #     "address": "1015 Folsom Street",
+    #     "city": "San Francisco",
+    #     "state": "CA",
+    #     "phone": "123-123-1234",
+    #     "website": "https://www.themusicalhop.com",
+    #     "facebook_link": "https://www.facebook.com/TheMusicalHop",
+    #     "seeking_talent": True,
+    #     "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
+    #     "image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60",
+    #     "past_shows": [{
+    #         "artist_id": 4,
+    #         "artist_name": "Guns N Petals",
+    #         "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
+    #         "start_time": "2019-05-21T21:30:00.000Z"
+    #     }],
+    #     "upcoming_shows": [],
+    #     "past_shows_count": 1,
+    #     "upcoming_shows_count": 0,
+    # }
+    # data2 = {
+    #     "id": 2,
+    #     "name": "The Dueling Pianos Bar",
+    #     "genres": ["Classical", "R&B", "Hip-Hop"],
+    #     "address": "335 Delancey Street",
+    #     "city": "New York",
+    #     "state": "NY",
+    #     "phone": "914-003-1132",
+    #     "website": "https://www.theduelingpianos.com",
+    #     "facebook_link": "https://www.facebook.com/theduelingpianos",
+    #     "seeking_talent": False,
+    #     "image_link": "https://images.unsplash.com/photo-1497032205916-ac775f0649ae?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=750&q=80",
+    #     "past_shows": [],
+    #     "upcoming_shows": [],
+    #     "past_shows_count": 0,
+    #     "upcoming_shows_count": 0,
+    # }
+    # data3 = {
+    #     "id": 3,
+    #     "name": "Park Square Live Music & Coffee",
+    #     "genres": ["Rock n Roll", "Jazz", "Classical", "Folk"],
+    #     "address": "34 Whiskey Moore Ave",
+    #     "city": "San Francisco",
+    #     "state": "CA",
+    #     "phone": "415-000-1234",
+    #     "website": "https://www.parksquarelivemusicandcoffee.com",
+    #     "facebook_link": "https://www.facebook.com/ParkSquareLiveMusicAndCoffee",
+    #     "seeking_talent": False,
+    #     "image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
+    #     "past_shows": [{
+    #         "artist_id": 5,
+    #         "artist_name": "Matt Quevedo",
+    #         "artist_image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
+    #         "start_time": "2019-06-15T23:00:00.000Z"
+    #     }],
+    #     "upcoming_shows": [{
+    #         "artist_id": 6,
+    #         "artist_name": "The Wild Sax Band",
+    #         "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #         "start_time": "2035-04-01T20:00:00.000Z"
+    #     }, {
+    #         "artist_id": 6,
+    #         "artist_name": "The Wild Sax Band",
+    #         "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #         "start_time": "2035-04-08T20:00:00.000Z"
+    #     }, {
+    #         "artist_id": 6,
+    #         "artist_name": "The Wild Sax Band",
+    #         "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #         "start_time": "2035-04-15T20:00:00.000Z"
+    #     }],
+    #     "past_shows_count": 1,
+    #     "upcoming_shows_count": 1,
+    # }
+
+    # data = list(filter(lambda d: d['id'] ==
+    #             venue_id, [data1, data2, data3]))[0]
+    # return render_template('pages/show_venue.html', venue=data)
+
+    return render_template('pages/show_venue.html', venue=curr_venue)
+
+
+@bp.route('/venues/<int:venue_id>/calendar')
+def venue_calendar(venue_id):
+    # Bucketed (week/month/year) show counts for a venue,
+    # optionally restricted with '?from=&to='
+    venue = Venue.query.get_or_404(venue_id)
+    calendar = get_calendar_data(venue, Show.venue_id, 'venue')
+    return render_template('pages/calendar.html', calendar=calendar)
+
+
+@bp.route('/venues/<int:venue_id>/matches')
+def venue_matches(venue_id):
+    # Artists seeking a venue, ranked by genre overlap, location and
+    # past shows at this venue (see 'matchmaking.py')
+    limit = min(max(request.args.get('limit', MATCHES_DEFAULT_LIMIT, type=int), 1),
+                MATCHES_MAX_LIMIT)
+    artists = matches.recommend_artists(venue_id, limit)
+    if artists is None:
+        abort(404)
+    return jsonify({"count": len(artists), "data": artists})
+
+
+@bp.route('/venues/lookup')
+def lookup_venues():
+    # Typeahead source for the show forms' venue picker; answered from
+    # the in-memory id -> name index, without touching the database
+    return jsonify(venue_names.search(request.args.get('q', '')))
+
+
+@bp.route('/venues/nearby')
+def nearby_venues():
+    # '/venues/nearby?lat=37.77&lng=-122.42&radius=25' -> venues within
+    # 'radius' km (default 25), closest first (see 'geo.py'), and how
+    # many venues could not be placed ("location_unknown")
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+    radius = request.args.get('radius', NEARBY_DEFAULT_RADIUS, type=float)
+    limit = request.args.get('limit', NEARBY_DEFAULT_LIMIT, type=int)
+
+    if latitude is None or longitude is None or \
+            not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        return jsonify({"error": "'lat' and 'lng' must be valid coordinates"}), 400
+
+    radius = min(max(radius, 0), NEARBY_MAX_RADIUS)
+    limit = min(max(limit, 1), NEARBY_MAX_LIMIT)
+    venues = find_nearby_venues(latitude, longitude, radius, limit)
+
+    return jsonify({
+        "count": len(venues),
+        "radius": radius,
+        "data": venues,
+        "location_unknown": count_unlocated_venues()
+    })
+
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+
+@bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+    from forms import VenueForm
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+
+@bp.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+    # Venue and its genres are written in one round trip by the
+    # service layer, then redirect-after-POST to the new venue's page
+
+    error = False
+    venue_id = None
+    venue_name = request.form.get('name', '')
+    try:
+        venue_id = services.create_venue(
+            services.get_venue_fields(request.form),
+            request.form.getlist('genres'))
+
+    except exc.SQLAlchemyError:
+        logger.exception('Creating venue %r failed', venue_name)
+        error = True
+
+    except Exception:
+        error = True
+        logger.exception('Creating venue %r failed', venue_name)
+
+    finally:
+        if error:
+            # TODO: on unsuccessful db insert, flash an error instead.
+            # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
+            # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+            flash(
+                f'An error occurred. Venue "{venue_name}" could not be listed.')
+            return redirect(url_for('.create_venue_form'))
+
+        enqueue_follow_ups('venue', request.form.get('image_link'))
+        flash(f'Venue "{venue_name}:{venue_id}" was successfully listed!')
+        return redirect(url_for('.show_venue', venue_id=venue_id))
+
+
+@bp.route('/venues/<venue_id>', methods=['DELETE', 'POST'])
+def delete_venue(venue_id):
+    # TODO: Complete this endpoint for taking a venue_id, and using
+    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    error = False
+    venue_name = None
+    try:
+        venue_name = services.delete_venue(int(venue_id))
+
+    except exc.SQLAlchemyError:
+        error = True
+        logger.exception('Deleting venue %s failed', venue_id)
+
+    except Exception:
+        error = True
+        logger.exception('Deleting venue %s failed', venue_id)
+
+    if error:
+        flash(f'An error occurred. Venue {venue_id} could not be deleted.')
+    elif venue_name is None:
+        abort(404)
+    else:
+        flash(f'Venue "{venue_name}" deleted succefully')
+
+    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+    # clicking that button delete it from the db then redirect the user to the homepage
+
+    # =====================================================================
+    # BONUS CHALLENGE IMPLEMENTED in the 'pages/show_venue.html' template
+    # =====================================================================
+    return redirect(url_for('index'))
+
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+    from forms import VenueForm
+    form = VenueForm()
+
+    # # Mock Data Provided by default
+    # venue = {
+    #     "id": 1,
+    #     "name": "The Musical Hop",
+    #     "genres": ["Jazz", "Reggae", "Swing", "Classical", "Folk"],
+    #     "address": "1015 Folsom Street",
+    #     "city": "San Francisco",
+    #     "state": "CA",
+    #     "phone": "123-123-1234",
+    #     "website": "https://www.themusicalhop.com",
+    #     "facebook_link": "https://www.facebook.com/TheMusicalHop",
+    #     "seeking_talent": True,
+    #     "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
+    #     "image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60"
+    # }
+
+    # TODO: populate form with values from venue with ID <venue_id>
+
+    venue = Venue.query.get_or_404(venue_id)
+
+    form.name.data = venue.name
+    form.address.data = venue.address
+    form.city.data = venue.city
+    form.state.data = venue.state
+    form.phone.data = venue.phone
+    form.website_link.data = venue.website
+    form.facebook_link.data = venue.facebook_link
+    form.seeking_talent.data = venue.seeking_talent
+    form.seeking_description.data = venue.seeking_description
+    form.image_link.data = venue.image_link
+
+    # Load genres
+    genres = []
+    for genre in venue.genres:
+        genres.append(genre.name)
+
+    form.genres.data = genres
+
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+    # TODO: take values from the form submitted, and update existing
+    # venue record with ID <venue_id> using the new attributes
+
+    error = False
+    updated_id = None
+    venue_name = request.form.get('name', '')
+    try:
+        updated_id = services.update_venue(
+            venue_id, services.get_venue_fields(request.form),
+            request.form.getlist('genres'))
+
+    except exc.SQLAlchemyError:
+        error = True
+        logger.exception('Updating venue %s failed', venue_id)
+
+    except Exception:
+        error = True
+        logger.exception('Updating venue %s failed', venue_id)
+
+    if error:
+        flash(f'Error updating venue "{venue_name}"', 'error')
+    elif updated_id is None:
+        abort(404)
+    else:
+        enqueue_follow_ups('venue', request.form.get('image_link'))
+        flash(
+            f'Successfully updated venue "{venue_name}:{venue_id}"', 'info')
+
+    return redirect(url_for('.show_venue', venue_id=venue_id))